@@ -10,4 +10,59 @@ class Settings:
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     UPLOAD_DIR: str = "app/uploads"
     
+    # Cache de distancias (LRU en memoria + tabla matriz_distancias)
+    CACHE_DISTANCIAS_LRU: int = int(os.getenv("CACHE_DISTANCIAS_LRU", "500000"))
+    CACHE_DISTANCIAS_TTL_HORAS: int = int(os.getenv("CACHE_DISTANCIAS_TTL_HORAS", "168"))
+    CACHE_DISTANCIAS_MAX_PUNTOS: int = int(os.getenv("CACHE_DISTANCIAS_MAX_PUNTOS", "400"))
+    
+    # Red vial local (.npz con jerarquías de contracción); vacío = Haversine
+    RED_VIAL_ARCHIVO: str = os.getenv("RED_VIAL_ARCHIVO", "")
+    
+    # Matriz almacén + clientes precalculada de noche (memmap); vacío = desactivada
+    MATRIZ_PRECALCULADA_DIR: str = os.getenv("MATRIZ_PRECALCULADA_DIR", "")
+    
+    # Algoritmo genético
+    GENETICO_TIEMPO_MAX_SEGUNDOS: float = float(os.getenv("GENETICO_TIEMPO_MAX_SEGUNDOS", "20"))
+    GENETICO_PROCESOS: int = int(os.getenv("GENETICO_PROCESOS", "0"))  # 0 = todos los núcleos
+    
+    # Búsqueda local (2-opt / Or-opt / reubicar / intercambiar)
+    BUSQUEDA_LOCAL_MAX_MOVIMIENTOS: int = int(os.getenv("BUSQUEDA_LOCAL_MAX_MOVIMIENTOS", "2000000"))
+    # Rutas de hasta esta cantidad de paradas se secuencian en forma exacta (máx. 16)
+    SECUENCIA_EXACTA_MAX_PARADAS: int = int(os.getenv("SECUENCIA_EXACTA_MAX_PARADAS", "12"))
+    
+    # Varios viajes por camión dentro del turno del chofer (con recarga en el almacén)
+    VIAJES_MAX_POR_CAMION: int = int(os.getenv("VIAJES_MAX_POR_CAMION", "2"))
+    # Un viaje adicional solo se programa si cada viaje tiene al menos estos minutos de reparto
+    VIAJE_MIN_MINUTOS: float = float(os.getenv("VIAJE_MIN_MINUTOS", "120"))
+    
+    # Hora de inicio de la jornada de reparto (HH:MM); la carga inicial va después
+    HORA_INICIO_RUTAS: str = os.getenv("HORA_INICIO_RUTAS", "08:00")
+    
+    # Alerta de lluvia fuerte: las zonas problemáticas solo admiten camiones aptos
+    ALERTA_LLUVIA: bool = os.getenv("ALERTA_LLUVIA", "false").lower() in ("1", "true", "si", "sí")
+    
+    # Optimizaciones en segundo plano (hilos del pool de trabajos)
+    OPTIMIZACION_TRABAJADORES: int = int(os.getenv("OPTIMIZACION_TRABAJADORES", "2"))
+    
+    # Comparación de parámetros (procesos que evalúan variantes en paralelo)
+    SIMULACION_PROCESOS: int = int(os.getenv("SIMULACION_PROCESOS", "0"))  # 0 = todos los núcleos
+    
+    # Estado en vivo de la flota: volcado de posiciones a la BD y muestreo del historial
+    FLOTA_VOLCADO_SEGUNDOS: float = float(os.getenv("FLOTA_VOLCADO_SEGUNDOS", "5"))
+    # A lo sumo un punto por camión cada N segundos; 0 = se guardan todos los puntos aceptados
+    FLOTA_MUESTREO_HISTORIAL_SEGUNDOS: float = float(os.getenv("FLOTA_MUESTREO_HISTORIAL_SEGUNDOS", "10"))
+    
+    # Canal en vivo de los tableros: cada cuánto se envían cambios y se recalculan las estadísticas
+    CANAL_FLOTA_INTERVALO_SEGUNDOS: float = float(os.getenv("CANAL_FLOTA_INTERVALO_SEGUNDOS", "1"))
+    CANAL_FLOTA_ESTADISTICAS_SEGUNDOS: float = float(os.getenv("CANAL_FLOTA_ESTADISTICAS_SEGUNDOS", "30"))
+    
+    # Retención de tracking: días de puntos crudos y tolerancia al simplificar recorridos
+    TRACKING_RETENCION_DIAS: int = int(os.getenv("TRACKING_RETENCION_DIAS", "30"))
+    TRACKING_TOLERANCIA_METROS: float = float(os.getenv("TRACKING_TOLERANCIA_METROS", "10"))
+    
+    # ETAs en vivo: a esta distancia de una parada se considera que el camión llegó
+    ETA_RADIO_LLEGADA_METROS: float = float(os.getenv("ETA_RADIO_LLEGADA_METROS", "100"))
+    # Zona de las ventanas horarias y de HORA_INICIO_RUTAS (el tracking se guarda en UTC)
+    ZONA_HORARIA: str = os.getenv("ZONA_HORARIA", "America/Lima")
+    
 settings = Settings()
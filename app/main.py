@@ -5,9 +5,13 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from app.database import engine, Base
 from app.routes import admin, chofer, api
+from app.services.live_fleet import flota_en_vivo
+from app.services.live_feed import publicador_flota
+from app.services.distance_cache import preparar_tabla
 
 # Crear tablas
 Base.metadata.create_all(bind=engine)
+preparar_tabla(engine)
 
 app = FastAPI(title="Sistema de Rutas - CAMIONES")
 
@@ -20,6 +24,16 @@ app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(chofer.router, prefix="/chofer", tags=["chofer"])
 app.include_router(api.router, prefix="/api", tags=["api"])
 
+@app.on_event("startup")
+def iniciar_canal_flota():
+    """Ciclo de posiciones y ETAs en vivo"""
+    publicador_flota.iniciar()
+
+@app.on_event("shutdown")
+def volcar_posiciones():
+    """Escribe las posiciones en memoria antes de apagar"""
+    flota_en_vivo.detener()
+
 @app.get("/")
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -351,6 +351,9 @@ class MatrizDistancia(Base):
     destino_lat = Column(Float, nullable=False)
     destino_lng = Column(Float, nullable=False)
     
+    # Motor que calculó el par ("haversine", "red_vial"): parte de la clave
+    motor = Column(String(30), nullable=False)
+    
     # Resultados
     distancia_km = Column(Float, nullable=False)
     distancia_lineal_km = Column(Float)  # Distancia en línea recta
@@ -365,9 +368,9 @@ class MatrizDistancia(Base):
     expira_en = Column(DateTime)  # Para invalidar cache antiguo
     hits = Column(Integer, default=0)  # Cuántas veces se usó
     
-    # Índices compuestos para búsqueda rápida
+    # Un solo registro por par y motor (también es el índice de búsqueda)
     __table_args__ = (
-        Index('idx_origen_destino', 'origen_lat', 'origen_lng', 'destino_lat', 'destino_lng'),
+        Index('uq_origen_destino', 'origen_lat', 'origen_lng', 'destino_lat', 'destino_lng', 'motor', unique=True),
     )
 
 
@@ -393,6 +396,27 @@ class TrackingHistorial(Base):
     camion = relationship("Camion", back_populates="historial_tracking")
 
 
+class TrayectoriaRuta(Base):
+    """Recorrido real de una ruta terminada, simplificado y codificado"""
+    __tablename__ = "trayectorias_ruta"
+    
+    ruta_id = Column(Integer, ForeignKey('rutas.id'), primary_key=True)
+    camion_id = Column(Integer, ForeignKey('camiones.id'), nullable=False, index=True)
+    
+    # Encoded polyline (precisión 1e-5) y segundos desde el inicio de cada punto
+    polilinea = Column(Text, nullable=False)
+    segundos = Column(Text, nullable=False)
+    
+    inicio = Column(DateTime)
+    fin = Column(DateTime)
+    distancia_km = Column(Float)
+    puntos_originales = Column(Integer)
+    puntos_guardados = Column(Integer)
+    tolerancia_metros = Column(Float)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class ParametrosOptimizacion(Base):
     """Configuración del motor de optimización"""
     __tablename__ = "parametros_optimizacion"
@@ -1,24 +1,37 @@
 # app/routes/api.py - Actualizado con endpoints de optimización
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.database import get_db
 from app.services import gemini_ocr, pdf_parser
 from app.services.route_optimizer import RouteOptimizer
+from app.services.optimization_jobs import gestor_trabajos, TrabajoEnCurso
+from app.services.parameter_sweep import comparar_variantes, resumir_plan
+from app.services.tracking_ingest import MAX_PUNTOS_LOTE
+from app.services.live_fleet import flota_en_vivo
+from app.services.live_feed import publicador_flota
+from app.services.live_eta import motor_eta
+from app.services.track_retention import trayectoria_de_ruta
+from app.config import settings
 from app.models import (
     Ruta, Entrega, Camion, Cliente, Zona, ParametrosOptimizacion,
     EstadoEntrega, EstadoRuta, Chofer
 )
 from datetime import date, datetime, timedelta
 from typing import List, Optional
+import asyncio
+import json
 import shutil
 from pathlib import Path
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 router = APIRouter()
 
+# Cada cuánto revisa el stream SSE si hay eventos nuevos
+INTERVALO_EVENTOS_SEGUNDOS = 0.5
+
 # ========== SCHEMAS ==========
 
 class EntregaCreate(BaseModel):
@@ -56,90 +69,219 @@ class ParametrosUpdate(BaseModel):
     max_horas_ruta: Optional[float] = None
     max_entregas_por_ruta: Optional[int] = None
 
+class VarianteParametros(BaseModel):
+    # Campos desconocidos (p. ej. los pesos, que el optimizador no usa) -> 422
+    model_config = ConfigDict(extra="forbid")
+
+    nombre: str
+    max_horas_ruta: Optional[float] = None
+    max_entregas_por_ruta: Optional[int] = None
+    max_km_por_ruta: Optional[float] = None
+    tiempo_carga_inicial_min: Optional[int] = None
+    margen_seguridad_peso: Optional[float] = None
+    margen_seguridad_volumen: Optional[float] = None
+    costo_combustible_litro: Optional[float] = None
+    costo_hora_operacion: Optional[float] = None
+    costo_km_mantenimiento: Optional[float] = None
+    algoritmo_preferido: Optional[str] = None
+    max_iteraciones: Optional[int] = None
+
+class PuntoGPS(BaseModel):
+    camion_id: int
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+    timestamp: Optional[datetime] = None
+    velocidad_kmh: Optional[float] = Field(None, ge=0)
+    rumbo_grados: Optional[float] = Field(None, ge=0, le=360)
+    precision_metros: Optional[float] = Field(None, ge=0)
+    ruta_id: Optional[int] = None
+
+class ResultadoEntrega(BaseModel):
+    entregada: bool
+    motivo_no_entrega: Optional[str] = Field(None, max_length=255)
+    notas_chofer: Optional[str] = None
+
+class LoteTracking(BaseModel):
+    puntos: List[PuntoGPS] = Field(..., max_length=MAX_PUNTOS_LOTE)
+
+class ComparacionParametros(BaseModel):
+    fecha: Optional[date] = None
+    presupuesto_segundos: Optional[float] = None
+    variantes: List[VarianteParametros]
+
 # ========== ENDPOINTS DE OPTIMIZACIÓN ==========
 
-@router.post("/optimizar-rutas")
+@router.post("/optimizar-rutas", status_code=202)
 async def optimizar_rutas(
     fecha: Optional[str] = Query(None, description="Fecha en formato YYYY-MM-DD"),
-    db: Session = Depends(get_db)
+    presupuesto_segundos: Optional[float] = Query(
+        None, gt=0, description="Tiempo máximo de búsqueda (modo anytime)"
+    )
 ):
     """
-    Optimiza las rutas para un día específico
+    Encola la optimización de rutas de un día específico
+    El avance y el resultado se consultan en /api/optimizaciones/{job_id};
+    las mejoras en vivo, por SSE en /api/optimizaciones/{job_id}/eventos
     """
+    # Usar fecha de hoy si no se proporciona
     try:
-        # Usar fecha de hoy si no se proporciona
-        if fecha:
-            fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
-        else:
-            fecha_obj = date.today()
-        
-        # Crear instancia del optimizador
-        optimizer = RouteOptimizer(db)
-        
-        # Ejecutar optimización
-        inicio = datetime.now()
-        rutas = optimizer.optimizar_dia(fecha_obj)
-        tiempo_calculo = (datetime.now() - inicio).total_seconds()
-        
-        if not rutas:
-            return JSONResponse({
-                "success": False,
-                "message": "No se pudieron crear rutas. Verifica que haya entregas pendientes y camiones disponibles.",
-                "rutas_creadas": 0,
-                "entregas_asignadas": 0
-            })
-        
-        # Calcular métricas agregadas
-        total_entregas = sum(r.cantidad_entregas for r in rutas)
-        total_km = sum(r.distancia_total_km for r in rutas)
-        total_costo = sum(r.costo_total_estimado for r in rutas)
-        total_valor = sum(r.valor_total_facturas for r in rutas)
-        score_promedio = sum(r.score_optimizacion for r in rutas) / len(rutas)
-        
-        # Formatear respuesta
-        rutas_response = [
-            RutaResponse(
-                id=r.id,
-                codigo=r.codigo,
-                camion_placa=r.camion.placa,
-                chofer_nombre=r.chofer.nombre if r.chofer else "Sin asignar",
-                cantidad_entregas=r.cantidad_entregas,
-                distancia_total_km=round(r.distancia_total_km, 2),
-                tiempo_total_estimado_min=r.tiempo_total_estimado_min,
-                costo_total_estimado=round(r.costo_total_estimado, 2),
-                score_optimizacion=r.score_optimizacion,
-                valor_total_facturas=round(r.valor_total_facturas, 2)
-            )
-            for r in rutas
-        ]
-        
-        return {
-            "success": True,
-            "message": f"Rutas optimizadas exitosamente para {fecha_obj}",
-            "rutas_creadas": len(rutas),
-            "entregas_asignadas": total_entregas,
-            "rutas": rutas_response,
-            "metricas": {
-                "distancia_total_km": round(total_km, 2),
-                "costo_total_estimado": round(total_costo, 2),
-                "valor_total_facturas": round(total_valor, 2),
-                "score_promedio": round(score_promedio, 1),
-                "tiempo_calculo_segundos": round(tiempo_calculo, 2),
-                "km_promedio_por_ruta": round(total_km / len(rutas), 2),
-                "entregas_promedio_por_ruta": round(total_entregas / len(rutas), 1)
-            }
-        }
-        
-    except Exception as e:
+        fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date() if fecha else date.today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, usa YYYY-MM-DD")
+    
+    try:
+        trabajo = gestor_trabajos.encolar(fecha_obj, presupuesto_segundos)
+    except TrabajoEnCurso as e:
         return JSONResponse(
-            status_code=500,
+            status_code=409,
             content={
                 "success": False,
-                "message": f"Error en optimización: {str(e)}",
-                "rutas_creadas": 0,
-                "entregas_asignadas": 0
+                "message": str(e),
+                "job_id": e.trabajo.id,
+                "url_estado": f"/api/optimizaciones/{e.trabajo.id}"
             }
         )
+    
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "message": f"Optimización encolada para {fecha_obj}",
+            "job_id": trabajo.id,
+            "estado": trabajo.estado.value,
+            "url_estado": f"/api/optimizaciones/{trabajo.id}",
+            "url_eventos": f"/api/optimizaciones/{trabajo.id}/eventos"
+        }
+    )
+
+@router.post("/simular-optimizacion")
+def simular_optimizacion(
+    fecha: Optional[str] = Query(None, description="Fecha en formato YYYY-MM-DD"),
+    db: Session = Depends(get_db)
+):
+    """
+    Optimiza el día con los parámetros activos sin guardar nada:
+    no crea rutas ni asigna entregas (what-if)
+    """
+    try:
+        fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date() if fecha else date.today()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, usa YYYY-MM-DD")
+    
+    optimizer = RouteOptimizer(db)
+    rutas = optimizer.planificar_dia(fecha_obj)
+    n_paradas = len(optimizer.matriz.indice) if optimizer.matriz else 0
+    # Solo se confirman las distancias nuevas del cache
+    db.commit()
+    
+    return {
+        "fecha": fecha_obj.isoformat(),
+        "simulacion": True,
+        **resumir_plan(rutas, n_paradas),
+        "rutas": [
+            {
+                "camion_id": r.vehiculo.id,
+                "chofer_id": r.vehiculo.chofer_id,
+                "entregas": [p.entrega_id for p in r.paradas],
+                "distancia_total_km": r.metricas["distancia_total_km"],
+                "tiempo_total_estimado_min": r.metricas["tiempo_total_estimado_min"],
+                "hora_fin_estimada": r.metricas["hora_fin_estimada"].strftime("%H:%M"),
+                "costo_total_estimado": r.metricas["costo_total_estimado"],
+                "score_optimizacion": r.metricas["score_optimizacion"]
+            }
+            for r in rutas
+        ]
+    }
+
+@router.post("/comparar-parametros")
+def comparar_parametros(
+    comparacion: ComparacionParametros,
+    db: Session = Depends(get_db)
+):
+    """
+    Evalúa en paralelo varias variantes de parámetros (márgenes, máximos
+    por ruta, costos, algoritmo) sobre el mismo snapshot del día, sin
+    guardar nada. Devuelve la tabla comparativa de costo, km, rutas y tiempo
+    """
+    variantes = [
+        (v.nombre, v.model_dump(exclude={"nombre"}, exclude_none=True))
+        for v in comparacion.variantes
+    ]
+    try:
+        return comparar_variantes(
+            db,
+            comparacion.fecha or date.today(),
+            variantes,
+            comparacion.presupuesto_segundos
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/optimizaciones/{job_id}")
+async def estado_optimizacion(job_id: str):
+    """
+    Estado, progreso, tiempos por fase y resultado de una optimización
+    """
+    trabajo = gestor_trabajos.obtener(job_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Optimización no encontrada")
+    
+    return trabajo.a_dict()
+
+@router.get("/optimizaciones/{job_id}/eventos")
+async def eventos_optimizacion(job_id: str, request: Request):
+    """
+    Server-Sent Events de una optimización: progreso, cada mejora del mejor
+    plan (costo, km, rutas, iteración) y el resultado final
+    Con el encabezado Last-Event-ID se retoma donde quedó la conexión
+    """
+    trabajo = gestor_trabajos.obtener(job_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Optimización no encontrada")
+    
+    try:
+        ultimo = int(request.headers.get("last-event-id", 0))
+    except ValueError:
+        ultimo = 0
+    
+    async def transmitir():
+        nonlocal ultimo
+        espera = 0.0
+        while not await request.is_disconnected():
+            eventos = trabajo.eventos_desde(ultimo)
+            for numero, tipo, datos in eventos:
+                yield f"id: {numero}\nevent: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+                ultimo = numero
+                if tipo == "fin":
+                    return
+            if not eventos:
+                espera += INTERVALO_EVENTOS_SEGUNDOS
+                if espera >= 15:
+                    # Comentario keep-alive para proxies
+                    yield ": ping\n\n"
+                    espera = 0.0
+            await asyncio.sleep(INTERVALO_EVENTOS_SEGUNDOS)
+    
+    return StreamingResponse(
+        transmitir(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/optimizaciones/{job_id}/aceptar")
+async def aceptar_optimizacion(job_id: str):
+    """
+    Acepta la mejor solución encontrada hasta ahora: la búsqueda se corta
+    y se guardan las rutas de ese plan
+    """
+    trabajo = gestor_trabajos.obtener(job_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Optimización no encontrada")
+    if not trabajo.activo:
+        return {"success": False, "message": "La optimización ya terminó"}
+    
+    trabajo.aceptar()
+    return {"success": True, "message": "Se guardará la mejor solución actual"}
 
 @router.get("/rutas")
 async def listar_rutas(
@@ -247,6 +389,33 @@ async def detalle_ruta(ruta_id: int, db: Session = Depends(get_db)):
         "entregas": entregas_detalle
     }
 
+@router.get("/rutas/{ruta_id}/trayectoria")
+def trayectoria_ruta(ruta_id: int, db: Session = Depends(get_db)):
+    """
+    Recorrido real de una ruta para repetirlo en el mapa: polilínea
+    codificada y puntos [lat, lng, segundos desde el inicio]. Las rutas
+    terminadas se leen de su trayectoria comprimida (una fila)
+    """
+    trayectoria = trayectoria_de_ruta(db, ruta_id, settings.TRACKING_TOLERANCIA_METROS)
+    if trayectoria is None:
+        raise HTTPException(status_code=404, detail="La ruta no tiene recorrido registrado")
+    return trayectoria
+
+@router.get("/rutas/{ruta_id}/eta")
+def eta_ruta(ruta_id: int):
+    """
+    Hora estimada de llegada a cada entrega pendiente y de regreso al
+    almacén, según la última posición del camión (también se empujan por
+    /api/flota/eventos en cada ciclo)
+    """
+    eta = motor_eta.obtener(ruta_id)
+    if eta is None:
+        raise HTTPException(
+            status_code=404,
+            detail="La ruta no está en curso, no tiene entregas pendientes o el camión no reportó posición"
+        )
+    return eta
+
 @router.post("/rutas/{ruta_id}/iniciar")
 async def iniciar_ruta(ruta_id: int, db: Session = Depends(get_db)):
     """
@@ -269,11 +438,51 @@ async def iniciar_ruta(ruta_id: int, db: Session = Depends(get_db)):
     ruta.camion.en_ruta = True
     
     db.commit()
+    flota_en_vivo.iniciar_ruta(ruta.camion_id, ruta.id, len(ruta.entregas))
+    publicador_flota.entregas_cambiaron([
+        {"entrega_id": e.id, "estado": EstadoEntrega.EN_RUTA.value, "ruta_id": ruta.id}
+        for e in ruta.entregas
+    ])
     
     return {"success": True, "message": "Ruta iniciada"}
 
+@router.post("/entregas/{entrega_id}/resultado")
+def registrar_resultado_entrega(
+    entrega_id: int,
+    resultado: ResultadoEntrega,
+    db: Session = Depends(get_db)
+):
+    """
+    El chofer informa si entregó o no una entrega de su ruta en curso:
+    actualiza el avance del camión, las estadísticas y las ETAs de la ruta
+    """
+    entrega = db.query(Entrega).filter(Entrega.id == entrega_id).first()
+    
+    if not entrega:
+        raise HTTPException(status_code=404, detail="Entrega no encontrada")
+    if entrega.estado != EstadoEntrega.EN_RUTA or not entrega.ruta or entrega.ruta.estado != EstadoRuta.EN_CURSO:
+        raise HTTPException(status_code=400, detail="La entrega no está en una ruta en curso")
+    
+    if resultado.entregada:
+        entrega.estado = EstadoEntrega.ENTREGADO
+        entrega.fecha_entrega_real = datetime.now()
+    else:
+        entrega.estado = EstadoEntrega.NO_ENTREGADO
+        entrega.motivo_no_entrega = resultado.motivo_no_entrega
+    if resultado.notas_chofer:
+        entrega.notas_chofer = resultado.notas_chofer
+    
+    db.commit()
+    if resultado.entregada:
+        flota_en_vivo.entrega_completada(entrega.ruta.camion_id)
+    publicador_flota.entregas_cambiaron([{
+        "entrega_id": entrega.id, "estado": entrega.estado.value, "ruta_id": entrega.ruta_id
+    }])
+    
+    return {"success": True, "estado": entrega.estado.value}
+
 @router.post("/reasignar-entrega")
-async def reasignar_entrega(
+def reasignar_entrega(
     entrega_id: int,
     nueva_ruta_id: int,
     db: Session = Depends(get_db)
@@ -284,6 +493,9 @@ async def reasignar_entrega(
     optimizer = RouteOptimizer(db)
     
     if optimizer.reasignar_entrega(entrega_id, nueva_ruta_id):
+        publicador_flota.entregas_cambiaron([{
+            "entrega_id": entrega_id, "estado": EstadoEntrega.ASIGNADO.value, "ruta_id": nueva_ruta_id
+        }])
         return {"success": True, "message": "Entrega reasignada exitosamente"}
     else:
         raise HTTPException(
@@ -291,6 +503,55 @@ async def reasignar_entrega(
             detail="No se pudo reasignar la entrega. Verifica capacidad disponible."
         )
 
+@router.post("/insertar-entrega")
+def insertar_entrega(
+    entrega_id: int,
+    ruta_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Inserta una entrega pendiente en una ruta ya planificada (la indicada
+    o la más conveniente del día) sin volver a optimizar todo el día
+    """
+    optimizer = RouteOptimizer(db)
+    ruta = optimizer.insertar_entrega(entrega_id, ruta_id)
+    
+    if not ruta:
+        raise HTTPException(
+            status_code=400,
+            detail="Ninguna ruta planificada admite la entrega (capacidad, compatibilidad u horario)."
+        )
+    
+    publicador_flota.entregas_cambiaron([{
+        "entrega_id": entrega_id, "estado": EstadoEntrega.ASIGNADO.value, "ruta_id": ruta.id
+    }])
+    return {
+        "success": True,
+        "ruta_id": ruta.id,
+        "codigo": ruta.codigo,
+        "cantidad_entregas": ruta.cantidad_entregas,
+        "distancia_total_km": ruta.distancia_total_km,
+        "tiempo_total_estimado_min": ruta.tiempo_total_estimado_min,
+        "score_optimizacion": ruta.score_optimizacion
+    }
+
+@router.post("/quitar-entrega")
+def quitar_entrega(entrega_id: int, db: Session = Depends(get_db)):
+    """
+    Saca una entrega de su ruta planificada y la deja pendiente
+    """
+    optimizer = RouteOptimizer(db)
+    
+    if optimizer.quitar_entrega(entrega_id):
+        publicador_flota.entregas_cambiaron([{
+            "entrega_id": entrega_id, "estado": EstadoEntrega.PENDIENTE.value, "ruta_id": None
+        }])
+        return {"success": True, "message": "Entrega quitada de la ruta"}
+    raise HTTPException(
+        status_code=400,
+        detail="La entrega no está en una ruta planificada."
+    )
+
 # ========== PARÁMETROS DE OPTIMIZACIÓN ==========
 
 @router.get("/parametros-optimizacion")
@@ -373,54 +634,12 @@ async def actualizar_parametros(
 # ========== ESTADÍSTICAS Y DASHBOARD ==========
 
 @router.get("/dashboard/stats")
-async def dashboard_stats(db: Session = Depends(get_db)):
+def dashboard_stats():
     """
-    Estadísticas para el dashboard principal
+    Estadísticas para el dashboard principal (las mismas que empuja
+    /api/flota/eventos; se recalculan a lo sumo una vez por ciclo del canal)
     """
-    hoy = date.today()
-    
-    # Entregas de hoy
-    entregas_hoy = db.query(Entrega).filter(
-        func.date(Entrega.fecha_factura) == hoy
-    ).count()
-    
-    # Completadas
-    completadas = db.query(Entrega).filter(
-        func.date(Entrega.fecha_factura) == hoy,
-        Entrega.estado == EstadoEntrega.ENTREGADO
-    ).count()
-    
-    # Valor entregado
-    valor_entregado = db.query(func.sum(Entrega.monto_total)).filter(
-        func.date(Entrega.fecha_factura) == hoy,
-        Entrega.estado == EstadoEntrega.ENTREGADO
-    ).scalar() or 0
-    
-    # Valor total
-    valor_total = db.query(func.sum(Entrega.monto_total)).filter(
-        func.date(Entrega.fecha_factura) == hoy
-    ).scalar() or 0
-    
-    # Pendientes
-    pendientes = entregas_hoy - completadas
-    valor_pendiente = valor_total - valor_entregado
-    
-    # Rutas activas
-    rutas_activas = db.query(Ruta).filter(
-        Ruta.fecha == hoy,
-        Ruta.estado == EstadoRuta.EN_CURSO
-    ).count()
-    
-    return {
-        "entregas_total": entregas_hoy,
-        "entregas_completadas": completadas,
-        "entregas_pendientes": pendientes,
-        "valor_entregado": round(valor_entregado, 2),
-        "valor_pendiente": round(valor_pendiente, 2),
-        "valor_total": round(valor_total, 2),
-        "rutas_activas": rutas_activas,
-        "porcentaje_completado": round((completadas / entregas_hoy * 100) if entregas_hoy > 0 else 0, 1)
-    }
+    return publicador_flota.estadisticas()
 
 # ========== ENDPOINTS EXISTENTES (mantener) ==========
 
@@ -453,26 +672,74 @@ async def upload_photo(file: UploadFile = File(...), db: Session = Depends(get_d
     return {"success": True, "data": data}
 
 @router.post("/actualizar-tracking/{camion_id}")
-async def actualizar_tracking(
-    camion_id: int, 
-    lat: float, 
-    lng: float, 
-    db: Session = Depends(get_db)
-):
-    """Actualizar posición de camión"""
-    camion = db.query(Camion).filter(Camion.id == camion_id).first()
+def actualizar_tracking(camion_id: int, lat: float, lng: float):
+    """Actualizar posición de camión (un punto; para flotas usar /tracking/lote)"""
+    resultado = flota_en_vivo.registrar([{"camion_id": camion_id, "lat": lat, "lng": lng}])
     
-    if not camion:
+    if not resultado["aceptados"]:
         raise HTTPException(status_code=404, detail="Camión no encontrado")
     
-    camion.ultima_lat = lat
-    camion.ultima_lng = lng
-    camion.ultima_actualizacion = datetime.now()
-    
-    db.commit()
-    
     return {"success": True}
 
+@router.post("/tracking/lote")
+def tracking_lote(lote: LoteTracking):
+    """
+    Ingesta de posiciones GPS de muchos camiones: el estado en vivo se
+    actualiza al instante y los puntos se escriben en tracking_historial en
+    el próximo volcado por lotes (cada FLOTA_VOLCADO_SEGUNDOS)
+    """
+    resultado = flota_en_vivo.registrar(p.model_dump() for p in lote.puntos)
+    return {"success": True, "recibidos": len(lote.puntos), **resultado}
+
+@router.get("/flota/posiciones")
+async def flota_posiciones():
+    """Última posición, velocidad y avance de ruta de toda la flota (desde memoria)"""
+    return {"camiones": flota_en_vivo.posiciones()}
+
+@router.get("/flota/eventos")
+async def eventos_flota(request: Request):
+    """
+    Server-Sent Events para los tableros: al conectar, toda la flota y las
+    estadísticas; después, posiciones de los camiones que se movieron,
+    cambios de estado de entregas y estadísticas cuando cambian
+    """
+    suscripcion = publicador_flota.suscribir()
+    
+    def evento(tipo: str, datos: dict) -> str:
+        return f"event: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+    
+    async def transmitir():
+        try:
+            for tipo, datos in await asyncio.to_thread(publicador_flota.estado_completo):
+                yield evento(tipo, datos)
+            while not await request.is_disconnected():
+                siguiente = await suscripcion.siguiente(15)
+                if siguiente is None:
+                    # Comentario keep-alive para proxies
+                    yield ": ping\n\n"
+                elif siguiente[0] == "resincronizar":
+                    suscripcion.resincronizar = False
+                    for tipo, datos in await asyncio.to_thread(publicador_flota.estado_completo):
+                        yield evento(tipo, datos)
+                else:
+                    yield evento(*siguiente)
+        finally:
+            publicador_flota.desuscribir(suscripcion)
+    
+    return StreamingResponse(
+        transmitir(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/flota/{camion_id}")
+async def flota_camion(camion_id: int):
+    """Estado en vivo de un camión (desde memoria)"""
+    estado = flota_en_vivo.obtener(camion_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Camión no encontrado")
+    return estado
+
 
 @router.post("/resetear-rutas")
 async def resetear_rutas(db: Session = Depends(get_db)):
@@ -491,12 +758,16 @@ async def resetear_rutas(db: Session = Depends(get_db)):
         })
         
         # Eliminar rutas de hoy
+        rutas = [ruta_id for ruta_id, in db.query(Ruta.id).filter(Ruta.fecha == hoy)]
         db.query(Ruta).filter(Ruta.fecha == hoy).delete()
         
         # Resetear camiones
         db.query(Camion).update({"en_ruta": False})
         
         db.commit()
+        flota_en_vivo.rutas_eliminadas(rutas)
+        motor_eta.invalidar()
+        publicador_flota.invalidar_estadisticas()
         
         return {"success": True, "message": "Sistema reseteado"}
     except Exception as e:
@@ -0,0 +1,115 @@
+# app/services/anytime.py
+"""
+Optimización Anytime
+Seguimiento de una corrida con presupuesto de tiempo: los algoritmos
+reportan cada mejora del mejor plan y consultan si deben cortar (tiempo
+agotado o el despachador aceptó la mejor solución actual). Cortar nunca
+pierde trabajo: siempre se guarda el mejor plan encontrado hasta ahí.
+"""
+
+from app.services.problem_snapshot import Problema
+from typing import Callable, Dict, Iterable, Optional, Sequence
+import math
+import threading
+import time
+
+# Mejora mínima de costo que se considera una nueva solución
+EPSILON_COSTO = 1e-6
+
+# Intervalo mínimo entre mejoras publicadas (las intermedias se resumen)
+INTERVALO_REPORTE_SEGUNDOS = 0.25
+
+
+class Convergencia:
+    """
+    Mejor costo conocido, presupuesto y pedido de corte de una corrida
+    Sin presupuesto ni suscriptor se comporta como una corrida normal
+    """
+
+    def __init__(
+        self,
+        presupuesto_segundos: Optional[float] = None,
+        al_mejorar: Optional[Callable[[Dict], None]] = None
+    ):
+        self.presupuesto_segundos = presupuesto_segundos
+        self.al_mejorar = al_mejorar
+        self.mejor_costo = math.inf
+        self.mejoras = 0
+        self._pendiente: Optional[Dict] = None
+        self._ultimo_reporte = -math.inf
+        self._cortar = threading.Event()
+        self.iniciar()
+
+    def iniciar(self):
+        """Empieza a contar el presupuesto (p. ej. al salir de la cola)"""
+        self.inicio = time.monotonic()
+        self.limite = (
+            self.inicio + self.presupuesto_segundos if self.presupuesto_segundos else math.inf
+        )
+
+    def detener(self):
+        """Acepta la mejor solución actual: los algoritmos cortan en su próxima iteración"""
+        self._cortar.set()
+
+    @property
+    def detenida(self) -> bool:
+        return self._cortar.is_set()
+
+    @property
+    def agotada(self) -> bool:
+        return self._cortar.is_set() or time.monotonic() >= self.limite
+
+    def restante(self) -> float:
+        """Segundos de presupuesto que quedan (inf sin presupuesto)"""
+        return max(0.0, self.limite - time.monotonic())
+
+    def reportar(
+        self,
+        fase: str,
+        problema: Problema,
+        rutas: Iterable[Sequence[int]],
+        iteracion: int,
+        costo: Optional[float] = None
+    ) -> bool:
+        """
+        Registra el plan si mejora al mejor conocido y lo publica
+        (a lo sumo cada INTERVALO_REPORTE_SEGUNDOS)
+        Returns: True si fue una mejora
+        """
+        rutas = list(rutas)
+        costo = problema.costo(rutas) if costo is None else costo
+        if costo >= self.mejor_costo - EPSILON_COSTO:
+            return False
+
+        self.mejor_costo = costo
+        self.mejoras += 1
+        if self.al_mejorar is None:
+            return True
+
+        # Los km se calculan recién al publicar: entre reportes solo se
+        # guarda la referencia (los algoritmos reemplazan rutas, no las mutan)
+        self._pendiente = {
+            "fase": fase,
+            "iteracion": iteracion,
+            "costo": round(costo, 2),
+            "segundos": round(time.monotonic() - self.inicio, 2),
+            "_plan": (problema, rutas)
+        }
+        if time.monotonic() - self._ultimo_reporte >= INTERVALO_REPORTE_SEGUNDOS:
+            self.publicar()
+        return True
+
+    def publicar(self):
+        """Publica la última mejora aún no enviada"""
+        if self._pendiente is None or self.al_mejorar is None:
+            return
+        mejora, self._pendiente = self._pendiente, None
+        problema, rutas = mejora.pop("_plan")
+        rutas = [paradas for paradas in rutas if paradas]
+        mejora.update(
+            km=round(sum(problema.distancia_ruta(paradas) for paradas in rutas), 2),
+            rutas=len(rutas),
+            asignadas=sum(len(paradas) for paradas in rutas)
+        )
+        self.al_mejorar(mejora)
+        self._ultimo_reporte = time.monotonic()
@@ -0,0 +1,63 @@
+# app/services/compatibility.py
+"""
+Compatibilidad Vehículo × Parada
+Cada parada declara sus requisitos y cada vehículo sus aptitudes como bits;
+una sola pasada vectorizada compila la matriz booleana (vehículos, paradas)
+que consultan todos los algoritmos. Agregar una restricción es agregar un
+bit, sin tocar los bucles de asignación.
+"""
+
+import numpy as np
+
+# Bits de requisito (parada) y aptitud (vehículo)
+REFRIGERACION = 1 << 0         # Entrega refrigerada / camión con frío
+CAMINOS_ADVERSOS = 1 << 1      # Zona 4x4 / camión apto para caminos adversos
+LLUVIA_FUERTE = 1 << 2         # Zona problemática con lluvia (solo si llueve)
+CHOFER_CAMINOS_DIFICILES = 1 << 3  # Zona 4x4 o caminos malos / chofer apto
+
+
+def requisitos_zona(zona, lluvia: bool = False) -> int:
+    """Requisitos de acceso de una Zona"""
+    requisitos = 0
+    if zona.requiere_vehiculo_4x4:
+        requisitos |= CAMINOS_ADVERSOS | CHOFER_CAMINOS_DIFICILES
+    if zona.condicion_caminos == "malo":
+        requisitos |= CHOFER_CAMINOS_DIFICILES
+    if lluvia and zona.problematico_lluvia:
+        requisitos |= LLUVIA_FUERTE
+    return requisitos
+
+
+def aptitudes_camion(camion) -> int:
+    """Aptitudes de un Camion y su chofer asignado"""
+    aptitudes = 0
+    if camion.tiene_refrigeracion:
+        aptitudes |= REFRIGERACION
+    if camion.apto_caminos_adversos:
+        aptitudes |= CAMINOS_ADVERSOS
+    if camion.apto_lluvia_fuerte is not False:
+        aptitudes |= LLUVIA_FUERTE
+    if camion.chofer_asignado is not None and camion.chofer_asignado.apto_caminos_dificiles:
+        aptitudes |= CHOFER_CAMINOS_DIFICILES
+    return aptitudes
+
+
+def compilar_compatibilidad(
+    requisitos: np.ndarray,
+    aptitudes: np.ndarray,
+    peso: np.ndarray,
+    volumen: np.ndarray,
+    peso_max: np.ndarray,
+    volumen_max: np.ndarray
+) -> np.ndarray:
+    """
+    Matriz (vehículos, paradas): el vehículo cumple todos los requisitos de
+    la parada y la carga de la parada sola cabe en él
+    """
+    return (
+        (requisitos[None, :] & ~aptitudes[:, None]) == 0
+    ) & (
+        peso[None, :] <= peso_max[:, None]
+    ) & (
+        volumen[None, :] <= volumen_max[:, None]
+    )
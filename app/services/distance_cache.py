@@ -0,0 +1,330 @@
+# app/services/distance_cache.py
+"""
+Cache de Distancias en dos niveles
+1. LRU en memoria del proceso
+2. Tabla matriz_distancias (precarga de todos los pares del día en una consulta)
+Los pares que faltan se calculan con el motor (red vial local si está
+configurada, si no Haversine) y se guardan en un solo insert dentro de la
+transacción de quien llama: el proveedor nunca hace commit.
+Cada par lleva el nombre del motor que lo calculó y solo se reutiliza con
+ese mismo motor
+"""
+
+from sqlalchemy import func, insert, inspect, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import MatrizDistancia
+from app.services.distance_matrix import haversine_km
+from app.services.road_network import motor_por_defecto
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Coordenadas redondeadas a 4 decimales (~11 m) para la clave del cache
+DECIMALES_CACHE = 4
+
+# Máximo de ids por sentencia al actualizar hits
+IDS_POR_SENTENCIA = 5000
+
+# Columnas del índice único de matriz_distancias (un par por motor y fila)
+COLUMNAS_CLAVE = ("origen_lat", "origen_lng", "destino_lat", "destino_lng", "motor")
+
+Punto = Tuple[float, float]
+
+
+def redondear(lat: float, lng: float) -> Punto:
+    """Clave de cache de una coordenada"""
+    return (round(lat, DECIMALES_CACHE), round(lng, DECIMALES_CACHE))
+
+
+def preparar_tabla(bind: Engine):
+    """
+    Pone al día una matriz_distancias creada por versiones anteriores:
+    columna motor e índice único por par y motor. Es un cache, así que las
+    filas sin motor conocido y los pares repetidos se borran
+    """
+    inspector = inspect(bind)
+    tabla = MatrizDistancia.__tablename__
+    columnas = {c["name"] for c in inspector.get_columns(tabla)}
+    unico = next(
+        (i for i in inspector.get_indexes(tabla) if i["name"] == "uq_origen_destino"), None
+    )
+    if "motor" in columnas and unico is not None and "motor" in unico["column_names"]:
+        return
+
+    clave = ", ".join(COLUMNAS_CLAVE)
+    with bind.begin() as conexion:
+        if "motor" not in columnas:
+            borradas = conexion.execute(text(f"DELETE FROM {tabla}")).rowcount
+            conexion.execute(text(
+                f"ALTER TABLE {tabla} ADD COLUMN motor VARCHAR(30) NOT NULL DEFAULT ''"
+            ))
+        else:
+            borradas = conexion.execute(text(
+                f"DELETE FROM {tabla} WHERE id NOT IN "
+                f"(SELECT MIN(id) FROM {tabla} GROUP BY {clave})"
+            )).rowcount
+        conexion.execute(text("DROP INDEX IF EXISTS idx_origen_destino"))
+        conexion.execute(text("DROP INDEX IF EXISTS uq_origen_destino"))
+        conexion.execute(text(f"CREATE UNIQUE INDEX uq_origen_destino ON {tabla} ({clave})"))
+    logger.info(f"📏 Índice único de {tabla} creado ({borradas} filas borradas)")
+
+
+def insertar_ignorando_repetidos(db: Session, registros: List[Dict]):
+    """
+    Insert en lote que ignora los pares que otra sesión ya guardó
+    (ON CONFLICT DO NOTHING en PostgreSQL y SQLite)
+    """
+    tabla = MatrizDistancia.__table__
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+    else:
+        db.execute(insert(tabla), registros)
+        return
+    db.execute(
+        insert_dialecto(tabla).on_conflict_do_nothing(index_elements=list(COLUMNAS_CLAVE)),
+        registros
+    )
+
+
+class CacheLRU:
+    """LRU en memoria compartido por todos los optimizadores del proceso"""
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener_muchos(
+        self,
+        claves: Sequence[Hashable],
+        ahora: datetime
+    ) -> List[Optional[Tuple[float, float]]]:
+        """Devuelve (km, minutos) por clave, o None si falta o expiró"""
+        resultado = []
+        with self._lock:
+            for clave in claves:
+                valor = self._datos.get(clave)
+                if valor is None:
+                    resultado.append(None)
+                elif valor[2] <= ahora:
+                    del self._datos[clave]
+                    resultado.append(None)
+                else:
+                    self._datos.move_to_end(clave)
+                    resultado.append(valor[:2])
+        return resultado
+
+    def guardar_muchos(self, items: Sequence[Tuple[Hashable, tuple]]):
+        """Guarda (clave, (km, minutos, expira_en)) desalojando los más antiguos"""
+        with self._lock:
+            for clave, valor in items:
+                self._datos[clave] = valor
+                self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+_lru = CacheLRU(settings.CACHE_DISTANCIAS_LRU)
+
+
+class ProveedorDistancias:
+    """
+    Entrega matrices de distancia/tiempo consultando primero el LRU,
+    luego matriz_distancias y por último el motor de cálculo
+    """
+
+    def __init__(self, db: Session, motor=None):
+        self.db = db
+        self.motor = motor or motor_por_defecto()
+        self.ttl = timedelta(hours=settings.CACHE_DISTANCIAS_TTL_HORAS)
+
+    def matriz(self, puntos: Sequence[Punto]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matrices (km, minutos) entre todos los puntos recibidos
+        Puntos repetidos (misma clave redondeada) se calculan una sola vez
+        """
+        claves = [redondear(lat, lng) for lat, lng in puntos]
+        unicos = list(dict.fromkeys(claves))
+
+        if len(unicos) > settings.CACHE_DISTANCIAS_MAX_PUNTOS:
+            # Demasiados pares para cachear: el motor vectorizado es más rápido
+            coords = np.asarray(unicos, dtype=np.float64)
+            km, minutos = self.motor.calcular(coords, coords)
+        else:
+            km, minutos = self._matriz_cacheada(unicos)
+
+        if len(unicos) == len(claves):
+            return km, minutos
+
+        posicion = {clave: i for i, clave in enumerate(unicos)}
+        mapa = np.fromiter((posicion[c] for c in claves), dtype=np.intp, count=len(claves))
+        seleccion = np.ix_(mapa, mapa)
+        return km[seleccion], minutos[seleccion]
+
+    def _matriz_cacheada(self, unicos: List[Punto]) -> Tuple[np.ndarray, np.ndarray]:
+        ahora = datetime.utcnow()
+        n = len(unicos)
+
+        km = np.full((n, n), np.nan, dtype=np.float32)
+        minutos = np.full((n, n), np.nan, dtype=np.float32)
+        np.fill_diagonal(km, 0.0)
+        np.fill_diagonal(minutos, 0.0)
+
+        # Nivel 1: LRU en memoria
+        pares = [(i, j) for i, j in product(range(n), repeat=2) if i != j]
+        valores = _lru.obtener_muchos(
+            [(self.motor.nombre, unicos[i], unicos[j]) for i, j in pares], ahora
+        )
+        hits_lru = 0
+        for (i, j), valor in zip(pares, valores):
+            if valor is not None:
+                km[i, j], minutos[i, j] = valor
+                hits_lru += 1
+
+        # Nivel 2: tabla matriz_distancias
+        hits_db = 0
+        if hits_lru < len(pares):
+            hits_db = self._precargar_db(unicos, km, minutos, ahora)
+
+        # Nivel 3: motor de cálculo para los pares restantes
+        calculados = self._calcular_faltantes(unicos, km, minutos, ahora)
+
+        # Sin commit: las filas nuevas se confirman con la transacción de quien llama
+        self.db.flush()
+
+        logger.info(
+            f"📏 Distancias: {hits_lru} LRU, {hits_db} BD, {calculados} calculadas"
+        )
+        return km, minutos
+
+    def _precargar_db(
+        self,
+        unicos: List[Punto],
+        km: np.ndarray,
+        minutos: np.ndarray,
+        ahora: datetime
+    ) -> int:
+        """Carga en una consulta todos los pares vigentes del día"""
+        self._desalojar_expirados(ahora)
+
+        posicion: Dict[Punto, int] = {p: i for i, p in enumerate(unicos)}
+        lats = {p[0] for p in unicos}
+        lngs = {p[1] for p in unicos}
+
+        filas = self.db.query(
+            MatrizDistancia.id,
+            MatrizDistancia.origen_lat,
+            MatrizDistancia.origen_lng,
+            MatrizDistancia.destino_lat,
+            MatrizDistancia.destino_lng,
+            MatrizDistancia.distancia_km,
+            MatrizDistancia.tiempo_min,
+            MatrizDistancia.expira_en
+        ).filter(
+            MatrizDistancia.origen_lat.in_(lats),
+            MatrizDistancia.origen_lng.in_(lngs),
+            MatrizDistancia.destino_lat.in_(lats),
+            MatrizDistancia.destino_lng.in_(lngs),
+            MatrizDistancia.motor == self.motor.nombre,
+            or_(MatrizDistancia.expira_en.is_(None), MatrizDistancia.expira_en > ahora)
+        ).all()
+
+        usados = []
+        para_lru = []
+        for fila in filas:
+            i = posicion.get((fila.origen_lat, fila.origen_lng))
+            j = posicion.get((fila.destino_lat, fila.destino_lng))
+            if i is None or j is None or not np.isnan(km[i, j]):
+                continue
+            km[i, j] = fila.distancia_km
+            minutos[i, j] = fila.tiempo_min
+            usados.append(fila.id)
+            para_lru.append((
+                (self.motor.nombre, unicos[i], unicos[j]),
+                (fila.distancia_km, fila.tiempo_min, fila.expira_en or ahora + self.ttl)
+            ))
+
+        _lru.guardar_muchos(para_lru)
+        self._registrar_hits(usados)
+        return len(usados)
+
+    def _calcular_faltantes(
+        self,
+        unicos: List[Punto],
+        km: np.ndarray,
+        minutos: np.ndarray,
+        ahora: datetime
+    ) -> int:
+        """Calcula con el motor los pares sin cache y los guarda en lote"""
+        faltantes = np.isnan(km)
+        filas = np.flatnonzero(faltantes.any(axis=1))
+        if len(filas) == 0:
+            return 0
+
+        coords = np.asarray(unicos, dtype=np.float64)
+        km_motor, min_motor = self.motor.calcular(coords[filas], coords)
+        lineal = haversine_km(coords[filas], coords)
+
+        expira_en = ahora + self.ttl
+        registros = []
+        para_lru = []
+        for f, j in np.argwhere(faltantes[filas]):
+            i = filas[f]
+            km[i, j] = km_motor[f, j]
+            minutos[i, j] = min_motor[f, j]
+            origen, destino = unicos[i], unicos[j]
+            registros.append({
+                "origen_lat": origen[0],
+                "origen_lng": origen[1],
+                "destino_lat": destino[0],
+                "destino_lng": destino[1],
+                "motor": self.motor.nombre,
+                "distancia_km": float(km_motor[f, j]),
+                "distancia_lineal_km": float(lineal[f, j]),
+                "tiempo_min": int(round(float(min_motor[f, j]))),
+                "fecha_calculo": ahora,
+                "expira_en": expira_en,
+                "hits": 0
+            })
+            para_lru.append((
+                (self.motor.nombre, origen, destino),
+                (float(km_motor[f, j]), float(min_motor[f, j]), expira_en)
+            ))
+
+        # Insert de Core (executemany): evita el costo del unit of work del ORM
+        insertar_ignorando_repetidos(self.db, registros)
+        _lru.guardar_muchos(para_lru)
+        return len(registros)
+
+    def _registrar_hits(self, ids: List[int]):
+        """Incrementa hits de las filas usadas"""
+        for inicio in range(0, len(ids), IDS_POR_SENTENCIA):
+            self.db.query(MatrizDistancia).filter(
+                MatrizDistancia.id.in_(ids[inicio:inicio + IDS_POR_SENTENCIA])
+            ).update(
+                {MatrizDistancia.hits: func.coalesce(MatrizDistancia.hits, 0) + 1},
+                synchronize_session=False
+            )
+
+    def _desalojar_expirados(self, ahora: datetime):
+        """Elimina del cache persistente las filas vencidas"""
+        eliminadas = self.db.query(MatrizDistancia).filter(
+            MatrizDistancia.expira_en < ahora
+        ).delete(synchronize_session=False)
+        if eliminadas:
+            logger.info(f"🧹 {eliminadas} distancias expiradas eliminadas")
@@ -0,0 +1,152 @@
+# app/services/distance_matrix.py
+"""
+Matriz de Distancias
+Calcula en una sola pasada vectorizada (NumPy) las distancias entre el
+almacén y todas las paradas del día. Los algoritmos leen por índice.
+"""
+
+import numpy as np
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+RADIO_TIERRA_KM = 6371.0
+
+# Factor de corrección (calles no son línea recta)
+FACTOR_CORRECCION = 1.3
+
+# Velocidad usada para estimar minutos cuando el motor no conoce el vehículo
+VELOCIDAD_REFERENCIA_KMH = 35.0
+
+# Filas procesadas por bloque (limita la memoria temporal de NumPy)
+FILAS_POR_BLOQUE = 512
+
+# El almacén siempre ocupa el índice 0
+INDICE_ALMACEN = 0
+
+
+def haversine_km(origenes: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+    """
+    Distancia Haversine entre cada origen y cada destino
+    Args: arreglos (n, 2) y (m, 2) de [lat, lng]
+    Returns: matriz (n x m) en kilómetros, línea recta
+    """
+    origenes = np.radians(np.asarray(origenes, dtype=np.float64).reshape(-1, 2))
+    destinos = np.radians(np.asarray(destinos, dtype=np.float64).reshape(-1, 2))
+
+    lat_d, lng_d = destinos[:, 0], destinos[:, 1]
+    cos_lat_d = np.cos(lat_d)
+
+    resultado = np.empty((len(origenes), len(destinos)), dtype=np.float32)
+
+    for inicio in range(0, len(origenes), FILAS_POR_BLOQUE):
+        bloque = origenes[inicio:inicio + FILAS_POR_BLOQUE]
+        lat_o, lng_o = bloque[:, 0:1], bloque[:, 1:2]
+
+        a = (np.sin((lat_d - lat_o) / 2) ** 2 +
+             np.cos(lat_o) * cos_lat_d *
+             np.sin((lng_d - lng_o) / 2) ** 2)
+
+        resultado[inicio:inicio + len(bloque)] = 2 * RADIO_TIERRA_KM * np.arcsin(
+            np.sqrt(np.clip(a, 0.0, 1.0))
+        )
+
+    return resultado
+
+
+def haversine_pares_km(origenes: np.ndarray, destinos: np.ndarray) -> np.ndarray:
+    """
+    Distancia Haversine entre cada origen y el destino de su misma fila
+    Args: arreglos (n, 2) de [lat, lng]
+    Returns: arreglo de n distancias en kilómetros, línea recta
+    """
+    origenes = np.radians(np.asarray(origenes, dtype=np.float64).reshape(-1, 2))
+    destinos = np.radians(np.asarray(destinos, dtype=np.float64).reshape(-1, 2))
+    lat_o, lng_o = origenes[:, 0], origenes[:, 1]
+    lat_d, lng_d = destinos[:, 0], destinos[:, 1]
+
+    a = (np.sin((lat_d - lat_o) / 2) ** 2 +
+         np.cos(lat_o) * np.cos(lat_d) *
+         np.sin((lng_d - lng_o) / 2) ** 2)
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class MotorHaversine:
+    """Motor de distancias: Haversine con factor de corrección vial"""
+
+    nombre = "haversine"
+
+    def calcular(
+        self,
+        origenes: np.ndarray,
+        destinos: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distancias y tiempos de cada origen a cada destino
+        Returns: (km, minutos), ambas matrices (n x m)
+        """
+        km = haversine_km(origenes, destinos)
+        km *= FACTOR_CORRECCION
+        minutos = km * (60.0 / VELOCIDAD_REFERENCIA_KMH)
+        return km, minutos
+
+
+class MatrizDistancias:
+    """
+    Distancias por carretera (km) entre el almacén y las paradas del día
+    Índice 0 = almacén, índices 1..n = paradas en el orden recibido
+    """
+
+    def __init__(
+        self,
+        km: np.ndarray,
+        claves: Sequence[Hashable],
+        minutos: Optional[np.ndarray] = None,
+        coordenadas: Optional[np.ndarray] = None
+    ):
+        self.km = km
+        self.minutos = minutos
+        # (lat, lng) por índice, si se conocen (para el índice espacial)
+        self.coordenadas = coordenadas
+        self.indice: Dict[Hashable, int] = {
+            clave: i for i, clave in enumerate(claves, 1)
+        }
+
+    @classmethod
+    def desde_coordenadas(
+        cls,
+        almacen: Tuple[float, float],
+        paradas: Sequence[Tuple[float, float]],
+        claves: Sequence[Hashable],
+        motor=None
+    ) -> "MatrizDistancias":
+        """Construye la matriz completa (almacén + paradas) en una pasada"""
+        puntos = np.asarray([almacen] + list(paradas), dtype=np.float64)
+        km, minutos = (motor or MotorHaversine()).calcular(puntos, puntos)
+        return cls(km, claves, minutos, puntos)
+
+    def __len__(self) -> int:
+        return len(self.km)
+
+    def __contains__(self, clave: Hashable) -> bool:
+        return clave in self.indice
+
+    def distancia(self, i: int, j: int) -> float:
+        """Distancia entre dos índices de la matriz"""
+        return float(self.km[i, j])
+
+    def tramos(self, indices: Sequence[int]) -> np.ndarray:
+        """
+        Distancia de cada tramo de un recorrido que sale y vuelve al almacén
+        Returns: arreglo de len(indices) + 1 tramos
+        """
+        recorrido = np.fromiter(
+            [INDICE_ALMACEN, *indices, INDICE_ALMACEN],
+            dtype=np.intp,
+            count=len(indices) + 2
+        )
+        return self.km[recorrido[:-1], recorrido[1:]]
+
+    def distancia_recorrido(self, indices: Sequence[int]) -> float:
+        """Distancia total almacén -> paradas -> almacén"""
+        if not indices:
+            return 0.0
+        return float(self.tramos(indices).sum(dtype=np.float64))
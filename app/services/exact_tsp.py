@@ -0,0 +1,83 @@
+# app/services/exact_tsp.py
+"""
+Secuencia Exacta para Rutas Chicas (Held-Karp)
+Programación dinámica sobre subconjuntos: costo mínimo de salir del almacén,
+visitar exactamente las paradas de la máscara y terminar en j. Cada capa
+(tamaño de subconjunto) se resuelve vectorizada con NumPy; O(2^m · m²).
+Los resultados se memorizan por conjunto de paradas y sus distancias, así
+una ruta que vuelve a secuenciarse sin cambios no se recalcula.
+"""
+
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+import numpy as np
+
+# Tamaño máximo admitido (2^m · m estados)
+MAX_PARADAS_EXACTO = 16
+
+# Conjuntos de paradas memorizados
+MEMO_SECUENCIAS = 4096
+
+
+def secuencia_optima(km: np.ndarray, paradas: Sequence[int]) -> Tuple[float, List[int]]:
+    """
+    Orden de visita de menor distancia almacén -> paradas -> almacén
+    Returns: (km totales, paradas en orden de visita)
+    """
+    if len(paradas) > MAX_PARADAS_EXACTO:
+        raise ValueError(f"Secuencia exacta hasta {MAX_PARADAS_EXACTO} paradas")
+    if len(paradas) <= 1:
+        recorrido = [0, *paradas, 0]
+        return float(km[recorrido[:-1], recorrido[1:]].sum()), list(paradas)
+
+    # Orden canónico: el mismo conjunto comparte la entrada de la memoria
+    ordenadas = sorted(paradas)
+    indices = np.array([0, *ordenadas], dtype=np.intp)
+    distancias = np.ascontiguousarray(km[np.ix_(indices, indices)], dtype=np.float64)
+
+    total, orden = _held_karp(len(ordenadas), distancias.tobytes())
+    return total, [ordenadas[k] for k in orden]
+
+
+@lru_cache(maxsize=MEMO_SECUENCIAS)
+def _held_karp(m: int, distancias: bytes) -> Tuple[float, Tuple[int, ...]]:
+    """
+    Held-Karp sobre la matriz (m + 1) x (m + 1) con el almacén en 0
+    Returns: (costo, posiciones 0..m-1 en orden de visita)
+    """
+    d = np.frombuffer(distancias, dtype=np.float64).reshape(m + 1, m + 1)
+    entre = d[1:, 1:]
+
+    # costo[S, j]: mejor camino almacén -> S terminando en j (j ∈ S)
+    total_mascaras = 1 << m
+    costo = np.full((total_mascaras, m), np.inf)
+    previa = np.zeros((total_mascaras, m), dtype=np.int8)
+    unitarias = 1 << np.arange(m)
+    costo[unitarias, np.arange(m)] = d[0, 1:]
+
+    mascaras = np.arange(total_mascaras)
+    tamano = np.zeros(total_mascaras, dtype=np.int64)
+    for bit in range(m):
+        tamano += (mascaras >> bit) & 1
+
+    for capa in range(2, m + 1):
+        en_capa = mascaras[tamano == capa]
+        for j in range(m):
+            con_j = en_capa[(en_capa >> j) & 1 == 1]
+            # Sin j, costo[., j] es infinito: k recorre solo paradas de S - {j}
+            candidatos = costo[con_j ^ (1 << j)] + entre[:, j][None, :]
+            k = candidatos.argmin(axis=1)
+            costo[con_j, j] = candidatos[np.arange(len(con_j)), k]
+            previa[con_j, j] = k
+
+    completa = total_mascaras - 1
+    cierre = costo[completa] + d[1:, 0]
+    j = int(cierre.argmin())
+    total = float(cierre[j])
+
+    orden = []
+    mascara = completa
+    while mascara:
+        orden.append(j)
+        j, mascara = int(previa[mascara, j]), mascara ^ (1 << j)
+    return total, tuple(reversed(orden))
@@ -0,0 +1,282 @@
+# app/services/genetic.py
+"""
+Algoritmo Genético para VRP
+Evoluciona una población de planes partiendo de la solución greedy.
+Los hijos se generan y evalúan en paralelo (ProcessPoolExecutor) sobre el
+snapshot del problema, que cada proceso recibe una sola vez al iniciar.
+Con menos de MIN_PARADAS_PARALELO paradas se evoluciona en el mismo
+proceso: arrancar el pool y enviarle la matriz cuesta más que lo que ahorra.
+"""
+
+from app.services.problem_snapshot import Plan, Problema
+from app.services.anytime import Convergencia
+from app.services.time_windows import insertar_mas_barato, ruta_factible
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+import multiprocessing
+import random
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+TAMANO_POBLACION = 40
+HIJOS_POR_GENERACION = 48
+TAMANO_TORNEO = 3
+PROBABILIDAD_CRUCE = 0.5
+MAX_MUTACIONES = 3
+
+# Paradas desde las que conviene repartir las generaciones entre procesos
+MIN_PARADAS_PARALELO = 80
+
+# Una lista de paradas por vehículo (vacía si el vehículo no sale)
+Rutas = List[List[int]]
+Individuo = Tuple[float, Rutas]
+
+# Snapshot del problema en cada proceso trabajador
+_problema: Optional[Problema] = None
+
+
+# ========== OPERADORES ==========
+
+def _admite(problema: Problema, v: int, paradas: Sequence[int]) -> bool:
+    """Compatibilidad, capacidad, máximo de entregas, ventanas y límites de la ruta"""
+    return problema.admite(v, paradas) and ruta_factible(problema, v, paradas)
+
+
+def _cruzar(problema: Problema, a: Rutas, b: Rutas, rng: random.Random) -> Rutas:
+    """
+    Cruce por rutas: hereda de A las rutas de algunos vehículos y completa
+    con las rutas de B sin las paradas repetidas
+    """
+    hijo: Rutas = []
+    usadas = set()
+    de_a = [rng.random() < 0.5 for _ in a]
+
+    for v, heredar in enumerate(de_a):
+        hijo.append(list(a[v]) if heredar else [])
+        if heredar:
+            usadas.update(a[v])
+
+    for v, heredar in enumerate(de_a):
+        if not heredar:
+            ruta = [i for i in b[v] if i not in usadas]
+            # Sin desigualdad triangular, quitar paradas puede romper horarios
+            if _admite(problema, v, ruta):
+                hijo[v] = ruta
+                usadas.update(ruta)
+
+    # Reubicar las paradas que quedaron fuera
+    perdidas = {i for ruta in a for i in ruta} - usadas
+    for parada in sorted(perdidas):
+        insertar_mas_barato(problema, hijo, parada)
+
+    return hijo
+
+
+def _mutar_reubicar(problema: Problema, rutas: Rutas, rng: random.Random):
+    """Mueve una parada a otra posición (en la misma u otra ruta)"""
+    origenes = [v for v, r in enumerate(rutas) if r]
+    if not origenes:
+        return
+    a = rng.choice(origenes)
+    posicion = rng.randrange(len(rutas[a]))
+    parada = rutas[a].pop(posicion)
+
+    b = rng.randrange(len(rutas))
+    candidata = list(rutas[b])
+    candidata.insert(rng.randint(0, len(candidata)), parada)
+
+    if _admite(problema, b, candidata) and (b == a or _admite(problema, a, rutas[a])):
+        rutas[b] = candidata
+    else:
+        rutas[a].insert(posicion, parada)
+
+
+def _mutar_intercambiar(problema: Problema, rutas: Rutas, rng: random.Random):
+    """Intercambia dos paradas entre rutas distintas"""
+    origenes = [v for v, r in enumerate(rutas) if r]
+    if len(origenes) < 2:
+        return
+    a, b = rng.sample(origenes, 2)
+    i, j = rng.randrange(len(rutas[a])), rng.randrange(len(rutas[b]))
+
+    nueva_a, nueva_b = list(rutas[a]), list(rutas[b])
+    nueva_a[i], nueva_b[j] = nueva_b[j], nueva_a[i]
+
+    if _admite(problema, a, nueva_a) and _admite(problema, b, nueva_b):
+        rutas[a], rutas[b] = nueva_a, nueva_b
+
+
+def _mutar_invertir(problema: Problema, rutas: Rutas, rng: random.Random):
+    """2-opt aleatorio: invierte un tramo de una ruta"""
+    origenes = [v for v, r in enumerate(rutas) if len(r) >= 3]
+    if not origenes:
+        return
+    v = rng.choice(origenes)
+    i, j = sorted(rng.sample(range(len(rutas[v])), 2))
+    candidata = list(rutas[v])
+    candidata[i:j + 1] = candidata[i:j + 1][::-1]
+    if ruta_factible(problema, v, candidata):
+        rutas[v] = candidata
+
+
+def _mutar_asignar_pendiente(problema: Problema, rutas: Rutas, rng: random.Random):
+    """Intenta insertar una entrega que quedó sin asignar"""
+    asignadas = {i for ruta in rutas for i in ruta}
+    pendientes = [i for i in range(1, problema.n_paradas + 1) if i not in asignadas]
+    if pendientes:
+        insertar_mas_barato(problema, rutas, rng.choice(pendientes))
+
+
+MUTACIONES = (
+    (_mutar_reubicar, 0.35),
+    (_mutar_intercambiar, 0.2),
+    (_mutar_invertir, 0.3),
+    (_mutar_asignar_pendiente, 0.15),
+)
+
+
+def _generar_hijos_con(
+    problema: Problema,
+    parejas: Sequence[Tuple[Rutas, Rutas]],
+    semilla: int
+) -> List[Individuo]:
+    """Cruza, muta y evalúa un lote de hijos"""
+    rng = random.Random(semilla)
+    operadores = [op for op, _ in MUTACIONES]
+    pesos = [peso for _, peso in MUTACIONES]
+
+    hijos = []
+    for a, b in parejas:
+        if rng.random() < PROBABILIDAD_CRUCE:
+            hijo = _cruzar(problema, a, b, rng)
+        else:
+            hijo = [list(ruta) for ruta in a]
+
+        for operador in rng.choices(operadores, pesos, k=rng.randint(1, MAX_MUTACIONES)):
+            operador(problema, hijo, rng)
+
+        hijos.append((problema.costo(hijo), hijo))
+    return hijos
+
+
+# ========== EJECUCIÓN EN PARALELO ==========
+
+def _inicializar_trabajador(problema: Problema):
+    global _problema
+    _problema = problema
+
+
+def _generar_hijos(parejas: Sequence[Tuple[Rutas, Rutas]], semilla: int) -> List[Individuo]:
+    return _generar_hijos_con(_problema, parejas, semilla)
+
+
+class _EjecutorLocal:
+    """Genera hijos en el mismo proceso (menos de MIN_PARADAS_PARALELO paradas o un solo núcleo)"""
+
+    def __init__(self, problema: Problema):
+        self.problema = problema
+
+    def generar(self, parejas, semilla: int) -> List[Individuo]:
+        return _generar_hijos_con(self.problema, parejas, semilla)
+
+    def cerrar(self):
+        pass
+
+
+class _EjecutorParalelo:
+    """Reparte los hijos de cada generación entre todos los núcleos"""
+
+    def __init__(self, problema: Problema, trabajadores: int):
+        self.trabajadores = trabajadores
+        self.pool = ProcessPoolExecutor(
+            max_workers=trabajadores,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_trabajador,
+            initargs=(problema,)
+        )
+
+    def generar(self, parejas, semilla: int) -> List[Individuo]:
+        lotes = [parejas[k::self.trabajadores] for k in range(self.trabajadores)]
+        futuros = [
+            self.pool.submit(_generar_hijos, lote, semilla + k)
+            for k, lote in enumerate(lotes) if lote
+        ]
+        return [hijo for futuro in futuros for hijo in futuro.result()]
+
+    def cerrar(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ========== ALGORITMO ==========
+
+def _plan_a_rutas(problema: Problema, plan: Plan) -> Rutas:
+    rutas: Rutas = [[] for _ in problema.vehiculos]
+    for v, paradas in plan:
+        rutas[v] = list(paradas)
+    return rutas
+
+
+def resolver_genetico(
+    problema: Problema,
+    plan_inicial: Plan,
+    max_iteraciones: int,
+    presupuesto_segundos: float,
+    trabajadores: Optional[int] = None,
+    semilla: int = 0,
+    convergencia: Optional[Convergencia] = None
+) -> Tuple[Plan, int]:
+    """
+    Evoluciona desde plan_inicial hasta agotar generaciones o tiempo
+    El mejor individuo nunca empeora: el plan inicial siempre participa
+    Con convergencia publica cada nuevo mejor y corta cuando se lo piden
+
+    Returns:
+        (mejor plan, generaciones ejecutadas)
+    """
+    inicio = time.monotonic()
+    rng = random.Random(semilla)
+
+    rutas_iniciales = _plan_a_rutas(problema, plan_inicial)
+    poblacion: List[Individuo] = [(problema.costo(rutas_iniciales), rutas_iniciales)]
+    costo_inicial = poblacion[0][0]
+    convergencia = convergencia or Convergencia()
+    convergencia.reportar("genetico", problema, rutas_iniciales, 0, costo_inicial)
+
+    trabajadores = trabajadores or os.cpu_count() or 1
+    if problema.n_paradas < MIN_PARADAS_PARALELO:
+        trabajadores = 1
+    if trabajadores > 1:
+        ejecutor = _EjecutorParalelo(problema, trabajadores)
+    else:
+        ejecutor = _EjecutorLocal(problema)
+
+    def torneo() -> Rutas:
+        participantes = rng.sample(poblacion, min(TAMANO_TORNEO, len(poblacion)))
+        return min(participantes, key=lambda ind: ind[0])[1]
+
+    generacion = 0
+    try:
+        while (generacion < max_iteraciones and
+               time.monotonic() - inicio < presupuesto_segundos and
+               not convergencia.agotada):
+            parejas = [(torneo(), torneo()) for _ in range(HIJOS_POR_GENERACION)]
+            hijos = ejecutor.generar(parejas, rng.getrandbits(32))
+
+            # Elitismo (mu + lambda): sobreviven los mejores entre padres e hijos
+            poblacion = sorted(poblacion + hijos, key=lambda ind: ind[0])[:TAMANO_POBLACION]
+            generacion += 1
+            convergencia.reportar(
+                "genetico", problema, poblacion[0][1], generacion, poblacion[0][0]
+            )
+    finally:
+        ejecutor.cerrar()
+
+    costo, mejor = poblacion[0]
+    logger.info(
+        f"🧬 Genético: {generacion} generaciones, costo {costo_inicial:.1f} -> {costo:.1f} "
+        f"({trabajadores} procesos, {time.monotonic() - inicio:.1f}s)"
+    )
+    return [(v, paradas) for v, paradas in enumerate(mejor) if paradas], generacion
@@ -0,0 +1,68 @@
+# app/services/greedy.py
+"""
+Algoritmo Greedy sobre el snapshot del problema
+1. Ordena entregas por prioridad
+2. Llena cada vehículo recorriendo las zonas
+3. Respeta compatibilidad (refrigeración, acceso a la zona), capacidad
+   y máximo de entregas
+"""
+
+from app.services.problem_snapshot import Plan, Problema
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+def resolver_greedy(problema: Problema) -> Tuple[Plan, int]:
+    """
+    Returns:
+        (plan, cantidad de entregas evaluadas)
+    """
+    # Zonas en orden de aparición de sus entregas
+    por_zona: Dict[int, List[int]] = {}
+    for i in range(1, problema.n_paradas + 1):
+        por_zona.setdefault(int(problema.zona[i]), []).append(i)
+    zonas = [np.array(paradas_zona, dtype=np.intp) for paradas_zona in por_zona.values()]
+
+    plan: Plan = []
+    asignada = np.zeros(problema.n_paradas + 1, dtype=bool)
+    iteraciones = 0
+
+    for v, vehiculo in enumerate(problema.vehiculos):
+        compatibles = problema.compatible[v]
+        peso_actual = 0.0
+        volumen_actual = 0.0
+        paradas: List[int] = []
+
+        for paradas_zona in zonas:
+            # Solo paradas compatibles, ordenadas por prioridad (descendente)
+            disponibles = paradas_zona[compatibles[paradas_zona] & ~asignada[paradas_zona]]
+            ordenadas = sorted(
+                disponibles.tolist(),
+                key=lambda i: (problema.prioridad[i], problema.urgente[i]),
+                reverse=True
+            )
+
+            for i in ordenadas:
+                iteraciones += 1
+
+                if (
+                    peso_actual + problema.peso[i] > vehiculo.peso_max or
+                    volumen_actual + problema.volumen[i] > vehiculo.volumen_max
+                ):
+                    continue
+
+                paradas.append(i)
+                asignada[i] = True
+                peso_actual += problema.peso[i]
+                volumen_actual += problema.volumen[i]
+
+                if len(paradas) >= problema.max_entregas:
+                    break
+
+            if len(paradas) >= problema.max_entregas:
+                break
+
+        if paradas:
+            plan.append((v, paradas))
+
+    return plan, iteraciones
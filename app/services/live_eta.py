@@ -0,0 +1,284 @@
+# app/services/live_eta.py
+"""
+ETAs en Vivo por Ruta y por Entrega
+Al empezar a seguir una ruta en curso se precalculan, una sola vez, los
+minutos base de cada tramo entre sus paradas pendientes (matriz del
+optimizador) y la fila de tráfico de cada una. Con cada posición nueva
+solo se simula desde la parada actual hacia adelante: el primer tramo
+desde la posición del camión y los siguientes con los tiempos
+precalculados y el factor de la franja horaria, O(paradas restantes).
+La parada actual avanza al pasar a menos de ETA_RADIO_LLEGADA_METROS.
+Las posiciones llegan en UTC; las ventanas y las ETAs usan la hora de
+ZONA_HORARIA, sin importar la zona del servidor.
+"""
+
+from app.database import SessionLocal
+from app.models import Ruta, Entrega, EstadoEntrega
+from app.services.route_optimizer import RouteOptimizer
+from app.services.live_fleet import flota_en_vivo
+from app.services.distance_matrix import haversine_pares_km, FACTOR_CORRECCION
+from app.services.travel_time import franja
+from app.config import settings
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from typing import Dict, Iterable, List, Optional, Set
+import numpy as np
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Línea recta -> calles (mismo factor que el motor Haversine)
+FACTOR_CALLES = FACTOR_CORRECCION
+
+# Paradas siguientes que se revisan por si el chofer se salteó alguna
+PARADAS_ADELANTE = 3
+
+ZONA = ZoneInfo(settings.ZONA_HORARIA)
+
+
+def hora_local(momento_utc: datetime) -> datetime:
+    """Hora UTC sin zona (como la guarda el tracking) en ZONA_HORARIA, con zona"""
+    return momento_utc.replace(tzinfo=timezone.utc).astimezone(ZONA)
+
+
+class TramosRuta:
+    """
+    Paradas pendientes de una ruta en orden de visita con sus tiempos
+    precalculados. Posiciones 1..n = paradas, n + 1 = regreso al almacén
+    """
+
+    __slots__ = (
+        "ruta_id", "camion_id", "entrega_ids", "coordenadas", "base_min", "filas",
+        "servicio", "ventana_inicio", "ventana_fin", "tabla", "min_por_km",
+        "indice", "en_parada", "llegada_parada"
+    )
+
+    def __init__(self, ruta_id: int, camion_id: int, problema, paradas):
+        n = len(paradas)
+        t = np.array([0, *range(1, n + 1), 0], dtype=np.intp)
+        self.ruta_id = ruta_id
+        self.camion_id = camion_id
+        self.entrega_ids = [p.entrega_id for p in paradas]
+        self.min_por_km = 60.0 / problema.vehiculos[0].velocidad_kmh
+
+        # Índice k = llegar a la posición k + 1 desde la posición k
+        self.base_min = (problema.km[t[:-1], t[1:]] * self.min_por_km).tolist()
+        filas = problema.fila_trafico[t]
+        filas[-1] = filas[-2]  # La vuelta al almacén usa la zona de origen
+        self.filas = filas[1:].tolist()
+        self.tabla = problema.trafico.tabla
+
+        # Por posición 0..n + 1 (0 y n + 1 = almacén)
+        self.coordenadas = np.asarray(problema.coordenadas, dtype=np.float64)[t]
+        self.servicio = problema.servicio[t].tolist()
+        self.ventana_inicio = problema.ventana_inicio[t].tolist()
+        self.ventana_fin = problema.ventana_fin[t].tolist()
+
+        # Avance: próxima posición a visitar y parada donde está el camión
+        self.indice = 1
+        self.en_parada: Optional[int] = None
+        self.llegada_parada = 0.0
+
+    @property
+    def visitadas(self) -> Set[int]:
+        return set(self.entrega_ids[:self.indice - 1])
+
+    def _avanzar(self, lat: float, lng: float, minuto: float, radio_km: float):
+        """Detecta la llegada a una parada (o al almacén) y la salida de ella"""
+        n = len(self.entrega_ids)
+        # El almacén (posición n + 1) solo cuenta como llegada al final: al salir también se está ahí
+        hasta = min(self.indice + PARADAS_ADELANTE, n + 1) if self.indice <= n else n + 2
+        distancias = haversine_pares_km(
+            np.array([[lat, lng]]), self.coordenadas[self.indice:hasta]
+        )
+        cercanas = np.flatnonzero(distancias <= radio_km)
+
+        if len(cercanas):
+            parada = self.indice + int(cercanas[0])
+            if parada != self.en_parada:
+                self.en_parada, self.llegada_parada = parada, minuto
+                self.indice = parada
+        elif self.en_parada is not None:
+            self.indice = self.en_parada + 1
+            self.en_parada = None
+
+    def estimar(self, lat: float, lng: float, momento_utc: datetime, radio_km: float) -> Dict:
+        """ETA de cada parada pendiente y del regreso desde la posición actual"""
+        local = hora_local(momento_utc)
+        minuto = local.hour * 60 + local.minute + local.second / 60.0
+        self._avanzar(lat, lng, minuto, radio_km)
+
+        n = len(self.entrega_ids)
+        tabla, filas, base_min = self.tabla, self.filas, self.base_min
+        entregas: List[Dict] = []
+
+        def agregar(posicion: int, llegada: float) -> float:
+            """Registra la parada y devuelve su hora de salida"""
+            inicio = max(llegada, self.ventana_inicio[posicion])
+            entregas.append({
+                "entrega_id": self.entrega_ids[posicion - 1],
+                "orden": posicion,
+                "eta": (local + timedelta(minutes=llegada - minuto)).isoformat(timespec="seconds"),
+                "minutos": round(max(llegada - minuto, 0.0), 1),
+                "a_tiempo": inicio <= self.ventana_fin[posicion],
+                "en_parada": posicion == self.en_parada
+            })
+            return inicio + self.servicio[posicion]
+
+        posicion = self.indice
+        if self.en_parada is not None and self.en_parada <= n:
+            salida = max(minuto, agregar(self.en_parada, self.llegada_parada))
+            posicion = self.en_parada + 1
+            hora = salida + base_min[posicion - 1] * tabla[filas[posicion - 1]][franja(salida)]
+        elif posicion <= n + 1 and self.en_parada is None:
+            km = float(haversine_pares_km(
+                np.array([[lat, lng]]), self.coordenadas[posicion:posicion + 1]
+            )[0]) * FACTOR_CALLES
+            hora = minuto + km * self.min_por_km * tabla[filas[posicion - 1]][franja(minuto)]
+        else:
+            hora = minuto  # Ya en el almacén
+
+        while posicion <= n:
+            salida = agregar(posicion, hora)
+            posicion += 1
+            hora = salida + base_min[posicion - 1] * tabla[filas[posicion - 1]][franja(salida)]
+
+        return {
+            "ruta_id": self.ruta_id,
+            "camion_id": self.camion_id,
+            "calculado_con": local.isoformat(timespec="seconds"),
+            "proxima_parada": min(self.indice, n + 1),
+            "paradas_pendientes": len(entregas),
+            "entregas": entregas,
+            "regreso_estimado": (local + timedelta(minutes=hora - minuto)).isoformat(timespec="seconds"),
+            "minutos_restantes": round(max(hora - minuto, 0.0), 1)
+        }
+
+
+class MotorEta:
+    """Tiempos precalculados y últimas ETAs de cada ruta en curso"""
+
+    def __init__(self, radio_llegada_metros: float):
+        self.radio_km = radio_llegada_metros / 1000.0
+        self._tramos: Dict[int, Optional[TramosRuta]] = {}
+        self._vencidas: Set[int] = set()
+        self._etas: Dict[int, Dict] = {}
+        self._ruta_de_camion: Dict[int, int] = {}
+        self._candado = threading.Lock()
+
+    def actualizar(self, estado: Dict) -> Optional[Dict]:
+        """
+        Recalcula las ETAs de la ruta en curso de un camión con su última
+        posición (dict de FlotaEnVivo)
+        """
+        ruta_id, camion_id = estado.get("ruta_id"), estado["camion_id"]
+        if ruta_id is None:
+            self._olvidar_camion(camion_id)
+            return None
+        if estado.get("lat") is None or not estado.get("momento"):
+            return None
+        momento = estado["momento"]
+        if isinstance(momento, str):
+            momento = datetime.fromisoformat(momento)
+
+        with self._candado:
+            anterior = self._ruta_de_camion.get(camion_id)
+            if anterior is not None and anterior != ruta_id:
+                # El camión pasó a otra ruta: se olvida la anterior
+                self._tramos.pop(anterior, None)
+                self._etas.pop(anterior, None)
+            self._ruta_de_camion[camion_id] = ruta_id
+
+            recargar = ruta_id not in self._tramos or ruta_id in self._vencidas
+            if recargar:
+                anterior = self._tramos.get(ruta_id)
+                visitadas = anterior.visitadas if anterior is not None else set()
+                # Si se invalida mientras carga, se vuelve a cargar en la próxima posición
+                self._vencidas.discard(ruta_id)
+
+        # La consulta y la matriz se arman sin el candado: no frena a los demás camiones
+        if recargar:
+            nuevos = self._cargar(ruta_id, visitadas)
+
+        with self._candado:
+            if recargar:
+                if self._ruta_de_camion.get(camion_id) != ruta_id:
+                    return None  # Cambió de ruta mientras cargaba
+                self._tramos[ruta_id] = nuevos
+            tramos = self._tramos.get(ruta_id)
+            if tramos is None:
+                self._etas.pop(ruta_id, None)  # La ruta ya no existe o no tiene paradas
+                return None
+            eta = tramos.estimar(estado["lat"], estado["lng"], momento, self.radio_km)
+            self._etas[ruta_id] = eta
+            return eta
+
+    def actualizar_flota(self, estados: Iterable[Dict]) -> List[Dict]:
+        etas = []
+        for estado in estados:
+            try:
+                eta = self.actualizar(estado)
+            except Exception:
+                logger.exception(f"❌ Error estimando ETAs del camión {estado.get('camion_id')}")
+                continue
+            if eta is not None:
+                etas.append(eta)
+        return etas
+
+    def obtener(self, ruta_id: int) -> Optional[Dict]:
+        """Últimas ETAs de la ruta; si aún no hay, se calculan con la posición en memoria"""
+        with self._candado:
+            eta = self._etas.get(ruta_id)
+        if eta is not None:
+            return eta
+        for estado in flota_en_vivo.posiciones():
+            if estado["ruta_id"] == ruta_id:
+                return self.actualizar(estado)
+        return None
+
+    def todas(self) -> List[Dict]:
+        with self._candado:
+            return list(self._etas.values())
+
+    def _olvidar_camion(self, camion_id: int):
+        """El camión ya no tiene ruta (se borró): se descartan los tramos y ETAs de la anterior"""
+        with self._candado:
+            anterior = self._ruta_de_camion.pop(camion_id, None)
+            if anterior is not None:
+                self._tramos.pop(anterior, None)
+                self._etas.pop(anterior, None)
+                self._vencidas.discard(anterior)
+
+    def invalidar(self, rutas: Optional[Iterable[int]] = None):
+        """
+        Las entregas de estas rutas (None = todas) cambiaron: sus tramos se
+        recargan en la próxima posición, conservando las paradas ya visitadas
+        """
+        with self._candado:
+            self._vencidas.update(self._tramos if rutas is None else rutas)
+
+    def _cargar(self, ruta_id: int, visitadas: Set[int]) -> Optional[TramosRuta]:
+        """Tramos de las paradas pendientes de la ruta (se llama sin el candado)"""
+        db = SessionLocal()
+        try:
+            ruta = db.get(Ruta, ruta_id)
+            if ruta is None:
+                return None
+            camion_id = ruta.camion_id
+            resultado = RouteOptimizer(db).problema_ruta(
+                ruta,
+                Entrega.estado.notin_([EstadoEntrega.ENTREGADO, EstadoEntrega.NO_ENTREGADO]),
+                Entrega.id.notin_(list(visitadas))
+            )
+            db.commit()  # Distancias nuevas del cache
+        finally:
+            db.close()
+
+        if resultado is None:
+            return None
+        problema, paradas = resultado
+        return TramosRuta(ruta_id, camion_id, problema, paradas)
+
+
+motor_eta = MotorEta(settings.ETA_RADIO_LLEGADA_METROS)
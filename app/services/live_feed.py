@@ -0,0 +1,228 @@
+# app/services/live_feed.py
+"""
+Canal en Vivo de la Flota
+Un único publicador por proceso calcula los cambios (posiciones de los
+camiones que se movieron, ETAs de sus rutas, estados de entregas y
+estadísticas del día) y los reparte a todos los tableros suscritos por SSE:
+N pantallas abiertas cuestan una consulta, no N.
+Cada suscriptor tiene una cola acotada; si se llena (cliente lento) se
+vacía y recibe de nuevo el estado completo.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Entrega, Ruta, EstadoEntrega, EstadoRuta
+from app.services.live_fleet import flota_en_vivo
+from app.services.live_eta import motor_eta
+from app.config import settings
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Eventos en cola por suscriptor antes de reenviarle el estado completo
+MAX_EVENTOS_COLA = 256
+
+# (tipo, datos) de un evento del canal
+Evento = Tuple[str, Dict]
+
+
+def estadisticas_del_dia(db: Session, dia: Optional[date] = None) -> Dict:
+    """Contadores de entregas, montos y rutas activas del día"""
+    dia = dia or date.today()
+    del_dia = func.date(Entrega.fecha_factura) == dia
+    entregado = Entrega.estado == EstadoEntrega.ENTREGADO
+
+    entregas_hoy, completadas, valor_total, valor_entregado = db.query(
+        func.count(Entrega.id),
+        func.count(Entrega.id).filter(entregado),
+        func.coalesce(func.sum(Entrega.monto_total), 0),
+        func.coalesce(func.sum(Entrega.monto_total).filter(entregado), 0)
+    ).filter(del_dia).one()
+
+    rutas_activas = db.query(Ruta).filter(
+        Ruta.fecha == dia,
+        Ruta.estado == EstadoRuta.EN_CURSO
+    ).count()
+
+    return {
+        "entregas_total": entregas_hoy,
+        "entregas_completadas": completadas,
+        "entregas_pendientes": entregas_hoy - completadas,
+        "valor_entregado": round(valor_entregado, 2),
+        "valor_pendiente": round(valor_total - valor_entregado, 2),
+        "valor_total": round(valor_total, 2),
+        "rutas_activas": rutas_activas,
+        "porcentaje_completado": round((completadas / entregas_hoy * 100) if entregas_hoy > 0 else 0, 1)
+    }
+
+
+class Suscripcion:
+    """Cola de eventos de un tablero conectado (vive en el event loop del cliente)"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.cola: "asyncio.Queue[Evento]" = asyncio.Queue(maxsize=MAX_EVENTOS_COLA)
+        # La cola se desbordó: el próximo envío es el estado completo
+        self.resincronizar = False
+
+    def _encolar(self, evento: Evento):
+        """Se ejecuta en el event loop del suscriptor"""
+        if self.resincronizar:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.resincronizar = True
+            self.cola.put_nowait(("resincronizar", {}))
+
+    async def siguiente(self, espera: float) -> Optional[Evento]:
+        """Próximo evento, o None si no hubo ninguno en `espera` segundos"""
+        try:
+            return await asyncio.wait_for(self.cola.get(), espera)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PublicadorFlota:
+    """Reparte los cambios de la flota a todos los suscriptores"""
+
+    def __init__(self, intervalo_segundos: float, estadisticas_segundos: float):
+        self.intervalo_segundos = intervalo_segundos
+        self.estadisticas_segundos = estadisticas_segundos
+        self._suscriptores: Set[Suscripcion] = set()
+        self._candado = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._estadisticas: Optional[Dict] = None
+        self._estadisticas_en = 0.0
+        self._estadisticas_vencidas = threading.Event()
+        self._candado_estadisticas = threading.Lock()
+        self._publicadas: Optional[Dict] = None
+
+    # ========== SUSCRIPTORES ==========
+
+    def suscribir(self) -> Suscripcion:
+        """Registra un tablero; llamar desde el event loop que lo atiende"""
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with self._candado:
+            self._suscriptores.add(suscripcion)
+        self.iniciar()
+        return suscripcion
+
+    def iniciar(self):
+        """Arranca el ciclo del canal (una vez; las ETAs se siguen aun sin tableros)"""
+        with self._candado:
+            if self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=self._bucle, name="canal-flota", daemon=True
+                )
+                self._hilo.start()
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        with self._candado:
+            self._suscriptores.discard(suscripcion)
+
+    def estado_completo(self) -> List[Evento]:
+        """Eventos iniciales de un tablero: toda la flota, sus ETAs y las estadísticas"""
+        return [
+            ("flota", {"camiones": flota_en_vivo.posiciones()}),
+            ("etas", {"rutas": motor_eta.todas()}),
+            ("estadisticas", self.estadisticas())
+        ]
+
+    # ========== PUBLICACIÓN ==========
+
+    def publicar(self, tipo: str, datos: Dict):
+        """Envía un evento a todos los suscriptores (desde cualquier hilo)"""
+        with self._candado:
+            suscriptores = list(self._suscriptores)
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.loop.call_soon_threadsafe(suscripcion._encolar, (tipo, datos))
+            except RuntimeError:
+                # Event loop cerrado: el cliente ya no existe
+                self.desuscribir(suscripcion)
+
+    def entregas_cambiaron(self, cambios: List[Dict]):
+        """
+        Publica cambios de estado de entregas ({entrega_id, estado, ruta_id}),
+        recalcula las estadísticas en el próximo ciclo y recarga las paradas
+        de las rutas afectadas para las ETAs
+        """
+        if cambios:
+            self.publicar("entregas", {"entregas": cambios})
+        self.invalidar_estadisticas()
+        rutas = {cambio["ruta_id"] for cambio in cambios}
+        motor_eta.invalidar(None if None in rutas else rutas)
+
+    def invalidar_estadisticas(self):
+        self._estadisticas_vencidas.set()
+
+    def estadisticas(self) -> Dict:
+        """
+        Estadísticas del día compartidas con el canal: se recalculan si
+        cambió una entrega o cada estadisticas_segundos, no por cada consulta
+        """
+        with self._candado_estadisticas:
+            if (
+                self._estadisticas is None or
+                self._estadisticas_vencidas.is_set() or
+                time.monotonic() - self._estadisticas_en >= self.estadisticas_segundos
+            ):
+                self._calcular_estadisticas()
+            return self._estadisticas
+
+    def _calcular_estadisticas(self):
+        self._estadisticas_vencidas.clear()
+        db = SessionLocal()
+        try:
+            self._estadisticas = estadisticas_del_dia(db)
+        finally:
+            db.close()
+        self._estadisticas_en = time.monotonic()
+
+    def _bucle(self):
+        while True:
+            with self._candado:
+                hay_suscriptores = bool(self._suscriptores)
+            if hay_suscriptores:
+                self._estadisticas_vencidas.wait(self.intervalo_segundos)
+            else:
+                time.sleep(self.intervalo_segundos)
+
+            try:
+                # Una estimación por camión y ciclo, sin importar cuántos pings mandó
+                posiciones = flota_en_vivo.cambios()
+                etas = motor_eta.actualizar_flota(posiciones)
+                if not hay_suscriptores:
+                    continue
+                if etas:
+                    self.publicar("etas", {"rutas": etas})
+                if posiciones:
+                    self.publicar("posiciones", {"camiones": posiciones})
+                with self._candado_estadisticas:
+                    if (
+                        self._estadisticas_vencidas.is_set() or
+                        time.monotonic() - self._estadisticas_en >= self.estadisticas_segundos
+                    ):
+                        self._calcular_estadisticas()
+                    estadisticas = self._estadisticas
+                if estadisticas is not None and estadisticas != self._publicadas:
+                    self._publicadas = estadisticas
+                    self.publicar("estadisticas", estadisticas)
+            except Exception:
+                logger.exception("❌ Error en el canal en vivo de la flota")
+                time.sleep(self.intervalo_segundos)
+
+
+publicador_flota = PublicadorFlota(
+    settings.CANAL_FLOTA_INTERVALO_SEGUNDOS,
+    settings.CANAL_FLOTA_ESTADISTICAS_SEGUNDOS
+)
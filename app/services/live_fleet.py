@@ -0,0 +1,354 @@
+# app/services/live_fleet.py
+"""
+Estado en Vivo de la Flota
+Última posición, velocidad y avance de ruta de cada camión en memoria: las
+lecturas no tocan la BD y las escrituras se acumulan y se vuelcan en lotes
+cada pocos segundos (write-behind) a camiones y tracking_historial.
+Al historial llega a lo sumo un punto por camión cada
+FLOTA_MUESTREO_HISTORIAL_SEGUNDOS (el volumen depende del tamaño de la
+flota y no de la frecuencia de los pings; con 0 se guardan todos); el
+estado en vivo usa siempre el último punto.
+Si la BD rechaza un lote por una fila inválida, esa fila se descarta y el
+resto se guarda: el volcado no se traba reintentando el mismo lote.
+Es un estado por proceso: la app corre con un solo worker de uvicorn.
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from app.database import SessionLocal
+from app.models import Camion, Ruta, Entrega, EstadoRuta, EstadoEntrega
+from app.services.tracking_ingest import IngestaTracking, hora_utc
+from app.config import settings
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterable, List, Optional, Set
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Puntos pendientes que disparan un volcado antes de tiempo
+LOTE_ESCRITURA = 2000
+
+# Tope de puntos en memoria si la BD no responde (se descartan los más viejos)
+MAX_PUNTOS_PENDIENTES = 200_000
+
+# Cada cuánto se vuelve a consultar la lista de camiones ante un id desconocido
+RECARGA_CAMIONES_SEGUNDOS = 30
+
+
+class EstadoCamion:
+    """Última posición conocida y avance de la ruta en curso de un camión"""
+
+    __slots__ = (
+        "camion_id", "lat", "lng", "momento", "velocidad_kmh", "rumbo_grados",
+        "precision_metros", "ruta_id", "entregas_total", "entregas_completadas",
+        "ultimo_historial"
+    )
+
+    def __init__(self, camion_id: int):
+        self.camion_id = camion_id
+        self.lat: Optional[float] = None
+        self.lng: Optional[float] = None
+        self.momento: Optional[datetime] = None
+        self.velocidad_kmh: Optional[float] = None
+        self.rumbo_grados: Optional[float] = None
+        self.precision_metros: Optional[float] = None
+        self.ruta_id: Optional[int] = None
+        self.entregas_total = 0
+        self.entregas_completadas = 0
+        # Momento del último punto encolado para el historial (muestreo)
+        self.ultimo_historial: Optional[datetime] = None
+
+    def a_dict(self) -> Dict:
+        return {
+            "camion_id": self.camion_id,
+            "lat": self.lat,
+            "lng": self.lng,
+            "momento": self.momento.isoformat() if self.momento else None,
+            "velocidad_kmh": self.velocidad_kmh,
+            "rumbo_grados": self.rumbo_grados,
+            "precision_metros": self.precision_metros,
+            "ruta_id": self.ruta_id,
+            "entregas_total": self.entregas_total,
+            "entregas_completadas": self.entregas_completadas
+        }
+
+
+class FlotaEnVivo:
+    """Estado de la flota en memoria con volcado periódico a la BD"""
+
+    def __init__(
+        self,
+        intervalo_segundos: float,
+        muestreo_segundos: float,
+        max_pendientes: int = MAX_PUNTOS_PENDIENTES
+    ):
+        self.intervalo_segundos = intervalo_segundos
+        self.muestreo = timedelta(seconds=muestreo_segundos)
+        self._estados: Dict[int, EstadoCamion] = {}
+        self._pendientes: Deque[Dict] = deque(maxlen=max_pendientes)
+        self._candado = threading.Lock()
+        self._volcar_ya = threading.Event()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._cargado = False
+        self._conocidos: Set[int] = set()
+        self._conocidos_en = 0.0
+        self.descartados = 0
+        # Puntos que la BD rechazó por sí mismos (se apartan para no trabar el volcado)
+        self.invalidos = 0
+        # Camiones con cambios desde la última llamada a cambios()
+        self._cambiados: Set[int] = set()
+
+    # ========== ESCRITURA ==========
+
+    def registrar(self, puntos: Iterable[Dict]) -> Dict:
+        """
+        Actualiza el estado en memoria y encola los puntos para el historial
+        Returns: puntos aceptados, rechazados (camión inexistente) y
+                 encolados para el historial (menos que los aceptados si hay muestreo)
+        """
+        puntos = list(puntos)
+        self._iniciar()
+        conocidos = self._camiones_conocidos({p["camion_id"] for p in puntos})
+
+        aceptados = al_historial = 0
+        with self._candado:
+            for punto in puntos:
+                camion_id = punto["camion_id"]
+                if camion_id not in conocidos:
+                    continue
+                aceptados += 1
+                punto = dict(punto, timestamp=hora_utc(punto.get("timestamp")))
+                estado = self._estados.get(camion_id)
+                if estado is None:
+                    estado = self._estados[camion_id] = EstadoCamion(camion_id)
+
+                if estado.momento is None or punto["timestamp"] >= estado.momento:
+                    estado.lat, estado.lng = punto["lat"], punto["lng"]
+                    estado.momento = punto["timestamp"]
+                    estado.velocidad_kmh = punto.get("velocidad_kmh")
+                    estado.rumbo_grados = punto.get("rumbo_grados")
+                    estado.precision_metros = punto.get("precision_metros")
+                    self._cambiados.add(camion_id)
+
+                # Muestreo del historial: a lo sumo un punto por camión cada `muestreo`
+                if (
+                    self.muestreo and
+                    estado.ultimo_historial is not None and
+                    abs(punto["timestamp"] - estado.ultimo_historial) < self.muestreo
+                ):
+                    continue
+                estado.ultimo_historial = punto["timestamp"]
+                if punto.get("ruta_id") is None:
+                    punto["ruta_id"] = estado.ruta_id
+                if len(self._pendientes) == self._pendientes.maxlen:
+                    self.descartados += 1
+                self._pendientes.append(punto)
+                al_historial += 1
+
+            if len(self._pendientes) >= LOTE_ESCRITURA:
+                self._volcar_ya.set()
+
+        return {
+            "aceptados": aceptados,
+            "rechazados": len(puntos) - aceptados,
+            "al_historial": al_historial
+        }
+
+    def iniciar_ruta(self, camion_id: int, ruta_id: int, entregas_total: int):
+        """El camión salió con una ruta: reinicia su avance"""
+        self._iniciar()
+        with self._candado:
+            estado = self._estados.setdefault(camion_id, EstadoCamion(camion_id))
+            estado.ruta_id = ruta_id
+            estado.entregas_total = entregas_total
+            estado.entregas_completadas = 0
+            self._cambiados.add(camion_id)
+
+    def entrega_completada(self, camion_id: int):
+        """El chofer informó una entrega hecha: avanza el progreso de su ruta"""
+        with self._candado:
+            estado = self._estados.get(camion_id)
+            if estado is not None:
+                estado.entregas_completadas = min(
+                    estado.entregas_completadas + 1, estado.entregas_total
+                )
+                self._cambiados.add(camion_id)
+
+    def rutas_eliminadas(self, rutas: Iterable[int]):
+        """Se borraron estas rutas: sus camiones quedan sin ruta ni avance"""
+        rutas = set(rutas)
+        with self._candado:
+            for estado in self._estados.values():
+                if estado.ruta_id in rutas:
+                    estado.ruta_id = None
+                    estado.entregas_total = 0
+                    estado.entregas_completadas = 0
+                    self._cambiados.add(estado.camion_id)
+
+    # ========== LECTURA ==========
+
+    def posiciones(self) -> List[Dict]:
+        """Estado de todos los camiones con posición o ruta (sin consultar la BD)"""
+        self._iniciar()
+        with self._candado:
+            return [estado.a_dict() for estado in self._estados.values()]
+
+    def obtener(self, camion_id: int) -> Optional[Dict]:
+        self._iniciar()
+        with self._candado:
+            estado = self._estados.get(camion_id)
+            return estado.a_dict() if estado else None
+
+    def cambios(self) -> List[Dict]:
+        """Estado de los camiones que cambiaron desde la llamada anterior"""
+        with self._candado:
+            cambiados = [self._estados[camion_id].a_dict() for camion_id in self._cambiados]
+            self._cambiados.clear()
+        return cambiados
+
+    # ========== VOLCADO A LA BD ==========
+
+    def volcar(self) -> int:
+        """Escribe los puntos pendientes en un lote. Returns: puntos escritos"""
+        with self._candado:
+            lote = list(self._pendientes)
+            self._pendientes.clear()
+            self._volcar_ya.clear()
+        if not lote:
+            return 0
+
+        db = SessionLocal()
+        try:
+            IngestaTracking(db).guardar(lote)
+        except IntegrityError:
+            # Reintentar el mismo lote trabaría el volcado: se aíslan las filas inválidas
+            invalidos = self._guardar_por_partes(db, lote)
+            return len(lote) - invalidos
+        except Exception:
+            # Se reintenta en el próximo volcado; si no entra todo, se pierden los más viejos
+            self._reencolar(lote)
+            raise
+        finally:
+            db.close()
+        return len(lote)
+
+    def _guardar_por_partes(self, db, lote: List[Dict]) -> int:
+        """
+        Guarda el lote en mitades hasta dejar solas las filas que la BD
+        rechaza, que se descartan. Returns: puntos descartados
+        """
+        mitad = len(lote) // 2
+        partes = [parte for parte in (lote[mitad:], lote[:mitad]) if parte]
+        descartados = 0
+        while partes:
+            parte = partes.pop()
+            try:
+                IngestaTracking(db).guardar(parte)
+            except IntegrityError:
+                if len(parte) > 1:
+                    mitad = len(parte) // 2
+                    partes += [parte[mitad:], parte[:mitad]]
+                    continue
+                logger.warning(f"⚠️ Posición rechazada por la BD, se descarta: {parte[0]}")
+                descartados += 1
+                self.invalidos += 1
+            except Exception:
+                self._reencolar([punto for resto in (*partes, parte) for punto in resto])
+                raise
+        return descartados
+
+    def _reencolar(self, lote: List[Dict]):
+        """Devuelve el lote al frente de la cola, antes de los puntos nuevos"""
+        with self._candado:
+            nuevos = list(self._pendientes)
+            self._pendientes.clear()
+            self._pendientes.extend(lote)
+            self._pendientes.extend(nuevos)
+
+    def detener(self):
+        """Último volcado al apagar la app"""
+        self._detener.set()
+        self._volcar_ya.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.intervalo_segundos + 10)
+        if self._pendientes:
+            self.volcar()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._volcar_ya.wait(self.intervalo_segundos)
+            try:
+                escritos = self.volcar()
+                if escritos:
+                    logger.debug(f"📍 {escritos} posiciones volcadas a la BD")
+            except Exception:
+                logger.exception("❌ Error volcando posiciones, se reintenta")
+                self._detener.wait(self.intervalo_segundos)
+        logger.info("📍 Volcado de posiciones detenido")
+
+    # ========== CARGA INICIAL ==========
+
+    def _iniciar(self):
+        """Carga el estado desde la BD y arranca el hilo de volcado (una vez)"""
+        if self._cargado:
+            return
+        with self._candado:
+            if self._cargado:
+                return
+            self._cargar()
+            self._cargado = True
+            self._hilo = threading.Thread(
+                target=self._bucle, name="flota-en-vivo", daemon=True
+            )
+            self._hilo.start()
+
+    def _cargar(self):
+        """Últimas posiciones guardadas y avance de las rutas en curso"""
+        db = SessionLocal()
+        try:
+            for camion_id, lat, lng, momento in db.execute(
+                select(Camion.id, Camion.ultima_lat, Camion.ultima_lng, Camion.ultima_actualizacion)
+            ):
+                estado = self._estados[camion_id] = EstadoCamion(camion_id)
+                estado.lat, estado.lng, estado.momento = lat, lng, momento
+                self._conocidos.add(camion_id)
+            self._conocidos_en = time.monotonic()
+
+            completadas = func.count(Entrega.id).filter(
+                Entrega.estado == EstadoEntrega.ENTREGADO
+            )
+            for ruta_id, camion_id, total, hechas in db.execute(
+                select(Ruta.id, Ruta.camion_id, func.count(Entrega.id), completadas)
+                .join(Entrega, Entrega.ruta_id == Ruta.id)
+                .where(Ruta.estado == EstadoRuta.EN_CURSO)
+                .group_by(Ruta.id, Ruta.camion_id)
+            ):
+                estado = self._estados.setdefault(camion_id, EstadoCamion(camion_id))
+                estado.ruta_id = ruta_id
+                estado.entregas_total = total
+                estado.entregas_completadas = hechas
+        finally:
+            db.close()
+
+    def _camiones_conocidos(self, ids: Set[int]) -> Set[int]:
+        """Ids de camiones existentes; se recarga si aparece uno nuevo"""
+        if ids <= self._conocidos:
+            return self._conocidos
+        if time.monotonic() - self._conocidos_en >= RECARGA_CAMIONES_SEGUNDOS:
+            db = SessionLocal()
+            try:
+                self._conocidos = set(db.scalars(select(Camion.id)))
+            finally:
+                db.close()
+            self._conocidos_en = time.monotonic()
+        return self._conocidos
+
+
+flota_en_vivo = FlotaEnVivo(
+    settings.FLOTA_VOLCADO_SEGUNDOS,
+    settings.FLOTA_MUESTREO_HISTORIAL_SEGUNDOS
+)
@@ -0,0 +1,399 @@
+# app/services/local_search.py
+"""
+Búsqueda Local
+Mejora rutas ya construidas con movimientos evaluados por delta sobre la
+matriz de distancias (sin recalcular la ruta completa):
+- Dentro de una ruta: orden exacto (Held-Karp) para rutas chicas; 2-opt
+  y Or-opt para las demás o si el orden exacto no cumple los horarios
+- Entre rutas: reubicar e intercambiar paradas
+Ventanas horarias, jornada y km máximos se validan con la holgura de
+cada ruta (O(1) por movimiento entre rutas); dentro de una ruta solo se
+simulan los mejores candidatos que mejoran.
+Los operadores son funciones intercambiables y el trabajo total está
+limitado por un presupuesto de movimientos evaluados.
+"""
+
+from app.config import settings
+from app.services.problem_snapshot import Plan, Problema
+from app.services.time_windows import HorarioRuta, ruta_factible
+from app.services.exact_tsp import MAX_PARADAS_EXACTO, secuencia_optima
+from app.services.anytime import Convergencia
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Mejora mínima (km) para aceptar un movimiento
+EPSILON = 1e-6
+
+# Largo máximo del tramo que mueve Or-opt
+MAX_TRAMO_OR_OPT = 3
+
+# Candidatos que mejoran cuya factibilidad horaria se simula por operador
+MAX_CANDIDATOS_HORARIO = 8
+
+# (delta km, nuevas paradas), movimientos evaluados
+MovimientoIntra = Tuple[Optional[Tuple[float, List[int]]], int]
+# (delta km, nuevas paradas A, nuevas paradas B), movimientos evaluados
+MovimientoInter = Tuple[Optional[Tuple[float, List[int], List[int]]], int]
+
+
+def _recorrido(paradas: Sequence[int]) -> np.ndarray:
+    return np.array([0, *paradas, 0], dtype=np.intp)
+
+
+def _primer_factible(
+    problema: Problema,
+    v: int,
+    candidatos: List[Tuple[float, Callable[[], List[int]]]]
+) -> Optional[Tuple[float, List[int]]]:
+    """El candidato de menor delta cuya ruta respeta ventanas y límites"""
+    for delta, construir in sorted(candidatos, key=lambda c: c[0])[:MAX_CANDIDATOS_HORARIO]:
+        paradas = construir()
+        if ruta_factible(problema, v, paradas):
+            return delta, paradas
+    return None
+
+
+# ========== OPERADORES DENTRO DE UNA RUTA ==========
+
+def dos_opt(problema: Problema, v: int, paradas: List[int]) -> MovimientoIntra:
+    """
+    Mejor inversión de tramo. Con sumas acumuladas en ambos sentidos
+    el delta es exacto aun si la matriz no es simétrica
+    """
+    m = len(paradas)
+    if m < 3:
+        return None, 0
+
+    km = problema.km
+    t = _recorrido(paradas)
+    ida = km[t[:-1], t[1:]].astype(np.float64)
+    vuelta = km[t[1:], t[:-1]].astype(np.float64)
+    acum_ida = np.concatenate(([0.0], np.cumsum(ida)))
+    acum_vuelta = np.concatenate(([0.0], np.cumsum(vuelta)))
+
+    # Arcos (i, i+1) y (j, j+1) con i + 1 < j: se invierte t[i+1..j]
+    i = np.arange(m + 1)[:, None]
+    j = np.arange(m + 1)[None, :]
+    validos = j > i + 1
+
+    delta = (
+        km[np.ix_(t[:-1], t[:-1])] +
+        km[np.ix_(t[1:], t[1:])] -
+        ida[i] - ida[j] +
+        (acum_vuelta[j] - acum_vuelta[i + 1]) -
+        (acum_ida[j] - acum_ida[i + 1])
+    )
+    delta = np.where(validos, delta, np.inf)
+
+    evaluados = int(validos.sum())
+    mejoran = np.flatnonzero(delta < -EPSILON)
+    if not len(mejoran):
+        return None, evaluados
+    mejoran = mejoran[np.argsort(delta.ravel()[mejoran])[:MAX_CANDIDATOS_HORARIO]]
+
+    def invertir(a: int, b: int) -> Callable[[], List[int]]:
+        return lambda: np.concatenate((t[1:a + 1], t[a + 1:b + 1][::-1], t[b + 1:-1])).tolist()
+
+    candidatos = []
+    for indice in mejoran:
+        a, b = np.unravel_index(int(indice), delta.shape)
+        candidatos.append((float(delta[a, b]), invertir(int(a), int(b))))
+    return _primer_factible(problema, v, candidatos), evaluados
+
+
+def or_opt(problema: Problema, v: int, paradas: List[int]) -> MovimientoIntra:
+    """Mejor traslado de un tramo de 1 a 3 paradas a otra posición"""
+    m = len(paradas)
+    if m < 2:
+        return None, 0
+
+    km = problema.km
+    t = _recorrido(paradas)
+    mejoras: List[Tuple[float, int, int, int]] = []  # (delta, largo, i, k)
+    evaluados = 0
+
+    def trasladar(largo: int, i: int, k: int) -> Callable[[], List[int]]:
+        resto = np.concatenate((t[:i], t[i + largo:]))
+        return lambda: np.concatenate((resto[1:k + 1], t[i:i + largo], resto[k + 1:-1])).tolist()
+
+    for largo in range(1, min(MAX_TRAMO_OR_OPT, m - 1) + 1):
+        for i in range(1, m - largo + 2):
+            primero, ultimo = t[i], t[i + largo - 1]
+            anterior, siguiente = t[i - 1], t[i + largo]
+
+            ahorro = km[anterior, primero] + km[ultimo, siguiente] - km[anterior, siguiente]
+
+            resto = np.concatenate((t[:i], t[i + largo:]))
+            costo = (
+                km[resto[:-1], primero] +
+                km[ultimo, resto[1:]] -
+                km[resto[:-1], resto[1:]]
+            )
+            costo[i - 1] = np.inf  # Posición original
+            evaluados += len(costo) - 1
+
+            # Mejor posición de cada tramo; los tramos compiten por horario
+            k = int(costo.argmin())
+            delta = float(costo[k] - ahorro)
+            if delta < -EPSILON:
+                mejoras.append((delta, largo, i, k))
+
+    candidatos = [
+        (delta, trasladar(largo, i, k))
+        for delta, largo, i, k in heapq.nsmallest(MAX_CANDIDATOS_HORARIO, mejoras)
+    ]
+    return _primer_factible(problema, v, candidatos), evaluados
+
+
+# ========== OPERADORES ENTRE RUTAS ==========
+
+def _cargas(problema: Problema, paradas: Sequence[int]) -> Tuple[float, float]:
+    indices = list(paradas)
+    return (
+        float(problema.peso[indices].sum()),
+        float(problema.volumen[indices].sum())
+    )
+
+
+def reubicar(
+    problema: Problema,
+    a: List[int],
+    b: List[int],
+    va: int,
+    vb: int,
+    horario_a: Optional[HorarioRuta] = None,
+    horario_b: Optional[HorarioRuta] = None
+) -> MovimientoInter:
+    """Mejor traslado de una parada de la ruta A a la ruta B"""
+    if not a or len(b) >= problema.max_entregas:
+        return None, 0
+
+    km = problema.km
+    ta, tb = _recorrido(a), _recorrido(b)
+    paradas_a = ta[1:-1]
+
+    # Solo paradas compatibles con el vehículo de B y que caben en él
+    peso_b, volumen_b = _cargas(problema, b)
+    caben = (
+        problema.compatible[vb, paradas_a] &
+        (peso_b + problema.peso[paradas_a] <= problema.peso_max[vb]) &
+        (volumen_b + problema.volumen[paradas_a] <= problema.volumen_max[vb])
+    )
+    if not caben.any():
+        return None, 0
+
+    ahorro = (
+        km[ta[:-2], paradas_a] + km[paradas_a, ta[2:]] - km[ta[:-2], ta[2:]]
+    )
+    costo = (
+        km[np.ix_(tb[:-1], paradas_a)].T +
+        km[np.ix_(paradas_a, tb[1:])] -
+        km[tb[:-1], tb[1:]][None, :]
+    )
+    delta = np.where(caben[:, None], costo - ahorro[:, None], np.inf)
+    evaluados = int(caben.sum()) * delta.shape[1]
+    if delta.min() >= -EPSILON:
+        return None, evaluados
+
+    # Horarios solo si hay algún movimiento que mejora
+    factible = (
+        (horario_a or HorarioRuta(problema, va, a)).remocion()[:, None] &
+        (horario_b or HorarioRuta(problema, vb, b)).insercion(paradas_a)
+    )
+    delta = np.where(factible, delta, np.inf)
+    i, k = np.unravel_index(int(delta.argmin()), delta.shape)
+    if delta[i, k] >= -EPSILON:
+        return None, evaluados
+
+    parada = int(paradas_a[i])
+    nueva_a = a[:i] + a[i + 1:]
+    nueva_b = b[:k] + [parada] + b[k:]
+    return (float(delta[i, k]), nueva_a, nueva_b), evaluados
+
+
+def intercambiar(
+    problema: Problema,
+    a: List[int],
+    b: List[int],
+    va: int,
+    vb: int,
+    horario_a: Optional[HorarioRuta] = None,
+    horario_b: Optional[HorarioRuta] = None
+) -> MovimientoInter:
+    """Mejor intercambio de una parada de A por una de B"""
+    if not a or not b:
+        return None, 0
+
+    km = problema.km
+    ta, tb = _recorrido(a), _recorrido(b)
+    sa, sb = ta[1:-1], tb[1:-1]
+
+    # Compatibilidad y capacidad en ambos vehículos tras el intercambio
+    peso_a, volumen_a = _cargas(problema, a)
+    peso_b, volumen_b = _cargas(problema, b)
+    dp = problema.peso[sb][None, :] - problema.peso[sa][:, None]
+    dv = problema.volumen[sb][None, :] - problema.volumen[sa][:, None]
+    factible = (
+        problema.compatible[va, sb][None, :] & problema.compatible[vb, sa][:, None] &
+        (peso_a + dp <= problema.peso_max[va]) & (peso_b - dp <= problema.peso_max[vb]) &
+        (volumen_a + dv <= problema.volumen_max[va]) & (volumen_b - dv <= problema.volumen_max[vb])
+    )
+    if not factible.any():
+        return None, 0
+
+    # Reemplazar s (en A) por u (de B) y viceversa
+    delta_a = (
+        km[np.ix_(ta[:-2], sb)] + km[np.ix_(sb, ta[2:])].T -
+        (km[ta[:-2], sa] + km[sa, ta[2:]])[:, None]
+    )
+    delta_b = (
+        km[np.ix_(tb[:-2], sa)] + km[np.ix_(sa, tb[2:])].T -
+        (km[tb[:-2], sb] + km[sb, tb[2:]])[:, None]
+    )
+    delta = np.where(factible, delta_a + delta_b.T, np.inf)
+    evaluados = int(factible.sum())
+    if delta.min() >= -EPSILON:
+        return None, evaluados
+
+    # Horarios solo si hay algún movimiento que mejora
+    en_horario = (
+        (horario_a or HorarioRuta(problema, va, a)).reemplazo(sb) &
+        (horario_b or HorarioRuta(problema, vb, b)).reemplazo(sa).T
+    )
+    delta = np.where(en_horario, delta, np.inf)
+    i, k = np.unravel_index(int(delta.argmin()), delta.shape)
+    if delta[i, k] >= -EPSILON:
+        return None, evaluados
+
+    nueva_a, nueva_b = list(a), list(b)
+    nueva_a[i], nueva_b[k] = b[k], a[i]
+    return (float(delta[i, k]), nueva_a, nueva_b), evaluados
+
+
+OperadorIntra = Callable[[Problema, int, List[int]], MovimientoIntra]
+OperadorInter = Callable[
+    [Problema, List[int], List[int], int, int, HorarioRuta, HorarioRuta], MovimientoInter
+]
+
+OPERADORES_INTRA: Tuple[OperadorIntra, ...] = (dos_opt, or_opt)
+OPERADORES_INTER: Tuple[OperadorInter, ...] = (reubicar, intercambiar)
+
+
+class BusquedaLocal:
+    """Aplica el mejor movimiento disponible hasta no mejorar o agotar el presupuesto"""
+
+    def __init__(
+        self,
+        operadores_intra: Sequence[OperadorIntra] = OPERADORES_INTRA,
+        operadores_inter: Sequence[OperadorInter] = OPERADORES_INTER,
+        max_movimientos: Optional[int] = None,
+        max_paradas_exacto: Optional[int] = None
+    ):
+        self.operadores_intra = tuple(operadores_intra)
+        self.operadores_inter = tuple(operadores_inter)
+        self.max_movimientos = (
+            max_movimientos if max_movimientos is not None
+            else settings.BUSQUEDA_LOCAL_MAX_MOVIMIENTOS
+        )
+        self.max_paradas_exacto = min(
+            max_paradas_exacto if max_paradas_exacto is not None
+            else settings.SECUENCIA_EXACTA_MAX_PARADAS,
+            MAX_PARADAS_EXACTO
+        )
+
+    def mejorar_ruta(self, problema: Problema, v: int, paradas: List[int]) -> List[int]:
+        """
+        Orden óptimo en km si la ruta es chica y ese orden cumple los
+        horarios; si no, 2-opt / Or-opt sobre la ruta del vehículo v
+        """
+        paradas = list(paradas)
+        if 2 < len(paradas) <= self.max_paradas_exacto:
+            _, optima = secuencia_optima(problema.km, paradas)
+            if ruta_factible(problema, v, optima):
+                return optima
+
+        evaluados = 0
+
+        while evaluados < self.max_movimientos:
+            mejor = None
+            for operador in self.operadores_intra:
+                movimiento, n = operador(problema, v, paradas)
+                evaluados += n
+                if movimiento and (mejor is None or movimiento[0] < mejor[0]):
+                    mejor = movimiento
+            if mejor is None:
+                break
+            paradas = mejor[1]
+
+        return paradas
+
+    def mejorar_plan(
+        self,
+        problema: Problema,
+        plan: Plan,
+        convergencia: Optional[Convergencia] = None
+    ) -> Plan:
+        """
+        Movimientos entre rutas. El mejor movimiento de cada par de
+        vehículos se guarda y solo se recalcula cuando alguna de sus
+        rutas cambia. Con convergencia publica cada mejora y corta
+        cuando se lo piden
+        """
+        if not self.operadores_inter or len(problema.vehiculos) < 2:
+            return plan
+
+        rutas: Dict[int, List[int]] = {v: [] for v in range(len(problema.vehiculos))}
+        for v, paradas in plan:
+            rutas[v] = list(paradas)
+        horarios = {v: HorarioRuta(problema, v, paradas) for v, paradas in rutas.items()}
+
+        mejores: Dict[Tuple[int, int], Optional[tuple]] = {}
+        evaluados = 0
+        aplicados = 0
+        km_inicial = problema.distancia_plan(plan)
+        # Los movimientos entre rutas no cambian las asignadas: el costo
+        # solo varía en el delta de km de cada movimiento
+        costo = problema.costo(rutas.values())
+        convergencia = convergencia or Convergencia()
+
+        while evaluados < self.max_movimientos and not convergencia.agotada:
+            for va in rutas:
+                for vb in rutas:
+                    if va == vb or (va, vb) in mejores:
+                        continue
+                    mejor = None
+                    for operador in self.operadores_inter:
+                        movimiento, n = operador(
+                            problema, rutas[va], rutas[vb], va, vb, horarios[va], horarios[vb]
+                        )
+                        evaluados += n
+                        if movimiento and (mejor is None or movimiento[0] < mejor[0]):
+                            mejor = movimiento
+                    mejores[(va, vb)] = mejor
+
+            candidatos = [(m[0], par, m) for par, m in mejores.items() if m]
+            if not candidatos:
+                break
+
+            _, (va, vb), movimiento = min(candidatos, key=lambda c: c[0])
+            rutas[va], rutas[vb] = movimiento[1], movimiento[2]
+            horarios[va] = HorarioRuta(problema, va, rutas[va])
+            horarios[vb] = HorarioRuta(problema, vb, rutas[vb])
+            aplicados += 1
+            costo += movimiento[0]
+            convergencia.reportar("busqueda_local", problema, rutas.values(), aplicados, costo)
+
+            # Invalidar los pares que involucran las rutas modificadas
+            for par in [p for p in mejores if va in p or vb in p]:
+                del mejores[par]
+
+        nuevo = [(v, paradas) for v, paradas in rutas.items() if paradas]
+        logger.info(
+            f"🔁 Búsqueda local: {aplicados} movimientos, "
+            f"{km_inicial:.1f} -> {problema.distancia_plan(nuevo):.1f} km"
+        )
+        return nuevo
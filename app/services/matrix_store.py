@@ -0,0 +1,201 @@
+# app/services/matrix_store.py
+"""
+Matriz Precalculada de Clientes
+Un proceso nocturno calcula la matriz completa almacén + clientes (km y
+minutos) y la escribe en un .npy que los workers abren con memmap: todos
+comparten las mismas páginas del sistema operativo en lugar de tener cada
+uno su copia. El optimizador solo lee las filas de los clientes del día;
+los clientes nuevos o que se movieron se calculan al vuelo.
+El índice guarda el motor de distancias que la calculó: si RED_VIAL_ARCHIVO
+cambia, la matriz se ignora hasta el próximo cálculo en lugar de mezclar
+valores de dos motores.
+"""
+
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Cliente
+from app.services.distance_matrix import haversine_pares_km
+from app.services.road_network import motor_por_defecto
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_MATRIZ = "matriz.npy"  # float32 (2, n, n): [km, minutos]
+ARCHIVO_INDICE = "indice.npz"  # ids de cliente, coordenadas de cada fila y motor
+
+# Un cliente se considera movido si su ubicación cambió más que esto
+TOLERANCIA_MOVIDO_KM = 0.02
+
+# Filas calculadas por bloque al construir (limita la memoria del motor)
+FILAS_POR_BLOQUE = 256
+
+Punto = Tuple[float, float]
+
+
+class MatrizPrecalculada:
+    """
+    Matriz almacén + clientes abierta en modo memmap (solo lectura)
+    Fila 0 = almacén, filas 1..n = clientes según el índice
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        with np.load(os.path.join(directorio, ARCHIVO_INDICE)) as indice:
+            self.cliente_ids = indice["cliente_ids"]
+            self.coordenadas = indice["coordenadas"]
+            self.generada_en = float(indice["generada_en"])
+            # Las matrices anteriores no registraban el motor
+            self.motor = str(indice["motor"]) if "motor" in indice.files else None
+        self.datos = np.load(os.path.join(directorio, ARCHIVO_MATRIZ), mmap_mode="r")
+        if self.datos.shape[1] != len(self.coordenadas):
+            raise ValueError("Índice y matriz precalculada no coinciden")
+
+        self.fila_de: Dict[int, int] = {
+            int(cliente_id): fila for fila, cliente_id in enumerate(self.cliente_ids.tolist(), 1)
+        }
+
+    @property
+    def almacen(self) -> Punto:
+        return tuple(self.coordenadas[0])
+
+    def submatriz(
+        self,
+        almacen: Punto,
+        clientes: Sequence[Tuple[int, float, float]],
+        motor=None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matrices (km, minutos) de almacén + clientes del día (con repetidos)
+        Lee solo las filas necesarias del memmap; los puntos sin fila vigente
+        (cliente nuevo, movido o almacén distinto) se calculan con el motor.
+        Si el motor no es el que calculó la matriz, se calcula todo con él
+        """
+        motor = motor or motor_por_defecto()
+        puntos = np.asarray([almacen] + [(lat, lng) for _, lat, lng in clientes], dtype=np.float64)
+        filas = np.array(
+            [0] + [self.fila_de.get(int(cliente_id), -1) for cliente_id, _, _ in clientes],
+            dtype=np.intp
+        )
+
+        conocidos = filas >= 0
+        if motor.nombre != self.motor:
+            conocidos[:] = False
+        movido = haversine_pares_km(
+            puntos[conocidos], self.coordenadas[filas[conocidos]]
+        ) > TOLERANCIA_MOVIDO_KM
+        conocidos[np.flatnonzero(conocidos)[movido]] = False
+
+        # Solo se tocan las páginas de las celdas del día (filas ordenadas
+        # y sin repetir); el resto de la matriz nunca entra en memoria
+        unicas, posicion = np.unique(np.where(conocidos, filas, 0), return_inverse=True)
+        celdas = np.ix_(unicas, unicas)
+        seleccion = np.ix_(posicion, posicion)
+        km = self.datos[0][celdas][seleccion].astype(np.float64)
+        minutos = self.datos[1][celdas][seleccion].astype(np.float64)
+
+        faltantes = np.flatnonzero(~conocidos)
+        if len(faltantes):
+            km_f, min_f = motor.calcular(puntos[faltantes], puntos)
+            km[faltantes, :], minutos[faltantes, :] = km_f, min_f
+            km_f, min_f = motor.calcular(puntos, puntos[faltantes])
+            km[:, faltantes], minutos[:, faltantes] = km_f, min_f
+            logger.info(f"🗺️ Matriz precalculada: {len(faltantes)} puntos calculados al vuelo")
+
+        return km, minutos
+
+
+_cargada: Optional[Tuple[Tuple[str, float], MatrizPrecalculada]] = None
+_candado = threading.Lock()
+
+
+def abrir_matriz(directorio: Optional[str] = None, motor=None) -> Optional[MatrizPrecalculada]:
+    """
+    Matriz precalculada vigente, o None si no está configurada, no existe
+    o la calculó otro motor de distancias (por defecto, el configurado)
+    Se reabre sola cuando el proceso nocturno publica una nueva
+    """
+    global _cargada
+    directorio = directorio if directorio is not None else settings.MATRIZ_PRECALCULADA_DIR
+    ruta_indice = os.path.join(directorio, ARCHIVO_INDICE) if directorio else ""
+    if not ruta_indice or not os.path.exists(ruta_indice):
+        return None
+
+    version = (directorio, os.path.getmtime(ruta_indice))
+    with _candado:
+        if _cargada is None or _cargada[0] != version:
+            try:
+                _cargada = (version, MatrizPrecalculada(directorio))
+            except (OSError, ValueError, KeyError):
+                logger.exception(f"No se pudo abrir la matriz precalculada en {directorio}")
+                return None
+        matriz = _cargada[1]
+
+    motor = motor or motor_por_defecto()
+    if matriz.motor != motor.nombre:
+        logger.warning(
+            f"⚠️ Matriz precalculada de {directorio} calculada con {matriz.motor or 'otro motor'} "
+            f"y el motor actual es {motor.nombre}: se ignora hasta recalcularla"
+        )
+        return None
+    return matriz
+
+
+def construir_matriz(
+    db: Session,
+    directorio: str,
+    almacen: Punto,
+    motor=None
+) -> int:
+    """
+    Calcula y publica la matriz almacén + todos los clientes con ubicación
+    Escribe en archivos temporales y los reemplaza al final, de modo que
+    los workers nunca abren una matriz a medio escribir
+
+    Returns: cantidad de clientes indexados
+    """
+    inicio = time.perf_counter()
+    motor = motor or motor_por_defecto()
+    clientes = db.query(Cliente.id, Cliente.lat, Cliente.lng).filter(
+        Cliente.lat.isnot(None), Cliente.lng.isnot(None)
+    ).order_by(Cliente.id).all()
+
+    puntos = np.asarray([almacen] + [(c.lat, c.lng) for c in clientes], dtype=np.float64)
+    n = len(puntos)
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta_matriz = os.path.join(directorio, ARCHIVO_MATRIZ)
+    ruta_indice = os.path.join(directorio, ARCHIVO_INDICE)
+
+    temporal = ruta_matriz + ".tmp"
+    datos = np.lib.format.open_memmap(temporal, mode="w+", dtype=np.float32, shape=(2, n, n))
+    for desde in range(0, n, FILAS_POR_BLOQUE):
+        hasta = min(desde + FILAS_POR_BLOQUE, n)
+        km, minutos = motor.calcular(puntos[desde:hasta], puntos)
+        datos[0, desde:hasta] = km
+        datos[1, desde:hasta] = minutos
+    datos.flush()
+    del datos
+
+    # np.savez agrega .npz si el nombre no lo trae
+    temporal_indice = ruta_indice[:-len(".npz")] + ".tmp.npz"
+    np.savez(
+        temporal_indice,
+        cliente_ids=np.array([c.id for c in clientes], dtype=np.int64),
+        coordenadas=puntos,
+        generada_en=np.float64(time.time()),
+        motor=np.str_(motor.nombre)
+    )
+    os.replace(temporal, ruta_matriz)
+    os.replace(temporal_indice, ruta_indice)
+
+    logger.info(
+        f"🗺️ Matriz precalculada: {len(clientes)} clientes, "
+        f"{2 * n * n * 4 / 1e6:.0f} MB en {time.perf_counter() - inicio:.1f}s"
+    )
+    return len(clientes)
+
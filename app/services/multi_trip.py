@@ -0,0 +1,146 @@
+# app/services/multi_trip.py
+"""
+Varios Viajes por Camión
+Cada camión entra al problema como un vehículo por viaje posible en el
+turno de su chofer, en franjas separadas por la recarga en el almacén:
+todos los algoritmos resuelven un solo problema con la flota ampliada sin
+que dos viajes del mismo camión se superpongan. Al terminar, cada viaje se
+adelanta al regreso real del anterior más la recarga, y el tiempo liberado
+se usa para insertar entregas pendientes.
+"""
+
+from app.services.problem_snapshot import Plan, Problema, VehiculoSnapshot
+from app.services.time_windows import HorarioRuta, TOLERANCIA, insertar_mas_barato, ruta_factible
+from typing import Dict, List, Tuple
+import copy
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def franjas_viajes(
+    inicio_turno: float,
+    fin_turno: float,
+    carga_inicial_min: float,
+    recarga_min: float,
+    max_minutos_viaje: float,
+    max_viajes: int,
+    min_minutos_viaje: float
+) -> List[Tuple[float, float, float]]:
+    """
+    El primer viaje tiene el horario de una ruta única (hasta
+    max_minutos_viaje o el fin del turno). Lo que queda del turno se reparte
+    en los viajes siguientes que dejen al menos min_minutos_viaje de reparto;
+    los demás quedan en reserva al final del turno, sin horario, hasta que
+    encadenar_viajes les libere tiempo
+    Returns: (inicio de la carga, salida del almacén, regreso máximo) por viaje
+    """
+    fin_primero = min(inicio_turno + max_minutos_viaje, fin_turno)
+    franjas = [(inicio_turno, inicio_turno + carga_inicial_min, fin_primero)]
+
+    adicionales = max(0, max_viajes - 1)
+    viajes = adicionales
+    while viajes and (fin_turno - fin_primero - viajes * recarga_min) / viajes < min_minutos_viaje:
+        viajes -= 1
+
+    carga_desde = fin_primero
+    if viajes:
+        reparto = (fin_turno - fin_primero - viajes * recarga_min) / viajes
+        for _ in range(viajes):
+            salida = carga_desde + recarga_min
+            franjas.append((
+                carga_desde, salida, min(salida + reparto, carga_desde + max_minutos_viaje)
+            ))
+            carga_desde = salida + reparto
+
+    franjas.extend(
+        (fin_turno - recarga_min, fin_turno, fin_turno)
+        for _ in range(adicionales - viajes)
+    )
+    return franjas
+
+
+def vehiculos_por_viaje(
+    vehiculo: VehiculoSnapshot,
+    franjas: List[Tuple[float, float, float]]
+) -> List[VehiculoSnapshot]:
+    """Una copia del vehículo por franja, numeradas desde 1"""
+    viajes = []
+    for numero, (carga_desde, salida, regreso_max) in enumerate(franjas, 1):
+        viaje = copy.copy(vehiculo)
+        viaje.viaje = numero
+        viaje.carga_min = salida - carga_desde
+        viaje.salida_min = salida
+        viaje.regreso_max_min = regreso_max
+        viajes.append(viaje)
+    return viajes
+
+
+def encadenar_viajes(
+    problema: Problema,
+    plan: Plan,
+    recarga_min: float,
+    max_minutos_viaje: float
+) -> Plan:
+    """
+    Adelanta cada viaje a la vuelta real del anterior más la recarga (si
+    sigue dentro de horario) y reparte el tiempo liberado entre las
+    entregas sin asignar. Modifica los horarios de problema.vehiculos
+    """
+    vehiculos = problema.vehiculos
+    rutas: List[List[int]] = [[] for _ in vehiculos]
+    for v, paradas in plan:
+        rutas[v] = list(paradas)
+
+    por_camion: Dict[int, List[int]] = {}
+    for v, vehiculo in enumerate(vehiculos):
+        por_camion.setdefault(vehiculo.id, []).append(v)
+
+    adelantados = 0
+    for viajes in por_camion.values():
+        if len(viajes) < 2:
+            continue
+        viajes.sort(key=lambda v: vehiculos[v].viaje)
+
+        # Un viaje vacío no ocurre: el siguiente puede salir tras el último real
+        regreso_previo = None
+        for v in viajes:
+            vehiculo = vehiculos[v]
+            if regreso_previo is not None and regreso_previo + recarga_min < vehiculo.salida_min - TOLERANCIA:
+                horario = (vehiculo.salida_min, vehiculo.regreso_max_min)
+                vehiculo.salida_min = regreso_previo + recarga_min
+                vehiculo.regreso_max_min = min(
+                    vehiculo.regreso_max_min, regreso_previo + max_minutos_viaje
+                )
+                if not ruta_factible(problema, v, rutas[v]):
+                    vehiculo.salida_min, vehiculo.regreso_max_min = horario
+                else:
+                    adelantados += 1
+            if rutas[v]:
+                # Minuto entero: la hora guardada en la ruta no puede quedar antes del regreso
+                regreso_previo = math.ceil(HorarioRuta(problema, v, rutas[v]).regreso)
+
+        # Cada viaje debe volver antes de que empiece la recarga del siguiente
+        for actual, siguiente in zip(viajes, viajes[1:]):
+            vehiculos[actual].regreso_max_min = min(
+                vehiculos[actual].regreso_max_min,
+                vehiculos[siguiente].salida_min - recarga_min
+            )
+
+    if not adelantados:
+        return plan
+
+    asignadas = {i for paradas in rutas for i in paradas}
+    penalizacion = problema.penalizacion()
+    pendientes = sorted(
+        (i for i in range(1, problema.n_paradas + 1) if i not in asignadas),
+        key=lambda i: -penalizacion[i]
+    )
+    insertadas = sum(insertar_mas_barato(problema, rutas, i) for i in pendientes)
+
+    logger.info(
+        f"🔁 Viajes encadenados: {adelantados} adelantados, "
+        f"{insertadas} entregas más en el tiempo liberado"
+    )
+    return [(v, paradas) for v, paradas in enumerate(rutas) if paradas]
@@ -0,0 +1,251 @@
+# app/services/optimization_jobs.py
+"""
+Trabajos de Optimización en Segundo Plano
+La optimización de un día corre en un pool de hilos con su propia sesión
+de BD, fuera del event loop. Cada trabajo expone estado, progreso, tiempo
+por fase y el resultado final. Un candado por fecha evita dos corridas
+simultáneas del mismo día.
+Los cambios de fase y las mejoras del modo anytime quedan en un registro
+de eventos numerados que se transmite por SSE.
+"""
+
+from app.database import SessionLocal
+from app.config import settings
+from app.services.route_optimizer import RouteOptimizer
+from app.services.anytime import Convergencia
+from app.services.live_feed import publicador_flota
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import uuid
+import enum
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trabajos terminados que se conservan para consulta
+MAX_TRABAJOS_GUARDADOS = 100
+
+# (número, tipo, datos) de un evento del trabajo
+Evento = Tuple[int, str, Dict]
+
+
+class EstadoTrabajo(str, enum.Enum):
+    EN_COLA = "en_cola"
+    EJECUTANDO = "ejecutando"
+    COMPLETADO = "completado"
+    ERROR = "error"
+
+
+class TrabajoEnCurso(Exception):
+    """Ya hay una optimización en cola o ejecutándose para esa fecha"""
+
+    def __init__(self, trabajo: "TrabajoOptimizacion"):
+        super().__init__(f"Ya hay una optimización en curso para {trabajo.fecha}")
+        self.trabajo = trabajo
+
+
+class TrabajoOptimizacion:
+    """Estado observable de una optimización"""
+
+    def __init__(self, fecha: date, presupuesto_segundos: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.fecha = fecha
+        self.presupuesto_segundos = presupuesto_segundos
+        self.estado = EstadoTrabajo.EN_COLA
+        self.fase: Optional[str] = None
+        self.progreso = 0
+        self.fases_ms: Dict[str, int] = {}
+        self.creado_en = datetime.now()
+        self.iniciado_en: Optional[datetime] = None
+        self.terminado_en: Optional[datetime] = None
+        self.resultado: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self._inicio_fase: Optional[float] = None
+        self.convergencia = Convergencia(presupuesto_segundos, al_mejorar=self._mejora)
+        self.mejoras: List[Dict] = []
+        self._eventos: List[Evento] = []
+        self._candado = threading.Lock()
+
+    @property
+    def activo(self) -> bool:
+        return self.estado in (EstadoTrabajo.EN_COLA, EstadoTrabajo.EJECUTANDO)
+
+    def avanzar(self, fase: str, progreso: int):
+        """Cierra el tiempo de la fase anterior y registra la nueva"""
+        ahora = time.perf_counter()
+        if self.fase is not None and self._inicio_fase is not None:
+            self.fases_ms[self.fase] = int((ahora - self._inicio_fase) * 1000)
+        self.fase = fase
+        self.progreso = progreso
+        self._inicio_fase = ahora
+        self._emitir("progreso", {"fase": fase, "progreso": progreso})
+
+    def aceptar(self):
+        """El despachador acepta la mejor solución actual"""
+        self.convergencia.detener()
+
+    def terminar(self, estado: EstadoTrabajo):
+        self.estado = estado
+        self.terminado_en = datetime.now()
+        self._emitir("fin", self.a_dict())
+
+    def eventos_desde(self, numero: int) -> List[Evento]:
+        """Eventos posteriores al número dado (0 = todos)"""
+        with self._candado:
+            return self._eventos[numero:]
+
+    def _mejora(self, mejora: Dict):
+        self.mejoras.append(mejora)
+        self._emitir("mejora", mejora)
+
+    def _emitir(self, tipo: str, datos: Dict):
+        with self._candado:
+            self._eventos.append((len(self._eventos) + 1, tipo, datos))
+
+    def a_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "fecha": self.fecha.isoformat(),
+            "estado": self.estado.value,
+            "fase": self.fase,
+            "progreso": self.progreso,
+            "fases_ms": self.fases_ms,
+            "creado_en": self.creado_en.isoformat(),
+            "iniciado_en": self.iniciado_en.isoformat() if self.iniciado_en else None,
+            "terminado_en": self.terminado_en.isoformat() if self.terminado_en else None,
+            "presupuesto_segundos": self.presupuesto_segundos,
+            "mejor": self.mejoras[-1] if self.mejoras else None,
+            "resultado": self.resultado,
+            "error": self.error
+        }
+
+
+def resumir_rutas(rutas: List, fecha: date, tiempo_calculo: float) -> Dict:
+    """Respuesta de optimización: rutas creadas y métricas agregadas"""
+    if not rutas:
+        return {
+            "success": False,
+            "message": "No se pudieron crear rutas. Verifica que haya entregas pendientes y camiones disponibles.",
+            "rutas_creadas": 0,
+            "entregas_asignadas": 0
+        }
+
+    total_entregas = sum(r.cantidad_entregas for r in rutas)
+    total_km = sum(r.distancia_total_km for r in rutas)
+    total_costo = sum(r.costo_total_estimado for r in rutas)
+    total_valor = sum(r.valor_total_facturas for r in rutas)
+    score_promedio = sum(r.score_optimizacion for r in rutas) / len(rutas)
+
+    return {
+        "success": True,
+        "message": f"Rutas optimizadas exitosamente para {fecha}",
+        "rutas_creadas": len(rutas),
+        "entregas_asignadas": total_entregas,
+        "rutas": [
+            {
+                "id": r.id,
+                "codigo": r.codigo,
+                "camion_placa": r.camion.placa,
+                "chofer_nombre": r.chofer.nombre if r.chofer else "Sin asignar",
+                "cantidad_entregas": r.cantidad_entregas,
+                "distancia_total_km": round(r.distancia_total_km, 2),
+                "tiempo_total_estimado_min": r.tiempo_total_estimado_min,
+                "costo_total_estimado": round(r.costo_total_estimado, 2),
+                "score_optimizacion": r.score_optimizacion,
+                "valor_total_facturas": round(r.valor_total_facturas, 2)
+            }
+            for r in rutas
+        ],
+        "metricas": {
+            "distancia_total_km": round(total_km, 2),
+            "costo_total_estimado": round(total_costo, 2),
+            "valor_total_facturas": round(total_valor, 2),
+            "score_promedio": round(score_promedio, 1),
+            "tiempo_calculo_segundos": round(tiempo_calculo, 2),
+            "km_promedio_por_ruta": round(total_km / len(rutas), 2),
+            "entregas_promedio_por_ruta": round(total_entregas / len(rutas), 1)
+        }
+    }
+
+
+class GestorTrabajos:
+    """Cola de optimizaciones atendida por un pool de hilos"""
+
+    def __init__(self, max_trabajadores: int):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_trabajadores,
+            thread_name_prefix="optimizacion"
+        )
+        self._candado = threading.Lock()
+        self._trabajos: "OrderedDict[str, TrabajoOptimizacion]" = OrderedDict()
+        self._por_fecha: Dict[date, TrabajoOptimizacion] = {}
+
+    def encolar(
+        self,
+        fecha: date,
+        presupuesto_segundos: Optional[float] = None
+    ) -> TrabajoOptimizacion:
+        """
+        Crea y encola la optimización de una fecha, opcionalmente con un
+        presupuesto de tiempo para la búsqueda (modo anytime)
+        Raises: TrabajoEnCurso si esa fecha ya tiene una optimización activa
+        """
+        with self._candado:
+            actual = self._por_fecha.get(fecha)
+            if actual is not None and actual.activo:
+                raise TrabajoEnCurso(actual)
+
+            trabajo = TrabajoOptimizacion(fecha, presupuesto_segundos)
+            self._por_fecha[fecha] = trabajo
+            self._trabajos[trabajo.id] = trabajo
+            self._purgar()
+
+        self._pool.submit(self._ejecutar, trabajo)
+        logger.info(f"📥 Optimización {trabajo.id} encolada para {fecha}")
+        return trabajo
+
+    def obtener(self, trabajo_id: str) -> Optional[TrabajoOptimizacion]:
+        with self._candado:
+            return self._trabajos.get(trabajo_id)
+
+    def _purgar(self):
+        """Descarta los trabajos terminados más antiguos"""
+        terminados = [t for t in self._trabajos.values() if not t.activo]
+        for trabajo in terminados[:max(0, len(self._trabajos) - MAX_TRABAJOS_GUARDADOS)]:
+            del self._trabajos[trabajo.id]
+            if self._por_fecha.get(trabajo.fecha) is trabajo:
+                del self._por_fecha[trabajo.fecha]
+
+    def _ejecutar(self, trabajo: TrabajoOptimizacion):
+        trabajo.estado = EstadoTrabajo.EJECUTANDO
+        trabajo.iniciado_en = datetime.now()
+        inicio = time.perf_counter()
+
+        trabajo.convergencia.iniciar()
+
+        db = SessionLocal()
+        try:
+            optimizer = RouteOptimizer(
+                db, al_avanzar=trabajo.avanzar, convergencia=trabajo.convergencia
+            )
+            rutas = optimizer.optimizar_dia(trabajo.fecha)
+            trabajo.avanzar("terminado", 100)
+            trabajo.resultado = resumir_rutas(
+                rutas, trabajo.fecha, time.perf_counter() - inicio
+            )
+            trabajo.terminar(EstadoTrabajo.COMPLETADO)
+            publicador_flota.invalidar_estadisticas()
+        except Exception as e:
+            logger.exception(f"❌ Optimización {trabajo.id} falló")
+            trabajo.avanzar("error", trabajo.progreso)
+            trabajo.error = f"Error en optimización: {str(e)}"
+            trabajo.terminar(EstadoTrabajo.ERROR)
+        finally:
+            db.close()
+
+
+gestor_trabajos = GestorTrabajos(settings.OPTIMIZACION_TRABAJADORES)
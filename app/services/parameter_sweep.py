@@ -0,0 +1,194 @@
+# app/services/parameter_sweep.py
+"""
+Comparación de Parámetros (what-if)
+Evalúa varias variantes de ParametrosOptimizacion sobre el mismo snapshot
+del día (entregas, camiones y matriz se cargan una sola vez) sin guardar
+nada. Cada variante corre en un proceso trabajador, que recibe el snapshot
+una sola vez al iniciar, y el resultado es una tabla comparativa.
+"""
+
+from sqlalchemy.orm import Session
+from app.models import ParametrosOptimizacion, AlgoritmoOptimizacion
+from app.services.route_optimizer import RouteOptimizer
+from app.services.anytime import Convergencia
+from app.services.distance_matrix import MatrizDistancias
+from app.services.travel_time import ModeloTiempos
+from app.services.problem_snapshot import ParadaSnapshot, VehiculoSnapshot
+from app.services.result_writer import RutaPlanificada
+from app.config import settings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import multiprocessing
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Campos de ParametrosOptimizacion que una variante puede cambiar (los que
+# usa el optimizador; los peso_* no intervienen en ningún algoritmo)
+CAMPOS_VARIABLES = (
+    "max_horas_ruta",
+    "max_entregas_por_ruta",
+    "max_km_por_ruta",
+    "tiempo_carga_inicial_min",
+    "margen_seguridad_peso",
+    "margen_seguridad_volumen",
+    "costo_combustible_litro",
+    "costo_hora_operacion",
+    "costo_km_mantenimiento",
+    "algoritmo_preferido",
+    "max_iteraciones",
+)
+
+# Máximo de variantes por comparación
+MAX_VARIANTES = 12
+
+# Snapshot del día compartido por todas las variantes:
+# (paradas, matriz, modelo de tiempos, hora de inicio)
+Escenario = Tuple[List[ParadaSnapshot], MatrizDistancias, ModeloTiempos, float]
+
+# Snapshot en cada proceso trabajador
+_escenario: Optional[Escenario] = None
+
+
+def parametros_variante(
+    base: ParametrosOptimizacion,
+    nombre: str,
+    cambios: Dict
+) -> ParametrosOptimizacion:
+    """
+    Copia en memoria (nunca se agrega a la sesión) de los parámetros
+    activos con los cambios de la variante
+    Raises: ValueError si un campo no se puede variar o el algoritmo no existe
+    """
+    desconocidos = set(cambios) - set(CAMPOS_VARIABLES)
+    if desconocidos:
+        raise ValueError(f"Campos no variables: {', '.join(sorted(desconocidos))}")
+
+    valores = {
+        columna.key: getattr(base, columna.key)
+        for columna in ParametrosOptimizacion.__table__.columns
+        if columna.key not in ("id", "created_at", "updated_at")
+    }
+    valores.update({campo: valor for campo, valor in cambios.items() if valor is not None})
+    valores.update(nombre=nombre, activo=False)
+    if valores["algoritmo_preferido"] is not None:
+        valores["algoritmo_preferido"] = AlgoritmoOptimizacion(valores["algoritmo_preferido"])
+    return ParametrosOptimizacion(**valores)
+
+
+def resumir_plan(rutas: List[RutaPlanificada], n_paradas: int) -> Dict:
+    """Fila comparativa de un plan: costo, km, rutas usadas y entregas"""
+    asignadas = sum(len(r.paradas) for r in rutas)
+    return {
+        "costo_total_estimado": round(sum(r.metricas["costo_total_estimado"] for r in rutas), 2),
+        "distancia_total_km": round(sum(r.metricas["distancia_total_km"] for r in rutas), 2),
+        "rutas": len(rutas),
+        "entregas_asignadas": asignadas,
+        "entregas_sin_asignar": n_paradas - asignadas,
+        "score_promedio": round(
+            sum(r.metricas["score_optimizacion"] for r in rutas) / len(rutas), 1
+        ) if rutas else 0.0
+    }
+
+
+# ========== EVALUACIÓN ==========
+
+def _evaluar_con(
+    escenario: Escenario,
+    nombre: str,
+    params: ParametrosOptimizacion,
+    vehiculos: List[VehiculoSnapshot],
+    presupuesto_segundos: Optional[float]
+) -> Dict:
+    """Planifica una variante y resume su resultado"""
+    paradas, matriz, modelo_tiempos, hora_inicio = escenario
+    optimizer = RouteOptimizer.para_simulacion(
+        params, matriz, modelo_tiempos, hora_inicio, Convergencia(presupuesto_segundos)
+    )
+    inicio = time.perf_counter()
+    rutas = optimizer._planificar(paradas, vehiculos)
+    return {
+        "variante": nombre,
+        "algoritmo": (params.algoritmo_preferido or AlgoritmoOptimizacion.GREEDY).value,
+        **resumir_plan(rutas, len(paradas)),
+        "tiempo_calculo_ms": int((time.perf_counter() - inicio) * 1000)
+    }
+
+
+def _inicializar_trabajador(escenario: Escenario):
+    global _escenario
+    _escenario = escenario
+
+
+def _evaluar(nombre, params, vehiculos, presupuesto_segundos) -> Dict:
+    return _evaluar_con(_escenario, nombre, params, vehiculos, presupuesto_segundos)
+
+
+def comparar_variantes(
+    db: Session,
+    fecha: date,
+    variantes: List[Tuple[str, Dict]],
+    presupuesto_segundos: Optional[float] = None,
+    procesos: Optional[int] = None
+) -> Dict:
+    """
+    Evalúa (nombre, cambios) por variante sobre el snapshot del día
+    Returns: entregas y camiones del snapshot y la tabla (menos entregas
+             sin asignar primero, luego menor costo)
+    Raises: ValueError si alguna variante es inválida
+    """
+    if not variantes:
+        raise ValueError("Indica al menos una variante")
+    if len(variantes) > MAX_VARIANTES:
+        raise ValueError(f"Máximo {MAX_VARIANTES} variantes por comparación")
+
+    optimizer = RouteOptimizer(db)
+    configuraciones = [
+        (nombre, parametros_variante(optimizer.params, nombre, cambios))
+        for nombre, cambios in variantes
+    ]
+
+    # Snapshot único: entregas, camiones y matriz
+    paradas = optimizer._cargar_paradas_dia(fecha)
+    camiones = optimizer._get_camiones_disponibles()
+    if not paradas or not camiones:
+        return {"entregas": len(paradas), "camiones": len(camiones), "variantes": []}
+    optimizer.matriz = optimizer._construir_matriz(paradas)
+    db.commit()  # Solo las distancias nuevas del cache
+    escenario = (paradas, optimizer.matriz, optimizer.modelo_tiempos, optimizer.hora_inicio)
+
+    # Los márgenes y horarios de cada variante cambian los vehículos
+    tareas = [
+        (nombre, params, optimizer._flota(camiones, params), presupuesto_segundos)
+        for nombre, params in configuraciones
+    ]
+
+    procesos = min(
+        procesos or settings.SIMULACION_PROCESOS or os.cpu_count() or 1, len(tareas)
+    )
+    inicio = time.perf_counter()
+    if procesos > 1:
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar_trabajador,
+            initargs=(escenario,)
+        ) as pool:
+            filas = list(pool.map(_evaluar, *zip(*tareas)))
+    else:
+        filas = [_evaluar_con(escenario, *tarea) for tarea in tareas]
+
+    logger.info(
+        f"⚖️ {len(filas)} variantes comparadas para {fecha} "
+        f"({procesos} procesos, {time.perf_counter() - inicio:.1f}s)"
+    )
+    return {
+        "entregas": len(paradas),
+        "camiones": len(camiones),
+        "variantes": sorted(filas, key=lambda fila: (
+            fila["entregas_sin_asignar"], fila["costo_total_estimado"]
+        ))
+    }
@@ -0,0 +1,299 @@
+# app/services/problem_snapshot.py
+"""
+Snapshot del Problema de Ruteo
+Representación compacta (arreglos NumPy) de las paradas y vehículos del día,
+independiente del ORM, sobre la que trabajan los algoritmos
+"""
+
+from app.services.travel_time import ModeloTiempos
+from app.services.compatibility import REFRIGERACION, compilar_compatibilidad
+import numpy as np
+import math
+from datetime import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# Plan = [(índice de vehículo, [índices de parada en orden de visita]), ...]
+Plan = List[Tuple[int, List[int]]]
+
+# Penalización (km equivalentes) por entrega sin asignar, por punto de prioridad
+PENALIZACION_NO_ASIGNADA_KM = 100.0
+
+# Ventana por defecto: todo el día (minutos desde medianoche)
+MINUTOS_DIA = 24 * 60
+
+
+def minutos_del_dia(hora: Optional[time], defecto: int) -> int:
+    """Hora del día en minutos desde medianoche"""
+    if hora is None:
+        return defecto
+    return hora.hour * 60 + hora.minute
+
+
+def hora_del_dia(minutos: float) -> time:
+    """Minutos desde medianoche como hora (recortado al día)"""
+    minutos = int(min(max(minutos, 0), MINUTOS_DIA - 1))
+    return time(minutos // 60, minutos % 60)
+
+
+class ParadaSnapshot:
+    """Datos de una entrega y su cliente que usan los algoritmos (solo lectura)"""
+
+    __slots__ = (
+        "entrega_id", "cliente_id", "zona_id", "lat", "lng", "peso", "volumen",
+        "refrigeracion", "prioridad", "urgente", "servicio_min",
+        "ventana_inicio", "ventana_fin", "monto", "requisitos"
+    )
+
+    def __init__(
+        self,
+        entrega_id: int,
+        cliente_id: int,
+        zona_id: int,
+        lat: float,
+        lng: float,
+        peso: float,
+        volumen: float,
+        refrigeracion: bool,
+        prioridad: int,
+        urgente: bool,
+        servicio_min: float,
+        ventana_inicio: int = 0,
+        ventana_fin: int = MINUTOS_DIA,
+        monto: float = 0.0,
+        requisitos: int = 0
+    ):
+        self.entrega_id = entrega_id
+        self.cliente_id = cliente_id
+        self.zona_id = zona_id
+        self.lat = lat
+        self.lng = lng
+        self.peso = peso
+        self.volumen = volumen
+        self.refrigeracion = refrigeracion
+        self.prioridad = prioridad
+        self.urgente = urgente
+        self.servicio_min = servicio_min
+        self.ventana_inicio = ventana_inicio
+        self.ventana_fin = ventana_fin
+        self.monto = monto
+        # Requisitos de acceso de la zona (bits de compatibility.py)
+        self.requisitos = requisitos
+
+
+class VehiculoSnapshot:
+    """Capacidades efectivas de un vehículo (con margen de seguridad aplicado)"""
+
+    __slots__ = (
+        "id", "peso_max", "volumen_max", "refrigerado", "velocidad_kmh",
+        "chofer_id", "capacidad_peso_kg", "consumo_km", "salida_min", "regreso_max_min",
+        "aptitudes", "viaje", "carga_min"
+    )
+
+    def __init__(
+        self,
+        id: int,
+        peso_max: float,
+        volumen_max: float,
+        refrigerado: bool,
+        velocidad_kmh: float,
+        chofer_id: Optional[int] = None,
+        capacidad_peso_kg: float = 0.0,
+        consumo_km: float = 0.0,
+        salida_min: float = 0.0,
+        regreso_max_min: float = MINUTOS_DIA,
+        aptitudes: int = 0,
+        viaje: int = 1,
+        carga_min: float = 0.0
+    ):
+        self.id = id
+        self.peso_max = peso_max
+        self.volumen_max = volumen_max
+        self.refrigerado = refrigerado
+        self.velocidad_kmh = velocidad_kmh
+        self.chofer_id = chofer_id
+        # Capacidad nominal (sin margen) y consumo promedio en litros/km
+        self.capacidad_peso_kg = capacidad_peso_kg
+        self.consumo_km = consumo_km
+        # Jornada: sale del almacén (ya cargado) y debe volver antes del límite
+        self.salida_min = salida_min
+        self.regreso_max_min = regreso_max_min
+        # Aptitudes del camión y su chofer (bits de compatibility.py)
+        self.aptitudes = aptitudes
+        # Número de viaje del camión en el día y minutos de carga antes de salir
+        self.viaje = viaje
+        self.carga_min = carga_min
+
+
+class Problema:
+    """
+    Paradas del día y flota disponible
+    Índice 0 = almacén; las paradas usan los índices de la matriz de distancias
+    """
+
+    __slots__ = (
+        "km", "peso", "volumen", "refrigeracion", "prioridad", "urgente",
+        "zona", "vehiculos", "max_entregas", "coordenadas",
+        "servicio", "ventana_inicio", "ventana_fin", "max_km",
+        "trafico", "fila_trafico", "peso_max", "volumen_max", "compatible"
+    )
+
+    def __init__(
+        self,
+        km: np.ndarray,
+        peso: Sequence[float],
+        volumen: Sequence[float],
+        refrigeracion: Sequence[bool],
+        prioridad: Sequence[int],
+        urgente: Sequence[bool],
+        zona: Sequence[int],
+        vehiculos: List[VehiculoSnapshot],
+        max_entregas: int,
+        coordenadas: Optional[np.ndarray] = None,
+        servicio: Optional[Sequence[float]] = None,
+        ventana_inicio: Optional[Sequence[int]] = None,
+        ventana_fin: Optional[Sequence[int]] = None,
+        max_km: float = math.inf,
+        trafico: Optional[ModeloTiempos] = None,
+        requisitos: Optional[Sequence[int]] = None
+    ):
+        # Arreglos con una posición extra al inicio para el almacén
+        self.km = km
+        self.peso = np.concatenate(([0.0], np.asarray(peso, dtype=np.float64)))
+        self.volumen = np.concatenate(([0.0], np.asarray(volumen, dtype=np.float64)))
+        self.refrigeracion = np.concatenate(([False], np.asarray(refrigeracion, dtype=bool)))
+        self.prioridad = np.concatenate(([0], np.asarray(prioridad, dtype=np.int64)))
+        self.urgente = np.concatenate(([False], np.asarray(urgente, dtype=bool)))
+        self.zona = np.concatenate(([-1], np.asarray(zona, dtype=np.int64)))
+        self.vehiculos = vehiculos
+        self.max_entregas = max_entregas
+        # (lat, lng) por índice, almacén incluido (opcional)
+        self.coordenadas = coordenadas
+        # Límite de km por ruta
+        self.max_km = max_km
+        # Multiplicadores de tiempo por zona y franja horaria
+        self.trafico = trafico or ModeloTiempos()
+        self.fila_trafico = np.concatenate(([0], self.trafico.filas(zona))).astype(np.intp)
+
+        # Minutos de descarga y ventana horaria de cada parada
+        n = len(peso)
+        self.servicio = np.concatenate((
+            [0.0], np.zeros(n) if servicio is None else np.asarray(servicio, dtype=np.float64)
+        ))
+        self.ventana_inicio = np.concatenate((
+            [0], np.zeros(n, dtype=np.int64) if ventana_inicio is None
+            else np.asarray(ventana_inicio, dtype=np.int64)
+        ))
+        self.ventana_fin = np.concatenate((
+            [MINUTOS_DIA], np.full(n, MINUTOS_DIA, dtype=np.int64) if ventana_fin is None
+            else np.asarray(ventana_fin, dtype=np.int64)
+        ))
+
+        # Compatibilidad vehículo × parada, compilada una vez por problema
+        self.peso_max = np.array([v.peso_max for v in vehiculos], dtype=np.float64)
+        self.volumen_max = np.array([v.volumen_max for v in vehiculos], dtype=np.float64)
+        bits = np.concatenate((
+            [0], np.zeros(n, dtype=np.int64) if requisitos is None
+            else np.asarray(requisitos, dtype=np.int64)
+        )) | np.where(self.refrigeracion, REFRIGERACION, 0)
+        aptitudes = np.array(
+            [v.aptitudes | (REFRIGERACION if v.refrigerado else 0) for v in vehiculos],
+            dtype=np.int64
+        ).reshape(-1)
+        self.compatible = compilar_compatibilidad(
+            bits, aptitudes, self.peso, self.volumen, self.peso_max, self.volumen_max
+        )
+
+    @classmethod
+    def desde_paradas(
+        cls,
+        km: np.ndarray,
+        paradas: Sequence[ParadaSnapshot],
+        vehiculos: List[VehiculoSnapshot],
+        max_entregas: int,
+        coordenadas: Optional[np.ndarray] = None,
+        max_km: float = math.inf,
+        trafico: Optional[ModeloTiempos] = None
+    ) -> "Problema":
+        """Arma el problema con las paradas en el orden de la matriz (índices 1..n)"""
+        return cls(
+            km=km,
+            peso=[p.peso for p in paradas],
+            volumen=[p.volumen for p in paradas],
+            refrigeracion=[p.refrigeracion for p in paradas],
+            prioridad=[p.prioridad for p in paradas],
+            urgente=[p.urgente for p in paradas],
+            zona=[p.zona_id for p in paradas],
+            vehiculos=vehiculos,
+            max_entregas=max_entregas,
+            coordenadas=coordenadas,
+            servicio=[p.servicio_min for p in paradas],
+            ventana_inicio=[p.ventana_inicio for p in paradas],
+            ventana_fin=[p.ventana_fin for p in paradas],
+            max_km=max_km,
+            trafico=trafico,
+            requisitos=[p.requisitos for p in paradas]
+        )
+
+    @property
+    def n_paradas(self) -> int:
+        return len(self.peso) - 1
+
+    def minutos_viaje(self, previa, siguiente, salida, min_por_km: float):
+        """
+        Minutos de viaje (vectorizado) saliendo a la hora `salida`
+        El tramo toma el tráfico de la zona de destino, o la de origen al
+        volver al almacén
+        """
+        filas = np.where(siguiente == 0, self.fila_trafico[previa], self.fila_trafico[siguiente])
+        return self.km[previa, siguiente] * min_por_km * self.trafico.factor(filas, salida)
+
+    def admite(self, v: int, paradas: Sequence[int]) -> bool:
+        """Valida compatibilidad, capacidad y máximo de entregas de una ruta"""
+        if len(paradas) > self.max_entregas:
+            return False
+        if not paradas:
+            return True
+        indices = list(paradas)
+        return bool(
+            self.compatible[v, indices].all() and
+            self.peso[indices].sum() <= self.peso_max[v] and
+            self.volumen[indices].sum() <= self.volumen_max[v]
+        )
+
+    def flota_admite(self, peso: float, volumen: float, compatibles: np.ndarray) -> np.ndarray:
+        """Vehículos (máscara) compatibles con todas las paradas en los que cabe la carga"""
+        return compatibles & (peso <= self.peso_max) & (volumen <= self.volumen_max)
+
+    def distancia_ruta(self, paradas: Sequence[int]) -> float:
+        """Distancia almacén -> paradas -> almacén"""
+        if not paradas:
+            return 0.0
+        recorrido = np.fromiter(
+            [0, *paradas, 0], dtype=np.intp, count=len(paradas) + 2
+        )
+        return float(self.km[recorrido[:-1], recorrido[1:]].sum(dtype=np.float64))
+
+    def distancia_plan(self, plan: Plan) -> float:
+        return sum(self.distancia_ruta(paradas) for _, paradas in plan)
+
+    def penalizacion(self) -> np.ndarray:
+        """Costo de dejar cada parada sin asignar (urgentes pesan el doble)"""
+        return (
+            PENALIZACION_NO_ASIGNADA_KM *
+            (1 + self.prioridad) *
+            np.where(self.urgente, 2.0, 1.0)
+        )
+
+    def costo(self, rutas: Iterable[Sequence[int]]) -> float:
+        """
+        Función objetivo común a todos los algoritmos:
+        km recorridos + penalización por entregas sin asignar
+        """
+        penalizacion = self.penalizacion()
+        pendiente = float(penalizacion[1:].sum())
+        km = 0.0
+        for paradas in rutas:
+            if paradas:
+                km += self.distancia_ruta(paradas)
+                pendiente -= float(penalizacion[list(paradas)].sum())
+        return km + pendiente
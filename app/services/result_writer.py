@@ -0,0 +1,139 @@
+# app/services/result_writer.py
+"""
+Escritura de Resultados de Optimización
+Persiste las rutas nuevas y la asignación de sus entregas con sentencias
+en bloque dentro de una sola transacción: o se guarda todo el día o nada.
+Solo se toman entregas que sigan PENDIENTE: si otra optimización (de otra
+fecha, con entregas facturadas antes en común) ya asignó alguna, se
+revierte todo.
+"""
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session, joinedload
+from app.models import Ruta, Entrega, EstadoEntrega, EstadoRuta
+from app.services.problem_snapshot import ParadaSnapshot, VehiculoSnapshot
+from datetime import date, datetime
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Máximo de ids por sentencia al tomar las entregas
+IDS_POR_SENTENCIA = 5000
+
+
+class EntregasYaAsignadas(Exception):
+    """Otra optimización asignó entregas del plan mientras se calculaba"""
+
+    def __init__(self, cantidad: int):
+        super().__init__(
+            f"{cantidad} entregas del plan ya no están pendientes "
+            f"(las asignó otra optimización); vuelve a optimizar"
+        )
+        self.cantidad = cantidad
+
+
+class RutaPlanificada:
+    """Ruta calculada sobre el snapshot, aún no guardada"""
+
+    __slots__ = ("vehiculo", "paradas", "metricas")
+
+    def __init__(
+        self,
+        vehiculo: VehiculoSnapshot,
+        paradas: List[ParadaSnapshot],
+        metricas: Dict
+    ):
+        self.vehiculo = vehiculo
+        self.paradas = paradas  # En orden de visita
+        self.metricas = metricas  # Valores de las columnas de Ruta
+
+
+class EscritorResultados:
+    """Guarda un plan completo en una transacción (rollback ante cualquier error)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def guardar(self, fecha: date, rutas: List[RutaPlanificada]) -> List[Ruta]:
+        """
+        Un INSERT en bloque de rutas y un UPDATE en bloque de entregas
+
+        Returns:
+            Rutas guardadas (con camión y chofer cargados)
+        Raises: EntregasYaAsignadas si alguna entrega dejó de estar PENDIENTE
+        """
+        if not rutas:
+            return []
+
+        try:
+            ids = self._insertar_rutas(fecha, rutas)
+            self._asignar_entregas(ids, rutas)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            logger.exception(f"❌ Error guardando rutas del {fecha}, se revirtió la transacción")
+            raise
+
+        logger.info(
+            f"💾 {len(ids)} rutas y {sum(len(r.paradas) for r in rutas)} entregas guardadas"
+        )
+        return self.db.query(Ruta).options(
+            joinedload(Ruta.camion), joinedload(Ruta.chofer)
+        ).filter(Ruta.id.in_(ids)).order_by(Ruta.id).all()
+
+    def _insertar_rutas(self, fecha: date, rutas: List[RutaPlanificada]) -> List[int]:
+        filas = [
+            {
+                "fecha": fecha,
+                "codigo": f"RUT-{fecha.strftime('%Y%m%d')}-{ruta.vehiculo.id:03d}" + (
+                    f"-{ruta.vehiculo.viaje}" if ruta.vehiculo.viaje > 1 else ""
+                ),
+                "camion_id": ruta.vehiculo.id,
+                "chofer_id": ruta.vehiculo.chofer_id,
+                "estado": EstadoRuta.PLANIFICADA,
+                **ruta.metricas
+            }
+            for ruta in rutas
+        ]
+        # Los ids se asocian por código (único): así el INSERT va en lotes
+        # también en motores que no garantizan el orden de RETURNING
+        ids = {
+            codigo: id for id, codigo in
+            self.db.execute(insert(Ruta).returning(Ruta.id, Ruta.codigo), filas)
+        }
+        return [ids[fila["codigo"]] for fila in filas]
+
+    def _asignar_entregas(self, ids: List[int], rutas: List[RutaPlanificada]):
+        asignaciones = [
+            {
+                "id": parada.entrega_id,
+                "ruta_id": ruta_id,
+                "orden_en_ruta": orden
+            }
+            for ruta_id, ruta in zip(ids, rutas)
+            for orden, parada in enumerate(ruta.paradas, 1)
+        ]
+        if asignaciones:
+            self._tomar_pendientes([a["id"] for a in asignaciones])
+            self.db.execute(update(Entrega), asignaciones)
+
+    def _tomar_pendientes(self, entrega_ids: List[int]):
+        """
+        Pasa a ASIGNADO solo las entregas que siguen PENDIENTE; si alguna
+        ya no lo está, la transacción no debe confirmarse
+        """
+        ahora = datetime.now()
+        tomadas = 0
+        for inicio in range(0, len(entrega_ids), IDS_POR_SENTENCIA):
+            tomadas += self.db.execute(
+                update(Entrega)
+                .where(
+                    Entrega.id.in_(entrega_ids[inicio:inicio + IDS_POR_SENTENCIA]),
+                    Entrega.estado == EstadoEntrega.PENDIENTE
+                )
+                .values(estado=EstadoEntrega.ASIGNADO, fecha_asignacion=ahora)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        if tomadas != len(entrega_ids):
+            raise EntregasYaAsignadas(len(entrega_ids) - tomadas)
@@ -0,0 +1,370 @@
+# app/services/road_network.py
+"""
+Red Vial Local
+Motor de distancias sobre un grafo de calles fuera de línea (extracto de
+OpenStreetMap convertido a un .npz compacto). El grafo se preprocesa con
+jerarquías de contracción (CH): cada consulta solo sube por la jerarquía
+desde el origen y desde el destino, y la matriz muchos-a-muchos del día
+se arma con "buckets" sin correr un Dijkstra completo por par.
+Implementa la misma interfaz que MotorHaversine: calcular(origenes, destinos).
+"""
+
+from app.config import settings
+from app.services.distance_matrix import (
+    MotorHaversine, haversine_km, haversine_pares_km, FACTOR_CORRECCION,
+    VELOCIDAD_REFERENCIA_KMH
+)
+from app.services.spatial_index import IndiceEspacial
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import heapq
+import math
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Velocidad del tramo entre el cliente y el nodo de calle más cercano
+VELOCIDAD_ACCESO_KMH = 15.0
+
+# Nodos asentados como máximo en cada búsqueda de testigos al contraer
+LIMITE_TESTIGOS = 60
+
+# Arreglos que componen el archivo de la red
+CAMPOS_RED = (
+    "lat", "lng", "rango",
+    "subida_ptr", "subida_nodo", "subida_min", "subida_km",
+    "bajada_ptr", "bajada_nodo", "bajada_min", "bajada_km",
+)
+
+Arista = Tuple[float, float]  # (minutos, km)
+
+
+# ========== PREPROCESAMIENTO ==========
+
+def _testigos(
+    salida: List[Dict[int, Arista]],
+    inicio: int,
+    excluido: int,
+    limite: float,
+    objetivos: set
+) -> Dict[int, float]:
+    """Dijkstra acotado desde inicio sin pasar por el nodo que se contrae"""
+    distancia = {inicio: 0.0}
+    heap = [(0.0, inicio)]
+    asentados = 0
+    pendientes = set(objetivos)
+
+    while heap and pendientes and asentados < LIMITE_TESTIGOS:
+        d, u = heapq.heappop(heap)
+        if d > distancia.get(u, math.inf) or d > limite:
+            continue
+        asentados += 1
+        pendientes.discard(u)
+        for w, (minutos, _) in salida[u].items():
+            if w == excluido:
+                continue
+            nueva = d + minutos
+            if nueva < distancia.get(w, math.inf):
+                distancia[w] = nueva
+                heapq.heappush(heap, (nueva, w))
+    return distancia
+
+
+def _atajos(
+    salida: List[Dict[int, Arista]],
+    entrada: List[Dict[int, Arista]],
+    v: int
+) -> List[Tuple[int, int, float, float]]:
+    """Atajos (u, w, minutos, km) necesarios para conservar distancias sin v"""
+    atajos = []
+    for u, (min_uv, km_uv) in entrada[v].items():
+        objetivos = {
+            w: (min_uv + min_vw, km_uv + km_vw)
+            for w, (min_vw, km_vw) in salida[v].items() if w != u
+        }
+        if not objetivos:
+            continue
+        limite = max(minutos for minutos, _ in objetivos.values())
+        distancia = _testigos(salida, u, v, limite, set(objetivos))
+        for w, (minutos, km) in objetivos.items():
+            if distancia.get(w, math.inf) > minutos:
+                atajos.append((u, w, minutos, km))
+    return atajos
+
+
+def contraer(
+    n: int,
+    origen: Sequence[int],
+    destino: Sequence[int],
+    minutos: Sequence[float],
+    km: Sequence[float]
+) -> Dict[str, np.ndarray]:
+    """
+    Jerarquía de contracción de un grafo dirigido (peso = minutos)
+    Orden de contracción por diferencia de aristas con actualización perezosa
+
+    Returns: rango por nodo y aristas hacia nodos de mayor rango, en formato
+    CSR: subida (u -> v, por u) y bajada (u -> v guardada en v, por v)
+    """
+    salida: List[Dict[int, Arista]] = [{} for _ in range(n)]
+    entrada: List[Dict[int, Arista]] = [{} for _ in range(n)]
+    for u, v, m, d in zip(origen, destino, minutos, km):
+        u, v = int(u), int(v)
+        if u != v and (v not in salida[u] or m < salida[u][v][0]):
+            salida[u][v] = entrada[v][u] = (float(m), float(d))
+
+    vecinos_contraidos = [0] * n
+
+    def prioridad(v: int) -> int:
+        return (
+            len(_atajos(salida, entrada, v)) - len(entrada[v]) - len(salida[v]) +
+            vecinos_contraidos[v]
+        )
+
+    heap = [(prioridad(v), v) for v in range(n)]
+    heapq.heapify(heap)
+
+    rango = np.zeros(n, dtype=np.int32)
+    subida: List[Tuple[int, int, float, float]] = []
+    bajada: List[Tuple[int, int, float, float]] = []
+    orden = 0
+
+    while heap:
+        _, v = heapq.heappop(heap)
+        # Actualización perezosa: si empeoró, vuelve a la cola
+        actual = prioridad(v)
+        if heap and actual > heap[0][0]:
+            heapq.heappush(heap, (actual, v))
+            continue
+
+        # Las aristas que le quedan llevan a nodos de mayor rango
+        subida.extend((v, w, m, d) for w, (m, d) in salida[v].items())
+        bajada.extend((v, u, m, d) for u, (m, d) in entrada[v].items())
+
+        for u, w, m, d in _atajos(salida, entrada, v):
+            if w not in salida[u] or m < salida[u][w][0]:
+                salida[u][w] = entrada[w][u] = (m, d)
+
+        for u in entrada[v]:
+            del salida[u][v]
+            vecinos_contraidos[u] += 1
+        for w in salida[v]:
+            del entrada[w][v]
+            vecinos_contraidos[w] += 1
+        entrada[v], salida[v] = {}, {}
+
+        rango[v] = orden
+        orden += 1
+
+    resultado = {"rango": rango}
+    for nombre, aristas in (("subida", subida), ("bajada", bajada)):
+        aristas.sort(key=lambda a: a[0])
+        columnas = list(zip(*aristas)) or [(), (), (), ()]
+        por_nodo = np.bincount(np.asarray(columnas[0], dtype=np.int64), minlength=n)
+        resultado[f"{nombre}_ptr"] = np.concatenate(([0], np.cumsum(por_nodo))).astype(np.int64)
+        resultado[f"{nombre}_nodo"] = np.asarray(columnas[1], dtype=np.int32)
+        resultado[f"{nombre}_min"] = np.asarray(columnas[2], dtype=np.float32)
+        resultado[f"{nombre}_km"] = np.asarray(columnas[3], dtype=np.float32)
+    return resultado
+
+
+# ========== CONSULTAS ==========
+
+class RedVial:
+    """Grafo de calles preprocesado con CH"""
+
+    def __init__(self, **arreglos: np.ndarray):
+        faltan = [campo for campo in CAMPOS_RED if campo not in arreglos]
+        if faltan:
+            raise ValueError(f"Archivo de red vial incompleto, faltan: {', '.join(faltan)}")
+        self.lat = np.asarray(arreglos["lat"], dtype=np.float64)
+        self.lng = np.asarray(arreglos["lng"], dtype=np.float64)
+        self.rango = arreglos["rango"]
+
+        # Listas de Python: las búsquedas recorren aristas una a una
+        self._subida = tuple(
+            arreglos[f"subida_{c}"].tolist() for c in ("ptr", "nodo", "min", "km")
+        )
+        self._bajada = tuple(
+            arreglos[f"bajada_{c}"].tolist() for c in ("ptr", "nodo", "min", "km")
+        )
+        self._arreglos = {campo: arreglos[campo] for campo in CAMPOS_RED}
+        self._indice = IndiceEspacial(np.column_stack((self.lat, self.lng)))
+
+    @classmethod
+    def construir(
+        cls,
+        lat: Sequence[float],
+        lng: Sequence[float],
+        origen: Sequence[int],
+        destino: Sequence[int],
+        minutos: Sequence[float],
+        km: Sequence[float]
+    ) -> "RedVial":
+        """Preprocesa un grafo dirigido de calles (puede tardar minutos)"""
+        ch = contraer(len(lat), origen, destino, minutos, km)
+        return cls(lat=np.asarray(lat), lng=np.asarray(lng), **ch)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> "RedVial":
+        with np.load(ruta) as datos:
+            return cls(**{campo: datos[campo] for campo in datos.files})
+
+    def guardar(self, ruta: str):
+        np.savez_compressed(ruta, **self._arreglos)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def ajustar(self, coordenadas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nodo de calle más cercano a cada coordenada
+        Returns: (nodos, km de acceso en línea recta)
+        """
+        coordenadas = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+        nodos = np.array(
+            [self._indice.k_cercanos(lat, lng, 1)[0] for lat, lng in coordenadas],
+            dtype=np.intp
+        )
+        return nodos, haversine_pares_km(
+            coordenadas, np.column_stack((self.lat[nodos], self.lng[nodos]))
+        )
+
+    def _subir(self, inicio: int, aristas: tuple) -> Tuple[List[int], List[float], List[float]]:
+        """Dijkstra sobre las aristas hacia mayor rango: (nodos, minutos, km) asentados"""
+        ptr, nodo, pmin, pkm = aristas
+        distancia = {inicio: 0.0}
+        km = {inicio: 0.0}
+        heap = [(0.0, inicio)]
+        nodos, minutos, kms = [], [], []
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > distancia[u]:
+                continue
+            nodos.append(u)
+            minutos.append(d)
+            kms.append(km[u])
+            for e in range(ptr[u], ptr[u + 1]):
+                w = nodo[e]
+                nueva = d + pmin[e]
+                if nueva < distancia.get(w, math.inf):
+                    distancia[w] = nueva
+                    km[w] = km[u] + pkm[e]
+                    heapq.heappush(heap, (nueva, w))
+        return nodos, minutos, kms
+
+    def muchos_a_muchos(
+        self,
+        origenes: Sequence[int],
+        destinos: Sequence[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Minutos y km por la red entre nodos (inf si no hay camino)
+        Cada destino deja en los nodos que alcanza subiendo hacia atrás un
+        bucket (destino, distancia); cada origen sube hacia adelante y
+        combina sus distancias con los buckets que encuentra
+        """
+        unicos_d, pos_d = np.unique(np.asarray(destinos, dtype=np.intp), return_inverse=True)
+        unicos_o, pos_o = np.unique(np.asarray(origenes, dtype=np.intp), return_inverse=True)
+
+        buckets: Dict[int, Tuple[list, list, list]] = {}
+        for j, t in enumerate(unicos_d.tolist()):
+            for x, m, d in zip(*self._subir(t, self._bajada)):
+                bucket = buckets.setdefault(x, ([], [], []))
+                bucket[0].append(j)
+                bucket[1].append(m)
+                bucket[2].append(d)
+        arreglos = {
+            x: (np.array(js, dtype=np.intp), np.array(ms), np.array(ds))
+            for x, (js, ms, ds) in buckets.items()
+        }
+
+        minutos = np.full((len(unicos_o), len(unicos_d)), np.inf)
+        km = np.full((len(unicos_o), len(unicos_d)), np.inf)
+        for i, s in enumerate(unicos_o.tolist()):
+            fila_min, fila_km = minutos[i], km[i]
+            for x, m, d in zip(*self._subir(s, self._subida)):
+                bucket = arreglos.get(x)
+                if bucket is None:
+                    continue
+                js, ms, ds = bucket
+                candidato = m + ms
+                mejor = candidato < fila_min[js]
+                if mejor.any():
+                    fila_min[js[mejor]] = candidato[mejor]
+                    fila_km[js[mejor]] = d + ds[mejor]
+
+        seleccion = np.ix_(pos_o, pos_d)
+        return minutos[seleccion], km[seleccion]
+
+
+class MotorRedVial:
+    """
+    Motor de distancias por la red vial
+    Suma el acceso en línea recta desde cada punto a su nodo; los pares sin
+    camino en la red caen a Haversine con factor de corrección
+    """
+
+    nombre = "red_vial"
+
+    def __init__(self, red: RedVial):
+        self.red = red
+
+    def calcular(
+        self,
+        origenes: np.ndarray,
+        destinos: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns: (km, minutos), ambas matrices (n x m)"""
+        inicio = time.perf_counter()
+        origenes = np.asarray(origenes, dtype=np.float64).reshape(-1, 2)
+        destinos = np.asarray(destinos, dtype=np.float64).reshape(-1, 2)
+
+        nodos_o, acceso_o = self.red.ajustar(origenes)
+        nodos_d, acceso_d = self.red.ajustar(destinos)
+        minutos, km = self.red.muchos_a_muchos(nodos_o, nodos_d)
+
+        acceso = acceso_o[:, None] + acceso_d[None, :]
+        km = km + acceso
+        minutos = minutos + acceso * (60.0 / VELOCIDAD_ACCESO_KMH)
+
+        lineal = haversine_km(origenes, destinos)
+        sin_camino = ~np.isfinite(km)
+        if sin_camino.any():
+            km[sin_camino] = lineal[sin_camino] * FACTOR_CORRECCION
+            minutos[sin_camino] = km[sin_camino] * (60.0 / VELOCIDAD_REFERENCIA_KMH)
+            logger.warning(f"🛣️ {int(sin_camino.sum())} pares sin camino en la red vial")
+
+        # Mismo punto: distancia cero
+        iguales = lineal == 0
+        km[iguales] = 0.0
+        minutos[iguales] = 0.0
+
+        logger.info(
+            f"🛣️ Red vial: {len(origenes)}x{len(destinos)} en "
+            f"{time.perf_counter() - inicio:.2f}s"
+        )
+        return km.astype(np.float32), minutos.astype(np.float32)
+
+
+@lru_cache(maxsize=4)
+def cargar_red(ruta: str) -> RedVial:
+    """Red vial cargada una sola vez por proceso"""
+    inicio = time.perf_counter()
+    red = RedVial.cargar(ruta)
+    logger.info(f"🛣️ Red vial {ruta}: {len(red)} nodos ({time.perf_counter() - inicio:.1f}s)")
+    return red
+
+
+def motor_por_defecto():
+    """Red vial si RED_VIAL_ARCHIVO apunta a un archivo; si no, Haversine"""
+    ruta = settings.RED_VIAL_ARCHIVO
+    if ruta and os.path.exists(ruta):
+        return MotorRedVial(cargar_red(ruta))
+    if ruta:
+        logger.warning(f"Red vial {ruta} no encontrada, se usa Haversine")
+    return MotorHaversine()
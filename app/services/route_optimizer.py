@@ -4,18 +4,43 @@ Motor de Optimización de Rutas
 Considera: capacidad, distancia, prioridad, costos, restricciones
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session, joinedload
 from app.models import (
     Ruta, Entrega, Camion, Cliente, Zona, ParametrosOptimizacion,
     EstadoEntrega, EstadoRuta, AlgoritmoOptimizacion, MatrizDistancia
 )
+from app.services.distance_matrix import MatrizDistancias, INDICE_ALMACEN, haversine_pares_km
+from app.services.distance_cache import ProveedorDistancias
+from app.services.matrix_store import abrir_matriz
+from app.services.compatibility import requisitos_zona, aptitudes_camion
+from app.services.anytime import Convergencia
+from app.services.problem_snapshot import (
+    Plan, Problema, ParadaSnapshot, VehiculoSnapshot,
+    minutos_del_dia, hora_del_dia, MINUTOS_DIA
+)
+from app.services.savings import resolver_savings
+from app.services.greedy import resolver_greedy
+from app.services.genetic import resolver_genetico
+from app.services.sequencing import secuenciar_por_zona
+from app.services.local_search import BusquedaLocal
+from app.services.time_windows import HorarioRuta, insertar_mas_barato, reparar_plan
+from app.services.multi_trip import franjas_viajes, vehiculos_por_viaje, encadenar_viajes
+from app.services.travel_time import ModeloTiempos
+from app.services.result_writer import EscritorResultados, RutaPlanificada
+from app.config import settings
 from datetime import date, datetime, time, timedelta
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
+import numpy as np
 import math
+import time as reloj
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rutas más cercanas en las que se prueba insertar una entrega nueva
+MAX_RUTAS_CANDIDATAS = 8
+
 
 class RouteOptimizer:
     """Motor de optimización de rutas"""
@@ -24,9 +49,68 @@ class RouteOptimizer:
     ALMACEN_LAT = -3.7437
     ALMACEN_LNG = -73.2516
     
-    def __init__(self, db: Session):
+    ALGORITMOS_DISPONIBLES = (
+        AlgoritmoOptimizacion.GREEDY,
+        AlgoritmoOptimizacion.SAVINGS,
+        AlgoritmoOptimizacion.GENETIC,
+    )
+    
+    def __init__(
+        self, 
+        db: Session, 
+        al_avanzar: Optional[Callable[[str, int], None]] = None,
+        lluvia: Optional[bool] = None,
+        convergencia: Optional[Convergencia] = None
+    ):
         self.db = db
         self.params = self._get_parametros()
+        self.matriz: Optional[MatrizDistancias] = None
+        self.busqueda_local = BusquedaLocal()
+        zonas = self.db.query(Zona).all()
+        # Tiempos de viaje por zona y franja horaria (una tabla por corrida)
+        self.modelo_tiempos = ModeloTiempos.desde_zonas(zonas)
+        # Requisitos de acceso por zona (4x4, lluvia, caminos difíciles)
+        lluvia = settings.ALERTA_LLUVIA if lluvia is None else lluvia
+        self.requisitos_zona = {z.id: requisitos_zona(z, lluvia) for z in zonas}
+        # Inicio de la jornada en minutos desde medianoche
+        self.hora_inicio = minutos_del_dia(time.fromisoformat(settings.HORA_INICIO_RUTAS), 0)
+        # Notificación de progreso: (fase, porcentaje)
+        self.al_avanzar = al_avanzar
+        # Modo anytime: mejoras publicadas, presupuesto y corte anticipado
+        self.convergencia = convergencia or Convergencia()
+        # Procesos del genético (None: todos los núcleos)
+        self.procesos_genetico = settings.GENETICO_PROCESOS or None
+    
+    @classmethod
+    def para_simulacion(
+        cls,
+        params: ParametrosOptimizacion,
+        matriz: MatrizDistancias,
+        modelo_tiempos: ModeloTiempos,
+        hora_inicio: float,
+        convergencia: Optional[Convergencia] = None
+    ) -> "RouteOptimizer":
+        """
+        Optimizador sin base de datos sobre un snapshot ya cargado
+        (procesos de comparación de parámetros); solo planifica
+        """
+        optimizer = cls.__new__(cls)
+        optimizer.db = None
+        optimizer.params = params
+        optimizer.matriz = matriz
+        optimizer.busqueda_local = BusquedaLocal()
+        optimizer.modelo_tiempos = modelo_tiempos
+        optimizer.requisitos_zona = {}
+        optimizer.hora_inicio = hora_inicio
+        optimizer.al_avanzar = None
+        optimizer.convergencia = convergencia or Convergencia()
+        # Cada variante corre en su propio proceso: el genético no abre otro pool
+        optimizer.procesos_genetico = 1
+        return optimizer
+    
+    def _avanzar(self, fase: str, progreso: int):
+        if self.al_avanzar:
+            self.al_avanzar(fase, progreso)
     
     def _get_parametros(self) -> ParametrosOptimizacion:
         """Obtiene parámetros de optimización activos"""
@@ -52,52 +136,206 @@ class RouteOptimizer:
         Returns:
             Lista de rutas optimizadas
         """
+        resultado = self.planificar_dia(fecha)
+        if not resultado:
+            return []
+        
+        # 5. Guardar todo el día en una sola transacción
+        self._avanzar("guardando", 95)
+        rutas = EscritorResultados(self.db).guardar(fecha, resultado)
+        
+        logger.info(f"✅ {len(rutas)} rutas optimizadas generadas")
+        
+        return rutas
+    
+    def planificar_dia(self, fecha: date) -> List[RutaPlanificada]:
+        """
+        Calcula las rutas del día sin guardar nada (simulación / what-if):
+        no crea Ruta ni modifica Entrega
+        
+        Returns:
+            Rutas planificadas con sus métricas
+        """
         logger.info(f"🔄 Iniciando optimización para {fecha}")
         
-        # 1. Obtener entregas pendientes
-        entregas = self._get_entregas_pendientes(fecha)
-        if not entregas:
+        # 1. Snapshot de entregas pendientes (una sola consulta, sin ORM)
+        self._avanzar("cargando entregas", 5)
+        paradas = self._cargar_paradas_dia(fecha)
+        if not paradas:
             logger.warning("No hay entregas pendientes")
             return []
         
-        logger.info(f"📦 {len(entregas)} entregas a asignar")
+        logger.info(f"📦 {len(paradas)} entregas a asignar")
         
-        # 2. Obtener camiones disponibles
+        # 2. Obtener camiones disponibles (un vehículo por viaje posible)
         camiones = self._get_camiones_disponibles()
         if not camiones:
             logger.error("No hay camiones disponibles")
             return []
+        vehiculos = self._flota(camiones)
         
-        logger.info(f"🚚 {len(camiones)} camiones disponibles")
+        logger.info(f"🚚 {len(camiones)} camiones disponibles, {len(vehiculos)} viajes posibles")
         
-        # 3. Agrupar entregas por zona
-        entregas_por_zona = self._agrupar_por_zona(entregas)
+        # Matriz de distancias del día (almacén + todas las paradas)
+        self._avanzar("matriz de distancias", 15)
+        self.matriz = self._construir_matriz(paradas)
         
-        # 4. Aplicar algoritmo de asignación
-        rutas = self._asignar_algoritmo_greedy(
-            entregas_por_zona, 
-            camiones, 
-            fecha
+        return self._planificar(paradas, vehiculos)
+    
+    def _cargar_paradas_dia(self, fecha: date) -> List[ParadaSnapshot]:
+        """Entregas pendientes facturadas hasta la fecha"""
+        return self._cargar_paradas(
+            Entrega.estado == EstadoEntrega.PENDIENTE,
+            Entrega.fecha_factura <= fecha
         )
+    
+    def _planificar(
+        self, 
+        paradas: List[ParadaSnapshot], 
+        vehiculos: List[VehiculoSnapshot]
+    ) -> List[RutaPlanificada]:
+        """Algoritmo, búsqueda local y métricas sobre la matriz actual"""
+        # 3. Aplicar algoritmo de asignación
+        algoritmo = self.params.algoritmo_preferido or AlgoritmoOptimizacion.GREEDY
+        if algoritmo not in self.ALGORITMOS_DISPONIBLES:
+            logger.warning(f"Algoritmo {algoritmo.value} no disponible, usando greedy")
+            algoritmo = AlgoritmoOptimizacion.GREEDY
+        
+        self._avanzar(f"algoritmo {algoritmo.value}", 30)
+        inicio = reloj.perf_counter()
+        problema = self._problema(paradas, vehiculos)
+        plan, iteraciones = self._resolver(algoritmo, problema)
+        
+        # Greedy asigna por prioridad: la secuencia se arma antes de mejorar.
+        # Savings arma las rutas con el horario de los primeros viajes, así
+        # que todo plan se ajusta a las ventanas del viaje que le tocó
+        if algoritmo == AlgoritmoOptimizacion.GREEDY:
+            plan = self._secuenciar_plan(problema, plan)
+        plan = reparar_plan(problema, plan)
+        self.convergencia.reportar(algoritmo.value, problema, [p for _, p in plan], iteraciones)
+        self._avanzar("búsqueda local", 70)
+        plan = self.busqueda_local.mejorar_plan(problema, plan, self.convergencia)
+        plan = [
+            (v, self.busqueda_local.mejorar_ruta(problema, v, secuencia))
+            for v, secuencia in plan
+        ]
+        plan = encadenar_viajes(
+            problema, plan,
+            self.params.tiempo_retorno_almacen_min or 0,
+            self.params.max_horas_ruta * 60
+        )
+        self.convergencia.reportar("secuencia", problema, [p for _, p in plan], iteraciones)
+        self.convergencia.publicar()
+        if self.convergencia.detenida:
+            logger.info("✋ Se aceptó la mejor solución antes de agotar la búsqueda")
+        
+        tiempo_calculo_ms = int((reloj.perf_counter() - inicio) * 1000)
+        logger.info(f"🧮 {algoritmo.value}: {iteraciones} iteraciones en {tiempo_calculo_ms} ms")
+        
+        # 4. Calcular métricas y costos sobre el snapshot
+        self._avanzar("métricas", 85)
+        resultado = []
+        for v, secuencia in plan:
+            if not secuencia:
+                continue
+            paradas_ruta = [paradas[i - 1] for i in secuencia]
+            metricas = self._metricas_ruta(problema, v, paradas_ruta, secuencia)
+            metricas.update(
+                algoritmo_usado=algoritmo,
+                iteraciones_optimizacion=iteraciones,
+                tiempo_calculo_ms=tiempo_calculo_ms
+            )
+            resultado.append(RutaPlanificada(vehiculos[v], paradas_ruta, metricas))
         
-        # 5. Calcular métricas y costos
-        for ruta in rutas:
-            self._calcular_metricas_ruta(ruta)
-        
-        logger.info(f"✅ {len(rutas)} rutas optimizadas generadas")
+        return resultado
+    
+    def _resolver(
+        self, 
+        algoritmo: AlgoritmoOptimizacion, 
+        problema: Problema
+    ) -> Tuple[Plan, int]:
+        """Ejecuta el algoritmo elegido sobre el snapshot del problema"""
+        if algoritmo == AlgoritmoOptimizacion.SAVINGS:
+            return resolver_savings(problema)
+        
+        plan, iteraciones = resolver_greedy(problema)
+        
+        if algoritmo == AlgoritmoOptimizacion.GENETIC:
+            # Semilla: greedy ya secuenciado y dentro de horario
+            return resolver_genetico(
+                problema,
+                reparar_plan(problema, self._secuenciar_plan(problema, plan)),
+                max_iteraciones=self.params.max_iteraciones or 1000,
+                presupuesto_segundos=min(
+                    settings.GENETICO_TIEMPO_MAX_SEGUNDOS, self.convergencia.restante()
+                ),
+                trabajadores=self.procesos_genetico,
+                convergencia=self.convergencia
+            )
         
-        return rutas
+        return plan, iteraciones
     
-    def _get_entregas_pendientes(self, fecha: date) -> List[Entrega]:
-        """Obtiene entregas pendientes o para una fecha específica"""
-        return self.db.query(Entrega).filter(
-            Entrega.estado == EstadoEntrega.PENDIENTE,
-            Entrega.fecha_factura <= fecha
+    def _secuenciar_plan(self, problema: Problema, plan: Plan) -> Plan:
+        """Ordena las paradas de cada ruta por zona y proximidad"""
+        return [
+            (v, secuenciar_por_zona(
+                problema.km, paradas, problema.zona[paradas], problema.coordenadas
+            ))
+            for v, paradas in plan
+        ]
+    
+    def _cargar_paradas(self, *filtros, orden=Entrega.id) -> List[ParadaSnapshot]:
+        """
+        Snapshot de las entregas que cumplen los filtros junto con su cliente,
+        en una sola consulta por columnas (sin cargar objetos del ORM)
+        """
+        filas = self.db.query(
+            Entrega.id,
+            Entrega.cliente_id,
+            func.coalesce(Entrega.zona_id, Cliente.zona_id).label("zona_id"),
+            Cliente.lat,
+            Cliente.lng,
+            Entrega.peso_total_kg,
+            Entrega.volumen_total_m3,
+            Entrega.requiere_refrigeracion,
+            Entrega.prioridad,
+            Entrega.es_urgente,
+            func.coalesce(
+                Entrega.tiempo_estimado_entrega_min, Cliente.tiempo_descarga_estimado_min
+            ).label("servicio"),
+            func.coalesce(Entrega.horario_entrega_desde, Cliente.horario_atencion_inicio).label("desde"),
+            func.coalesce(Entrega.horario_entrega_hasta, Cliente.horario_atencion_fin).label("hasta"),
+            Entrega.monto_total
+        ).join(Cliente, Entrega.cliente_id == Cliente.id).filter(*filtros).order_by(
+            orden, Entrega.id
         ).all()
+        
+        return [
+            ParadaSnapshot(
+                entrega_id=f.id,
+                cliente_id=f.cliente_id,
+                zona_id=f.zona_id,
+                lat=f.lat,
+                lng=f.lng,
+                peso=f.peso_total_kg or 0.0,
+                volumen=f.volumen_total_m3 or 0.0,
+                refrigeracion=bool(f.requiere_refrigeracion),
+                prioridad=f.prioridad or 0,
+                urgente=bool(f.es_urgente),
+                servicio_min=f.servicio or 0,
+                ventana_inicio=minutos_del_dia(f.desde, 0),
+                ventana_fin=minutos_del_dia(f.hasta, MINUTOS_DIA),
+                monto=f.monto_total or 0.0,
+                requisitos=self.requisitos_zona.get(f.zona_id, 0)
+            )
+            for f in filas
+        ]
     
     def _get_camiones_disponibles(self) -> List[Camion]:
         """Obtiene camiones activos y disponibles"""
-        camiones = self.db.query(Camion).filter(
+        camiones = self.db.query(Camion).options(
+            joinedload(Camion.chofer_asignado)
+        ).filter(
             Camion.activo == True
         ).all()
         
@@ -113,100 +351,147 @@ class RouteOptimizer:
         print(f"DEBUG: Camiones disponibles después de filtros: {len(disponibles)}")
         return disponibles
     
-    def _agrupar_por_zona(self, entregas: List[Entrega]) -> Dict[int, List[Entrega]]:
-        """Agrupa entregas por zona"""
-        grupos = {}
-        for entrega in entregas:
-            zona_id = entrega.zona_id or entrega.cliente.zona_id
-            if zona_id not in grupos:
-                grupos[zona_id] = []
-            grupos[zona_id].append(entrega)
-        return grupos
-    
-    def _asignar_algoritmo_greedy(
+    def _vehiculo(
         self, 
-        entregas_por_zona: Dict[int, List[Entrega]], 
-        camiones: List[Camion],
-        fecha: date
-    ) -> List[Ruta]:
+        camion: Camion, 
+        params: Optional[ParametrosOptimizacion] = None
+    ) -> VehiculoSnapshot:
         """
-        Algoritmo Greedy:
-        1. Ordena entregas por prioridad
-        2. Asigna a camión con más capacidad disponible
-        3. Agrupa por zona para minimizar distancia
+        Snapshot de un camión con los márgenes de seguridad aplicados
+        (de params si se indican, si no de los parámetros activos)
         """
-        rutas = []
-        entregas_asignadas = set()
-        
-        # Crear una ruta por camión
+        params = params or self.params
+        return VehiculoSnapshot(
+            id=camion.id,
+            peso_max=camion.capacidad_peso_kg * params.margen_seguridad_peso,
+            volumen_max=(camion.capacidad_volumen_m3 or 0) * params.margen_seguridad_volumen,
+            refrigerado=bool(camion.tiene_refrigeracion),
+            velocidad_kmh=camion.velocidad_promedio_kmh,
+            chofer_id=camion.chofer_id,
+            capacidad_peso_kg=camion.capacidad_peso_kg,
+            consumo_km=(
+                camion.consumo_combustible_km_vacio +
+                camion.consumo_combustible_km_cargado
+            ) / 2,
+            salida_min=self.hora_inicio + params.tiempo_carga_inicial_min,
+            regreso_max_min=self.hora_inicio + params.max_horas_ruta * 60,
+            aptitudes=aptitudes_camion(camion),
+            carga_min=params.tiempo_carga_inicial_min
+        )
+    
+    def _turno(
+        self, 
+        camion: Camion, 
+        params: Optional[ParametrosOptimizacion] = None
+    ) -> Tuple[float, float]:
+        """
+        (inicio, fin) del turno del chofer en minutos desde medianoche
+        Sin horario cargado: desde la hora de inicio de rutas, una ruta de max_horas_ruta
+        """
+        params = params or self.params
+        chofer = camion.chofer_asignado
+        inicio = minutos_del_dia(chofer.horario_inicio if chofer else None, self.hora_inicio)
+        fin = minutos_del_dia(
+            chofer.horario_fin if chofer else None, inicio + params.max_horas_ruta * 60
+        )
+        return inicio, fin
+    
+    def _flota(
+        self, 
+        camiones: List[Camion], 
+        params: Optional[ParametrosOptimizacion] = None
+    ) -> List[VehiculoSnapshot]:
+        """
+        Un vehículo por cada viaje que cabe en el turno de cada camión;
+        primero los primeros viajes de toda la flota, luego los segundos, etc.
+        """
+        params = params or self.params
+        viajes = []
         for camion in camiones:
-            ruta = Ruta(
-                fecha=fecha,
-                codigo=f"RUT-{fecha.strftime('%Y%m%d')}-{camion.id:03d}",
-                camion_id=camion.id,
-                chofer_id=camion.chofer_id,
-                algoritmo_usado=AlgoritmoOptimizacion.GREEDY,
-                estado=EstadoRuta.PLANIFICADA
-            )
-            
-            # Variables de control de capacidad
-            peso_actual = 0.0
-            volumen_actual = 0.0
-            entregas_en_ruta = []
-            
-            # Para cada zona, intentar asignar entregas
-            for zona_id, entregas_zona in entregas_por_zona.items():
-                # Ordenar por prioridad (descendente)
-                entregas_ordenadas = sorted(
-                    [e for e in entregas_zona if e.id not in entregas_asignadas],
-                    key=lambda x: (x.prioridad, x.es_urgente),
-                    reverse=True
+            inicio, fin = self._turno(camion, params)
+            viajes.extend(vehiculos_por_viaje(
+                self._vehiculo(camion, params),
+                franjas_viajes(
+                    inicio, fin,
+                    params.tiempo_carga_inicial_min,
+                    params.tiempo_retorno_almacen_min or 0,
+                    params.max_horas_ruta * 60,
+                    settings.VIAJES_MAX_POR_CAMION,
+                    settings.VIAJE_MIN_MINUTOS
                 )
-                
-                for entrega in entregas_ordenadas:
-                    # Validar capacidad
-                    if not self._validar_capacidad(
-                        camion, 
-                        peso_actual + entrega.peso_total_kg,
-                        volumen_actual + (entrega.volumen_total_m3 or 0)
-                    ):
-                        continue
-                    
-                    # Validar restricciones especiales
-                    if entrega.requiere_refrigeracion and not camion.tiene_refrigeracion:
-                        continue
-                    
-                    # Asignar entrega a ruta
-                    entrega.ruta_id = ruta.id
-                    entrega.estado = EstadoEntrega.ASIGNADO
-                    entrega.fecha_asignacion = datetime.now()
-                    entrega.orden_en_ruta = len(entregas_en_ruta) + 1
-                    
-                    entregas_en_ruta.append(entrega)
-                    entregas_asignadas.add(entrega.id)
-                    
-                    peso_actual += entrega.peso_total_kg
-                    volumen_actual += (entrega.volumen_total_m3 or 0)
-                    
-                    # Validar límite de entregas
-                    if len(entregas_en_ruta) >= self.params.max_entregas_por_ruta:
-                        break
-                
-                if len(entregas_en_ruta) >= self.params.max_entregas_por_ruta:
-                    break
-            
-            # Solo agregar ruta si tiene entregas
-            if entregas_en_ruta:
-                ruta.entregas = entregas_en_ruta
-                ruta.cantidad_entregas = len(entregas_en_ruta)
-                ruta.peso_total_kg = peso_actual
-                ruta.volumen_total_m3 = volumen_actual
-                
-                self.db.add(ruta)
-                rutas.append(ruta)
-        
-        self.db.commit()
-        return rutas
+            ))
+        return sorted(viajes, key=lambda vehiculo: vehiculo.viaje)
+    
+    def _vehiculo_ruta(self, ruta: Ruta) -> VehiculoSnapshot:
+        """
+        Snapshot del viaje de una ruta guardada: sale a su hora planificada
+        (después de cargar) y vuelve antes de que empiece a cargar el viaje
+        siguiente del mismo camión o termine el turno
+        """
+        vehiculo = self._vehiculo(ruta.camion)
+        if ruta.hora_inicio_planificada is None:
+            return vehiculo
+        
+        inicio = minutos_del_dia(ruta.hora_inicio_planificada, self.hora_inicio)
+        otros = [
+            minutos_del_dia(hora, 0)
+            for (hora,) in self.db.query(Ruta.hora_inicio_planificada).filter(
+                Ruta.camion_id == ruta.camion_id,
+                Ruta.fecha == ruta.fecha,
+                Ruta.id != ruta.id,
+                Ruta.hora_inicio_planificada.isnot(None)
+            )
+        ]
+        anteriores = sum(1 for otro in otros if otro < inicio)
+        _, fin_turno = self._turno(ruta.camion)
+        
+        vehiculo.viaje = anteriores + 1
+        vehiculo.carga_min = (
+            (self.params.tiempo_retorno_almacen_min or 0) if anteriores
+            else self.params.tiempo_carga_inicial_min
+        )
+        vehiculo.salida_min = inicio + vehiculo.carga_min
+        vehiculo.regreso_max_min = min(
+            inicio + self.params.max_horas_ruta * 60,
+            min((otro for otro in otros if otro > inicio), default=fin_turno)
+        )
+        return vehiculo
+    
+    def _problema(
+        self, 
+        paradas: List[ParadaSnapshot], 
+        vehiculos: List[VehiculoSnapshot]
+    ) -> Problema:
+        """Snapshot del problema sobre la matriz actual"""
+        return Problema.desde_paradas(
+            self.matriz.km,
+            paradas,
+            vehiculos,
+            self.params.max_entregas_por_ruta,
+            self.matriz.coordenadas,
+            max_km=self.params.max_km_por_ruta or math.inf,
+            trafico=self.modelo_tiempos
+        )
+    
+    def _construir_matriz(self, paradas: List[ParadaSnapshot]) -> MatrizDistancias:
+        """
+        Matriz almacén + paradas: de la precalculada nocturna si existe
+        (solo se calculan clientes nuevos o movidos), si no en una pasada
+        con cache
+        """
+        puntos = [(self.ALMACEN_LAT, self.ALMACEN_LNG)] + [
+            (p.lat, p.lng) for p in paradas
+        ]
+        precalculada = abrir_matriz()
+        if precalculada is not None:
+            km, minutos = precalculada.submatriz(
+                puntos[0], [(p.cliente_id, p.lat, p.lng) for p in paradas]
+            )
+        else:
+            km, minutos = ProveedorDistancias(self.db).matriz(puntos)
+        return MatrizDistancias(
+            km, [p.entrega_id for p in paradas], minutos, np.asarray(puntos, dtype=np.float64)
+        )
     
     def _validar_capacidad(
         self, 
@@ -223,69 +508,43 @@ class RouteOptimizer:
         
         return peso_ok and volumen_ok
     
-    def _calcular_metricas_ruta(self, ruta: Ruta):
-        """Calcula distancia, tiempo y costos de una ruta"""
-        
-        if not ruta.entregas:
-            return
-        
-        # Ordenar entregas por zona y proximidad
-        entregas_ordenadas = self._optimizar_secuencia(ruta.entregas)
-        
-        # Actualizar orden
-        for i, entrega in enumerate(entregas_ordenadas, 1):
-            entrega.orden_en_ruta = i
+    def problema_ruta(self, ruta: Ruta, *filtros) -> Optional[Tuple[Problema, List[ParadaSnapshot]]]:
+        """
+        Problema de una ruta guardada con sus entregas (las que cumplan los
+        filtros) en el orden de visita, índices 1..n, sin volver a optimizar
+        """
+        paradas = self._cargar_paradas(
+            Entrega.ruta_id == ruta.id, *filtros, orden=Entrega.orden_en_ruta
+        )
+        if not paradas:
+            return None
+        self.matriz = self._construir_matriz(paradas)
+        return self._problema(paradas, [self._vehiculo_ruta(ruta)]), paradas
+    
+    def _metricas_ruta(
+        self, 
+        problema: Problema, 
+        v: int, 
+        paradas: List[ParadaSnapshot], 
+        indices: List[int]
+    ) -> Dict:
+        """
+        Distancia, tiempo, costos y score de la ruta ya secuenciada del vehículo v
+        Returns: valores de las columnas de Ruta
+        """
+        vehiculo = problema.vehiculos[v]
+        peso_total = sum(p.peso for p in paradas)
         
-        # Calcular distancia total
-        distancia_total = 0.0
-        tiempo_total = self.params.tiempo_carga_inicial_min
+        # Distancia total: almacén -> entregas -> almacén
+        distancia_total = self.matriz.distancia_recorrido(indices)
         
-        # Desde almacén a primera entrega
-        primera = entregas_ordenadas[0]
-        dist = self._calcular_distancia(
-            self.ALMACEN_LAT, 
-            self.ALMACEN_LNG,
-            primera.cliente.lat,
-            primera.cliente.lng
-        )
-        distancia_total += dist
-        tiempo_total += self._estimar_tiempo(dist, ruta.camion)
-        
-        # Entre entregas
-        for i in range(len(entregas_ordenadas) - 1):
-            actual = entregas_ordenadas[i]
-            siguiente = entregas_ordenadas[i + 1]
-            
-            dist = self._calcular_distancia(
-                actual.cliente.lat,
-                actual.cliente.lng,
-                siguiente.cliente.lat,
-                siguiente.cliente.lng
-            )
-            distancia_total += dist
-            tiempo_total += self._estimar_tiempo(dist, ruta.camion)
-            tiempo_total += actual.tiempo_estimado_entrega_min
-        
-        # Última entrega a almacén
-        ultima = entregas_ordenadas[-1]
-        dist = self._calcular_distancia(
-            ultima.cliente.lat,
-            ultima.cliente.lng,
-            self.ALMACEN_LAT,
-            self.ALMACEN_LNG
-        )
-        distancia_total += dist
-        tiempo_total += self._estimar_tiempo(dist, ruta.camion)
-        tiempo_total += ultima.tiempo_estimado_entrega_min
+        # Tiempo: carga (inicial o recarga) + viaje + esperas por ventana + descarga
+        horario = HorarioRuta(problema, v, indices)
+        inicio = vehiculo.salida_min - vehiculo.carga_min
+        tiempo_total = horario.regreso - inicio
         
         # Calcular costos
-        peso_promedio = ruta.peso_total_kg / 2  # Asumimos descarga gradual
-        consumo_promedio = (
-            ruta.camion.consumo_combustible_km_vacio + 
-            ruta.camion.consumo_combustible_km_cargado
-        ) / 2
-        
-        litros_combustible = distancia_total * consumo_promedio
+        litros_combustible = distancia_total * vehiculo.consumo_km
         costo_combustible = litros_combustible * self.params.costo_combustible_litro
         
         horas_operacion = tiempo_total / 60.0
@@ -293,135 +552,59 @@ class RouteOptimizer:
         
         costo_mantenimiento = distancia_total * self.params.costo_km_mantenimiento
         
-        # Actualizar ruta
-        ruta.distancia_total_km = round(distancia_total, 2)
-        ruta.tiempo_total_estimado_min = int(tiempo_total)
-        ruta.costo_combustible_estimado = round(costo_combustible, 2)
-        ruta.costo_tiempo_estimado = round(costo_tiempo, 2)
-        ruta.costo_total_estimado = round(
-            costo_combustible + costo_tiempo + costo_mantenimiento, 
-            2
-        )
-        
-        # Calcular score de optimización (0-100)
-        ruta.score_optimizacion = self._calcular_score(ruta)
-        
-        # Sumar valores de facturas
-        ruta.valor_total_facturas = sum(
-            e.monto_total for e in ruta.entregas if e.monto_total
-        )
-        
-        self.db.commit()
-    
-    def _optimizar_secuencia(self, entregas: List[Entrega]) -> List[Entrega]:
-        """
-        Optimiza secuencia de entregas usando Nearest Neighbor
-        """
-        if len(entregas) <= 1:
-            return entregas
-        
-        # Agrupar por zona primero
-        por_zona = {}
-        for e in entregas:
-            zona_id = e.zona_id or e.cliente.zona_id
-            if zona_id not in por_zona:
-                por_zona[zona_id] = []
-            por_zona[zona_id].append(e)
-        
-        secuencia_final = []
-        
-        # Para cada zona, aplicar nearest neighbor
-        for zona_id, entregas_zona in por_zona.items():
-            if len(entregas_zona) == 1:
-                secuencia_final.extend(entregas_zona)
-                continue
-            
-            # Nearest Neighbor desde almacén
-            no_visitadas = list(entregas_zona)
-            actual_lat, actual_lng = self.ALMACEN_LAT, self.ALMACEN_LNG
-            
-            while no_visitadas:
-                # Encontrar la más cercana
-                mas_cercana = min(
-                    no_visitadas,
-                    key=lambda e: self._calcular_distancia(
-                        actual_lat, actual_lng,
-                        e.cliente.lat, e.cliente.lng
-                    )
-                )
-                
-                secuencia_final.append(mas_cercana)
-                no_visitadas.remove(mas_cercana)
-                actual_lat = mas_cercana.cliente.lat
-                actual_lng = mas_cercana.cliente.lng
-        
-        return secuencia_final
+        return {
+            "cantidad_entregas": len(paradas),
+            "peso_total_kg": peso_total,
+            "volumen_total_m3": sum(p.volumen for p in paradas),
+            "distancia_total_km": round(distancia_total, 2),
+            "tiempo_total_estimado_min": int(tiempo_total),
+            "hora_inicio_planificada": hora_del_dia(inicio),
+            "hora_fin_estimada": hora_del_dia(horario.regreso),
+            "costo_combustible_estimado": round(costo_combustible, 2),
+            "costo_tiempo_estimado": round(costo_tiempo, 2),
+            "costo_total_estimado": round(
+                costo_combustible + costo_tiempo + costo_mantenimiento, 
+                2
+            ),
+            # Calcular score de optimización (0-100)
+            "score_optimizacion": self._calcular_score(
+                vehiculo, peso_total, indices, distancia_total
+            ),
+            # Sumar valores de facturas
+            "valor_total_facturas": sum(p.monto for p in paradas)
+        }
     
-    def _calcular_distancia(
+    def _calcular_score(
         self, 
-        lat1: float, 
-        lng1: float, 
-        lat2: float, 
-        lng2: float
+        vehiculo: VehiculoSnapshot, 
+        peso_total: float, 
+        indices: List[int], 
+        distancia_total: float
     ) -> float:
-        """
-        Calcula distancia usando fórmula de Haversine
-        Returns: distancia en kilómetros
-        """
-        R = 6371  # Radio de la Tierra en km
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        dlat = math.radians(lat2 - lat1)
-        dlng = math.radians(lng2 - lng1)
-        
-        a = (math.sin(dlat/2) * math.sin(dlat/2) +
-             math.cos(lat1_rad) * math.cos(lat2_rad) *
-             math.sin(dlng/2) * math.sin(dlng/2))
-        
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distancia = R * c
-        
-        # Factor de corrección (calles no son línea recta)
-        return distancia * 1.3
-    
-    def _estimar_tiempo(self, distancia_km: float, camion: Camion) -> float:
-        """
-        Estima tiempo de viaje en minutos
-        """
-        velocidad = camion.velocidad_promedio_kmh
-        tiempo_min = (distancia_km / velocidad) * 60
-        return tiempo_min
-    
-    def _calcular_score(self, ruta: Ruta) -> float:
         """
         Calcula score de optimización (0-100)
         Considera: eficiencia de distancia, uso de capacidad, balance de carga
         """
-        if not ruta.entregas:
+        if not indices:
             return 0.0
         
         # 1. Eficiencia de capacidad (peso)
-        uso_capacidad = (ruta.peso_total_kg / ruta.camion.capacidad_peso_kg) * 100
+        uso_capacidad = (peso_total / vehiculo.capacidad_peso_kg) * 100
         score_capacidad = min(uso_capacidad, 100)  # Max 100
         
         # 2. Eficiencia de distancia (vs distancia lineal)
-        distancia_lineal_total = sum(
-            self._calcular_distancia(
-                self.ALMACEN_LAT, self.ALMACEN_LNG,
-                e.cliente.lat, e.cliente.lng
-            ) * 2  # Ida y vuelta
-            for e in ruta.entregas
+        distancia_lineal_total = float(
+            self.matriz.km[INDICE_ALMACEN, indices].sum(dtype=float) * 2  # Ida y vuelta
         )
         
         if distancia_lineal_total > 0:
-            eficiencia_dist = (distancia_lineal_total / ruta.distancia_total_km) * 100
+            eficiencia_dist = (distancia_lineal_total / round(distancia_total, 2)) * 100
             score_distancia = min(eficiencia_dist, 100)
         else:
             score_distancia = 50
         
         # 3. Cantidad de entregas (más es mejor hasta el límite)
-        score_entregas = (len(ruta.entregas) / self.params.max_entregas_por_ruta) * 100
+        score_entregas = (len(indices) / self.params.max_entregas_por_ruta) * 100
         
         # Score ponderado
         score_final = (
@@ -432,41 +615,224 @@ class RouteOptimizer:
         
         return round(min(score_final, 100), 1)
     
+    # ========== EDICIÓN INCREMENTAL DE RUTAS PLANIFICADAS ==========
+    
+    def insertar_entrega(
+        self, 
+        entrega_id: int, 
+        ruta_id: Optional[int] = None,
+        fecha: Optional[date] = None
+    ) -> Optional[Ruta]:
+        """
+        Inserta una entrega pendiente (p. ej. un pedido que llegó a media
+        mañana) en la posición más barata de una ruta planificada, sin
+        reoptimizar el día. Sin ruta_id se prueban las rutas del día más
+        cercanas a la entrega
+        
+        Returns: la ruta modificada, o None si ninguna la admite
+        """
+        entrega = self.db.get(Entrega, entrega_id)
+        if not entrega or entrega.ruta_id or entrega.estado != EstadoEntrega.PENDIENTE:
+            return None
+        
+        paradas = self._cargar_paradas(Entrega.id == entrega_id)
+        if not paradas:
+            return None
+        
+        if ruta_id is not None:
+            rutas = self._rutas_editables(Ruta.id == ruta_id)
+        else:
+            rutas = self._rutas_candidatas(paradas[0], fecha or date.today())
+        
+        try:
+            ruta = self._insertar(paradas[0], rutas)
+            if ruta is None:
+                return None
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        logger.info(f"➕ Entrega {entrega_id} insertada en ruta {ruta.codigo}")
+        return ruta
+    
+    def quitar_entrega(self, entrega_id: int) -> bool:
+        """Saca una entrega de su ruta planificada y la deja pendiente"""
+        entrega = self.db.get(Entrega, entrega_id)
+        if not entrega or not entrega.ruta_id:
+            return False
+        
+        rutas = self._rutas_editables(Ruta.id == entrega.ruta_id)
+        if not rutas:
+            return False
+        
+        try:
+            self._quitar(entrega, rutas[0])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        logger.info(f"➖ Entrega {entrega_id} quitada de su ruta")
+        return True
+    
     def reasignar_entrega(
         self, 
         entrega_id: int, 
         nueva_ruta_id: int
     ) -> bool:
-        """Reasigna manualmente una entrega a otra ruta"""
-        entrega = self.db.query(Entrega).get(entrega_id)
-        nueva_ruta = self.db.query(Ruta).get(nueva_ruta_id)
+        """
+        Mueve una entrega a otra ruta planificada, en su posición más barata
+        Solo se recalculan las dos rutas involucradas, en una sola
+        transacción (un commit al final; ante cualquier error, rollback)
+        """
+        entrega = self.db.get(Entrega, entrega_id)
+        rutas = self._rutas_editables(Ruta.id == nueva_ruta_id)
         
-        if not entrega or not nueva_ruta:
+        if not entrega or not rutas or entrega.ruta_id == nueva_ruta_id:
             return False
         
-        # Validar capacidad de la nueva ruta
-        peso_actual = nueva_ruta.peso_total_kg + entrega.peso_total_kg
-        if not self._validar_capacidad(
-            nueva_ruta.camion,
-            peso_actual,
-            nueva_ruta.volumen_total_m3 + (entrega.volumen_total_m3 or 0)
-        ):
-            logger.warning("No hay capacidad en la nueva ruta")
+        anterior = None
+        if entrega.ruta_id:
+            anteriores = self._rutas_editables(Ruta.id == entrega.ruta_id)
+            if not anteriores:
+                logger.warning(f"La ruta de la entrega {entrega_id} ya no es editable")
+                return False
+            anterior = anteriores[0]
+        
+        paradas = self._cargar_paradas(Entrega.id == entrega_id)
+        if not paradas:
             return False
         
-        # Remover de ruta anterior
-        if entrega.ruta_id:
-            ruta_anterior = self.db.query(Ruta).get(entrega.ruta_id)
-            if ruta_anterior:
-                self._calcular_metricas_ruta(ruta_anterior)
+        try:
+            # Primero se inserta: si la ruta nueva no la admite no se toca nada
+            if self._insertar(paradas[0], rutas) is None:
+                logger.warning(
+                    f"La ruta {nueva_ruta_id} no admite la entrega {entrega_id} "
+                    f"(capacidad, compatibilidad u horario)"
+                )
+                self.db.rollback()
+                return False
+            if anterior is not None:
+                self._quitar(entrega, anterior, reasignada=True)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         
-        # Asignar a nueva ruta
-        entrega.ruta_id = nueva_ruta_id
-        entrega.orden_en_ruta = len(nueva_ruta.entregas) + 1
+        logger.info(f"Entrega {entrega_id} reasignada a ruta {nueva_ruta_id}")
+        return True
+    
+    def _rutas_editables(self, *filtros) -> List[Ruta]:
+        """Rutas que todavía no salieron (con camión y chofer precargados)"""
+        return self.db.query(Ruta).options(
+            joinedload(Ruta.camion).joinedload(Camion.chofer_asignado)
+        ).filter(
+            Ruta.estado == EstadoRuta.PLANIFICADA, *filtros
+        ).order_by(Ruta.id).all()
+    
+    def _rutas_candidatas(self, parada: ParadaSnapshot, fecha: date) -> List[Ruta]:
+        """
+        Rutas planificadas del día con lugar para la entrega, las más
+        cercanas primero (distancia a su parada más próxima)
+        """
+        rutas = [
+            r for r in self._rutas_editables(Ruta.fecha == fecha)
+            if (r.cantidad_entregas or 0) < self.params.max_entregas_por_ruta
+            and self._validar_capacidad(
+                r.camion,
+                (r.peso_total_kg or 0) + parada.peso,
+                (r.volumen_total_m3 or 0) + parada.volumen
+            )
+        ]
+        if len(rutas) <= MAX_RUTAS_CANDIDATAS:
+            return rutas
+        
+        filas = self.db.query(Entrega.ruta_id, Cliente.lat, Cliente.lng).join(
+            Cliente, Entrega.cliente_id == Cliente.id
+        ).filter(Entrega.ruta_id.in_([r.id for r in rutas])).all()
+        destinos = np.array([(f.lat, f.lng) for f in filas], dtype=np.float64).reshape(-1, 2)
+        distancias = haversine_pares_km(
+            np.broadcast_to([parada.lat, parada.lng], destinos.shape), destinos
+        )
+        cercania: Dict[int, float] = {}
+        for f, distancia in zip(filas, distancias.tolist()):
+            cercania[f.ruta_id] = min(cercania.get(f.ruta_id, math.inf), distancia)
         
-        # Recalcular métricas
-        self._calcular_metricas_ruta(nueva_ruta)
+        rutas.sort(key=lambda r: cercania.get(r.id, math.inf))
+        return rutas[:MAX_RUTAS_CANDIDATAS]
+    
+    def _insertar(self, parada: ParadaSnapshot, rutas: List[Ruta]) -> Optional[Ruta]:
+        """
+        Inserción más barata (delta de km) de la parada en alguna de las rutas,
+        validando compatibilidad, capacidad, ventanas y límites en O(1) por
+        posición. Guarda solo la ruta elegida (sin commit)
+        """
+        if not rutas:
+            return None
         
-        self.db.commit()
-        logger.info(f"Entrega {entrega_id} reasignada a ruta {nueva_ruta_id}")
-        return True
\ No newline at end of file
+        # Snapshot: la nueva parada en el índice 1 y cada ruta a continuación
+        paradas = [parada]
+        secuencias: List[List[int]] = []
+        for ruta in rutas:
+            actuales = self._cargar_paradas(
+                Entrega.ruta_id == ruta.id, orden=Entrega.orden_en_ruta
+            )
+            secuencias.append(list(range(len(paradas) + 1, len(paradas) + len(actuales) + 1)))
+            paradas.extend(actuales)
+        
+        self.matriz = self._construir_matriz(paradas)
+        problema = self._problema(paradas, [self._vehiculo_ruta(r) for r in rutas])
+        if not insertar_mas_barato(problema, secuencias, 1):
+            return None
+        
+        v = next(v for v, secuencia in enumerate(secuencias) if 1 in secuencia)
+        self._guardar_ruta(rutas[v], problema, v, paradas, secuencias[v])
+        self.db.execute(update(Entrega), [{
+            "id": parada.entrega_id,
+            "ruta_id": rutas[v].id,
+            "estado": EstadoEntrega.ASIGNADO,
+            "fecha_asignacion": datetime.now()
+        }])
+        return rutas[v]
+    
+    def _quitar(self, entrega: Entrega, ruta: Ruta, reasignada: bool = False):
+        """
+        Saca la entrega de la ruta y actualiza solo esa ruta (sin commit)
+        Si la ruta queda vacía se elimina
+        """
+        restantes = self._cargar_paradas(
+            Entrega.ruta_id == ruta.id, Entrega.id != entrega.id, orden=Entrega.orden_en_ruta
+        )
+        if not reasignada:
+            entrega.ruta_id = None
+            entrega.orden_en_ruta = None
+            entrega.estado = EstadoEntrega.PENDIENTE
+            entrega.fecha_asignacion = None
+            self.db.flush()
+        
+        if not restantes:
+            logger.info(f"🗑️ Ruta {ruta.codigo} quedó sin entregas y se elimina")
+            self.db.delete(ruta)
+            return
+        
+        self.matriz = self._construir_matriz(restantes)
+        problema = self._problema(restantes, [self._vehiculo_ruta(ruta)])
+        self._guardar_ruta(ruta, problema, 0, restantes, list(range(1, len(restantes) + 1)))
+    
+    def _guardar_ruta(
+        self, 
+        ruta: Ruta, 
+        problema: Problema, 
+        v: int, 
+        paradas: List[ParadaSnapshot], 
+        secuencia: List[int]
+    ):
+        """Métricas y orden de visita de una ruta editada (sin commit)"""
+        ordenadas = [paradas[i - 1] for i in secuencia]
+        for campo, valor in self._metricas_ruta(problema, v, ordenadas, secuencia).items():
+            setattr(ruta, campo, valor)
+        self.db.execute(update(Entrega), [
+            {"id": p.entrega_id, "orden_en_ruta": orden}
+            for orden, p in enumerate(ordenadas, 1)
+        ])
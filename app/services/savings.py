@@ -0,0 +1,295 @@
+# app/services/savings.py
+"""
+Algoritmo de Ahorros (Clarke-Wright)
+Parte de una ruta almacén -> parada -> almacén por entrega y une rutas según
+el ahorro s(i, j) = d(i, 0) + d(0, j) - d(i, j), procesado con un heap
+"""
+
+from app.services.problem_snapshot import Plan, Problema
+from app.services.time_windows import HorarioRuta, perfil_horario
+from typing import Dict, List, Tuple
+import numpy as np
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Vecinos más cercanos por parada considerados como candidatos de unión
+VECINOS_CANDIDATOS = 40
+
+# Filas procesadas por bloque al calcular ahorros
+FILAS_POR_BLOQUE = 512
+
+
+def _ahorros_candidatos(
+    problema: Problema,
+    paradas: np.ndarray,
+    vecinos: int,
+    solo_positivos: bool = True
+) -> List[Tuple[float, int, int]]:
+    """
+    Ahorros entre cada parada y sus vecinos más cercanos dentro del conjunto
+    Returns: heap de (-ahorro, i, j)
+    """
+    n = len(paradas)
+    if n < 2:
+        return []
+
+    km = problema.km
+    k = min(vecinos, n - 1)
+    hasta_almacen = km[paradas, 0].astype(np.float64)
+    desde_almacen = km[0, paradas].astype(np.float64)
+
+    heap = []
+    for inicio in range(0, n, FILAS_POR_BLOQUE):
+        filas = np.arange(inicio, min(inicio + FILAS_POR_BLOQUE, n))
+
+        bloque = km[np.ix_(paradas[filas], paradas)].astype(np.float64)
+        bloque[filas - inicio, filas] = np.inf  # Excluir la propia parada
+
+        cercanos = np.argpartition(bloque, k - 1, axis=1)[:, :k]
+        dist = np.take_along_axis(bloque, cercanos, axis=1)
+        ahorro = hasta_almacen[filas, None] + desde_almacen[cercanos] - dist
+
+        validos = ahorro > 0 if solo_positivos else np.isfinite(ahorro)
+        origen = paradas[np.broadcast_to(filas[:, None], cercanos.shape)[validos]]
+        destino = paradas[cercanos[validos]]
+        heap.extend(zip((-ahorro[validos]).tolist(), origen.tolist(), destino.tolist()))
+
+    heapq.heapify(heap)
+    return heap
+
+
+class _EstadoRutas:
+    """
+    Rutas en construcción, indexadas por su parada fundadora
+    Cada ruta guarda su horario con el perfil más restrictivo de la flota,
+    así cualquier vehículo que la admita por carga la cumple a tiempo, y la
+    máscara de vehículos compatibles con todas sus paradas
+    """
+
+    def __init__(self, problema: Problema):
+        self.problema = problema
+        self.rutas: Dict[int, List[int]] = {}
+        self.carga: Dict[int, Tuple[float, float, bool]] = {}
+        self.flota: Dict[int, np.ndarray] = {}
+        self.horarios: Dict[int, HorarioRuta] = {}
+        self.perfil = perfil_horario(problema, None)
+        self.ruta_de = list(range(problema.n_paradas + 1))
+
+        # Rutas iniciales: una por parada que algún vehículo pueda llevar
+        for i in range(1, problema.n_paradas + 1):
+            carga = (
+                float(problema.peso[i]),
+                float(problema.volumen[i]),
+                bool(problema.refrigeracion[i])
+            )
+            flota = problema.compatible[:, i]
+            if not flota.any():
+                continue
+            horario = HorarioRuta(problema, None, [i], self.perfil)
+            if horario.factible:
+                self.rutas[i] = [i]
+                self.carga[i] = carga
+                self.flota[i] = flota
+                self.horarios[i] = horario
+
+        self.refrigeradas = sum(1 for _, _, r in self.carga.values() if r)
+
+    def factible(self, carga: Tuple[float, float, bool], flota: np.ndarray) -> bool:
+        return bool(self.problema.flota_admite(carga[0], carga[1], flota).any())
+
+    def extremos(self, solo_refrigeradas: bool = False) -> np.ndarray:
+        return np.unique([
+            extremo
+            for clave, ruta in self.rutas.items()
+            if self.carga[clave][2] or not solo_refrigeradas
+            for extremo in (ruta[0], ruta[-1])
+        ])
+
+    def unir(
+        self,
+        heap: List[Tuple[float, int, int]],
+        mezclar_refrigeracion: bool = True,
+        max_rutas: int = 0,
+        max_refrigeradas: int = 0
+    ) -> int:
+        """
+        Procesa el heap uniendo extremos de rutas distintas mientras sea factible
+        Con límites (0 = sin límite) se detiene al quedar max_rutas rutas de
+        las cuales a lo sumo max_refrigeradas necesitan refrigeración
+        """
+        def faltan_uniones() -> bool:
+            if not max_rutas:
+                return True
+            return (
+                len(self.rutas) > max_rutas or
+                self.refrigeradas > max_refrigeradas
+            )
+
+        uniones = 0
+        while heap and faltan_uniones():
+            _, i, j = heapq.heappop(heap)
+            a, b = self.ruta_de[i], self.ruta_de[j]
+            if a == b or a not in self.rutas or b not in self.rutas:
+                continue
+
+            ruta_a, ruta_b = self.rutas[a], self.rutas[b]
+
+            # Solo se unen extremos: i termina ruta_a, j inicia ruta_b
+            if i != ruta_a[-1] and i != ruta_a[0]:
+                continue
+            if j != ruta_b[0] and j != ruta_b[-1]:
+                continue
+            if len(ruta_a) + len(ruta_b) > self.problema.max_entregas:
+                continue
+
+            pa, va, ra = self.carga[a]
+            pb, vb, rb = self.carga[b]
+            if ra != rb and not mezclar_refrigeracion:
+                continue
+            nueva_carga = (pa + pb, va + vb, ra or rb)
+            nueva_flota = self.flota[a] & self.flota[b]
+            if not self.factible(nueva_carga, nueva_flota):
+                continue
+
+            # Horario de la unión en O(1) con la holgura de la segunda ruta
+            horario_a, horario_b = self.horarios[a], self.horarios[b]
+            if ruta_a[-1] != i:
+                horario_a = HorarioRuta(self.problema, None, ruta_a[::-1], self.perfil)
+            if ruta_b[0] != j:
+                horario_b = HorarioRuta(self.problema, None, ruta_b[::-1], self.perfil)
+            if not horario_a.concatenacion(horario_b):
+                continue
+
+            if ruta_a[-1] != i:
+                ruta_a.reverse()
+            if ruta_b[0] != j:
+                ruta_b.reverse()
+
+            ruta_a.extend(ruta_b)
+            for parada in ruta_b:
+                self.ruta_de[parada] = a
+            del self.rutas[b], self.carga[b], self.flota[b], self.horarios[b]
+            self.carga[a] = nueva_carga
+            self.flota[a] = nueva_flota
+            self.horarios[a] = HorarioRuta(self.problema, None, ruta_a, self.perfil)
+            if ra and rb:
+                self.refrigeradas -= 1
+            uniones += 1
+
+        return uniones
+
+
+def resolver_savings(
+    problema: Problema,
+    vecinos: int = VECINOS_CANDIDATOS
+) -> Tuple[Plan, int]:
+    """
+    Construye rutas con Clarke-Wright respetando compatibilidad, peso,
+    volumen, máximo de entregas, ventanas horarias, jornada y km
+
+    Returns:
+        (plan, cantidad de uniones realizadas)
+    """
+    estado = _EstadoRutas(problema)
+    todas = np.arange(1, problema.n_paradas + 1)
+
+    # 1. Uniones con ahorro positivo, sin mezclar carga refrigerada y seca
+    #    (los vehículos refrigerados son pocos)
+    uniones = estado.unir(
+        _ahorros_candidatos(problema, todas, vecinos),
+        mezclar_refrigeracion=False
+    )
+
+    # 2. Flota limitada: seguir uniendo extremos (aunque el ahorro sea
+    #    negativo) hasta que las rutas quepan en los vehículos disponibles
+    max_rutas = len(problema.vehiculos)
+    max_refrigeradas = sum(1 for v in problema.vehiculos if v.refrigerado)
+    if len(estado.rutas) > max_rutas or estado.refrigeradas > max_refrigeradas:
+        heap = _ahorros_candidatos(
+            problema, estado.extremos(), vecinos, solo_positivos=False
+        )
+        heap.extend(_ahorros_candidatos(
+            problema, estado.extremos(solo_refrigeradas=True), vecinos, solo_positivos=False
+        ))
+        heapq.heapify(heap)
+        uniones += estado.unir(heap, True, max_rutas, max_refrigeradas)
+
+    plan = _asignar_vehiculos(problema, estado.rutas, estado.carga, estado.flota)
+
+    logger.info(
+        f"💰 Savings: {uniones} uniones, {len(estado.rutas)} rutas, {len(plan)} asignadas"
+    )
+    return plan, uniones
+
+
+def _asignar_vehiculos(
+    problema: Problema,
+    rutas: Dict[int, List[int]],
+    carga: Dict[int, Tuple[float, float, bool]],
+    flota: Dict[int, np.ndarray]
+) -> Plan:
+    """
+    Asigna cada ruta al vehículo libre más pequeño que la admita
+    Las rutas urgentes y de mayor prioridad eligen primero
+    """
+    def importancia(clave: int):
+        paradas = rutas[clave]
+        return (
+            bool(problema.urgente[paradas].any()),
+            int(problema.prioridad[paradas].sum())
+        )
+
+    # Vehículos sin refrigeración primero, luego por capacidad ascendente
+    libres = sorted(
+        range(len(problema.vehiculos)),
+        key=lambda v: (
+            problema.vehiculos[v].refrigerado,
+            problema.vehiculos[v].peso_max,
+            problema.vehiculos[v].volumen_max
+        )
+    )
+
+    plan: Plan = []
+    sobrantes = []
+    for clave in sorted(rutas, key=importancia, reverse=True):
+        peso, volumen, _ = carga[clave]
+        admiten = problema.flota_admite(peso, volumen, flota[clave])
+        for posicion, v in enumerate(libres):
+            if admiten[v]:
+                plan.append((v, rutas[clave]))
+                del libres[posicion]
+                break
+        else:
+            sobrantes.append(rutas[clave])
+
+    # Flota heterogénea: las rutas que no cupieron se cortan en tramos
+    # contiguos para aprovechar los vehículos que quedaron libres
+    for paradas in sobrantes:
+        while paradas and libres:
+            mejor = None
+            for v in libres:
+                largo = _prefijo_admitido(problema, v, paradas)
+                if largo and (mejor is None or largo > mejor[1]):
+                    mejor = (v, largo)
+            if mejor is None:
+                break
+            v, largo = mejor
+            plan.append((v, paradas[:largo]))
+            libres.remove(v)
+            paradas = paradas[largo:]
+
+    plan.sort(key=lambda item: item[0])
+    return plan
+
+
+def _prefijo_admitido(problema: Problema, v: int, paradas: List[int]) -> int:
+    """Cantidad de paradas iniciales compatibles que caben en el vehículo v"""
+    indices = np.asarray(paradas, dtype=np.intp)
+    admitidas = (
+        problema.compatible[v, indices] &
+        (np.cumsum(problema.peso[indices]) <= problema.peso_max[v]) &
+        (np.cumsum(problema.volumen[indices]) <= problema.volumen_max[v])
+    )
+    return int(np.cumprod(admitidas).sum())
@@ -0,0 +1,83 @@
+# app/services/sequencing.py
+"""
+Secuenciación de Paradas
+Ordena las paradas de una ruta sobre la matriz de distancias del día
+"""
+
+from app.services.spatial_index import IndiceEspacial
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+INDICE_ALMACEN = 0
+
+# Desde este tamaño de zona el vecino más cercano usa el índice espacial
+MIN_PARADAS_INDICE = 2000
+
+# Candidatos geográficos entre los que se elige por distancia de la matriz
+VECINOS_CANDIDATOS = 8
+
+
+def secuenciar_por_zona(
+    km: np.ndarray,
+    paradas: Sequence[int],
+    zonas: Sequence[int],
+    coordenadas: Optional[np.ndarray] = None
+) -> List[int]:
+    """
+    Nearest Neighbor agrupando primero por zona
+    Cada zona se recorre partiendo desde el almacén
+    Con coordenadas (lat, lng por índice de la matriz) las zonas grandes
+    se recorren con el índice espacial en tiempo casi lineal
+    """
+    if len(paradas) <= 1:
+        return list(paradas)
+
+    por_zona: Dict[int, List[int]] = {}
+    for parada, zona in zip(paradas, zonas):
+        por_zona.setdefault(zona, []).append(parada)
+
+    secuencia = []
+    for paradas_zona in por_zona.values():
+        if len(paradas_zona) == 1:
+            secuencia.extend(paradas_zona)
+            continue
+
+        if coordenadas is not None and len(paradas_zona) >= MIN_PARADAS_INDICE:
+            secuencia.extend(_vecino_mas_cercano_indexado(km, paradas_zona, coordenadas))
+            continue
+
+        no_visitadas = list(paradas_zona)
+        actual = INDICE_ALMACEN
+
+        while no_visitadas:
+            # Encontrar la más cercana
+            posicion = int(km[actual, no_visitadas].argmin())
+            actual = no_visitadas.pop(posicion)
+            secuencia.append(actual)
+
+    return secuencia
+
+
+def _vecino_mas_cercano_indexado(
+    km: np.ndarray,
+    paradas: List[int],
+    coordenadas: np.ndarray
+) -> List[int]:
+    """
+    Nearest Neighbor consultando al índice los k más cercanos no visitados;
+    entre ellos se elige por la distancia de la matriz (vial)
+    """
+    paradas_arr = np.asarray(paradas, dtype=np.intp)
+    indice = IndiceEspacial(coordenadas[paradas_arr])
+
+    secuencia = []
+    actual = INDICE_ALMACEN
+    while len(indice):
+        lat, lng = coordenadas[actual]
+        candidatos = indice.k_cercanos(lat, lng, VECINOS_CANDIDATOS)
+        elegido = candidatos[int(km[actual, paradas_arr[candidatos]].argmin())]
+        indice.eliminar(elegido)
+        actual = int(paradas_arr[elegido])
+        secuencia.append(actual)
+
+    return secuencia
@@ -0,0 +1,128 @@
+# app/services/spatial_index.py
+"""
+Índice Espacial
+Grilla uniforme sobre lat/lng para buscar los k puntos más cercanos que
+siguen activos, con borrado al visitar. Cada consulta revisa solo los
+anillos de celdas alrededor del punto, no todas las paradas.
+"""
+
+from typing import Dict, List, Sequence, Set, Tuple
+import numpy as np
+import heapq
+import math
+
+# Kilómetros por grado de latitud
+KM_POR_GRADO = 111.32
+
+# Puntos esperados por celda al dimensionar la grilla
+PUNTOS_POR_CELDA = 2.0
+
+
+class IndiceEspacial:
+    """
+    Vecinos más cercanos sobre una grilla en km (proyección equirectangular,
+    suficiente a escala de ciudad). Los puntos se identifican por su
+    posición en el arreglo recibido
+    """
+
+    def __init__(self, coordenadas: Sequence[Tuple[float, float]]):
+        puntos = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+        self._lat0 = float(puntos[:, 0].mean()) if len(puntos) else 0.0
+        self._escala_lng = KM_POR_GRADO * math.cos(math.radians(self._lat0))
+
+        self._xy = self._proyectar(puntos)
+        self._activos = len(puntos)
+
+        # Tamaño de celda para ~PUNTOS_POR_CELDA puntos por celda
+        if len(puntos) > 1:
+            ancho, alto = np.ptp(self._xy, axis=0)
+            area = max(float(ancho) * float(alto), 1e-6)
+            self.celda_km = max(math.sqrt(area * PUNTOS_POR_CELDA / len(puntos)), 1e-3)
+        else:
+            self.celda_km = 1.0
+
+        self._celda_de: List[Tuple[int, int]] = [
+            (int(cx), int(cy)) for cx, cy in np.floor(self._xy / self.celda_km).astype(np.int64)
+        ]
+        self._celdas: Dict[Tuple[int, int], Set[int]] = {}
+        for i, celda in enumerate(self._celda_de):
+            self._celdas.setdefault(celda, set()).add(i)
+        self._x = self._xy[:, 0].tolist()
+        self._y = self._xy[:, 1].tolist()
+
+        claves = np.array(list(self._celdas)) if self._celdas else np.zeros((1, 2), np.int64)
+        self._min_celda = tuple(int(v) for v in claves.min(axis=0))
+        self._max_celda = tuple(int(v) for v in claves.max(axis=0))
+
+    def _proyectar(self, puntos: np.ndarray) -> np.ndarray:
+        return np.column_stack((
+            puntos[:, 1] * self._escala_lng,
+            puntos[:, 0] * KM_POR_GRADO
+        ))
+
+    def __len__(self) -> int:
+        return self._activos
+
+    def eliminar(self, i: int):
+        """Quita un punto (p. ej. una parada ya visitada)"""
+        celda = self._celda_de[i]
+        puntos = self._celdas.get(celda)
+        if puntos is None or i not in puntos:
+            return
+        puntos.discard(i)
+        if not puntos:
+            del self._celdas[celda]
+        self._activos -= 1
+
+    def k_cercanos(self, lat: float, lng: float, k: int = 1) -> List[int]:
+        """
+        Los k puntos activos más cercanos a (lat, lng), del más cercano al
+        más lejano. Se expande anillo por anillo hasta que ningún punto
+        fuera de lo revisado pueda estar más cerca que el k-ésimo
+        """
+        k = min(k, self._activos)
+        if k <= 0:
+            return []
+
+        x, y = lng * self._escala_lng, lat * KM_POR_GRADO
+        cx, cy = int(math.floor(x / self.celda_km)), int(math.floor(y / self.celda_km))
+
+        # Anillos necesarios para cubrir toda la grilla desde (cx, cy)
+        max_radio = max(
+            abs(cx - self._min_celda[0]), abs(cx - self._max_celda[0]),
+            abs(cy - self._min_celda[1]), abs(cy - self._max_celda[1])
+        )
+
+        mejores: List[Tuple[float, int]] = []  # heap de (-distancia², punto)
+        for radio in range(max_radio + 1):
+            for celda in self._anillo(cx, cy, radio):
+                for i in self._celdas.get(celda, ()):
+                    dx, dy = self._x[i] - x, self._y[i] - y
+                    d2 = dx * dx + dy * dy
+                    if len(mejores) < k:
+                        heapq.heappush(mejores, (-d2, i))
+                    elif d2 < -mejores[0][0]:
+                        heapq.heapreplace(mejores, (-d2, i))
+
+            # Todo punto en anillos siguientes está al menos a radio * celda
+            if len(mejores) == k and -mejores[0][0] <= (radio * self.celda_km) ** 2:
+                break
+
+        return [i for _, i in sorted(mejores, reverse=True)]
+
+    def _anillo(self, cx: int, cy: int, radio: int):
+        """Celdas a distancia (Chebyshev) radio de (cx, cy), recortadas a la grilla"""
+        x_min, y_min = self._min_celda
+        x_max, y_max = self._max_celda
+
+        desde_x, hasta_x = max(cx - radio, x_min), min(cx + radio, x_max)
+        for y in {cy - radio, cy + radio}:
+            if y_min <= y <= y_max:
+                for x in range(desde_x, hasta_x + 1):
+                    yield (x, y)
+
+        desde_y, hasta_y = max(cy - radio + 1, y_min), min(cy + radio - 1, y_max)
+        for x in {cx - radio, cx + radio}:
+            if x_min <= x <= x_max:
+                for y in range(desde_y, hasta_y + 1):
+                    yield (x, y)
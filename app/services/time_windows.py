@@ -0,0 +1,292 @@
+# app/services/time_windows.py
+"""
+Ventanas Horarias (VRPTW)
+Programación de cada ruta (inicio de servicio y salida por parada) con la
+holgura hacia adelante de Savelsbergh: cuánto puede atrasarse el servicio
+en una posición sin violar ninguna ventana posterior ni el regreso al
+almacén. Con ella, insertar, quitar o reemplazar una parada se valida en
+O(1) sin volver a simular la ruta completa.
+Los tiempos de viaje dependen de la hora de salida (ModeloTiempos); la
+holgura supone que los tramos siguientes conservan su duración al
+correrse el horario, aproximación suficiente con franjas de 15 minutos.
+"""
+
+from app.services.problem_snapshot import Plan, Problema
+from app.services.travel_time import franja
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tolerancia (minutos / km) al comparar contra límites
+TOLERANCIA = 1e-6
+
+
+def perfil_horario(problema: Problema, v: Optional[int]) -> Tuple[float, float, float]:
+    """
+    (minutos por km, salida del almacén, regreso máximo) del vehículo v
+    Con v=None se usa el perfil más restrictivo de los primeros viajes de
+    la flota, válido para rutas que todavía no tienen vehículo
+    """
+    if v is not None:
+        vehiculo = problema.vehiculos[v]
+        return 60.0 / vehiculo.velocidad_kmh, vehiculo.salida_min, vehiculo.regreso_max_min
+    primeros = [veh for veh in problema.vehiculos if veh.viaje == 1] or problema.vehiculos
+    return (
+        60.0 / min(veh.velocidad_kmh for veh in primeros),
+        max(veh.salida_min for veh in primeros),
+        min(veh.regreso_max_min for veh in primeros)
+    )
+
+
+class HorarioRuta:
+    """
+    Programación de almacén -> paradas -> almacén para un vehículo
+    Las posiciones van de 0 (salida) a m + 1 (regreso)
+    """
+
+    __slots__ = (
+        "problema", "min_por_km", "recorrido", "apertura", "cierre",
+        "inicio", "salida", "holgura", "km_total"
+    )
+
+    def __init__(
+        self,
+        problema: Problema,
+        v: Optional[int],
+        paradas: Sequence[int],
+        perfil: Optional[Tuple[float, float, float]] = None
+    ):
+        self.problema = problema
+        self.min_por_km, salida_almacen, regreso_max = perfil or perfil_horario(problema, v)
+
+        t = np.array([0, *paradas, 0], dtype=np.intp)
+        self.recorrido = t
+        apertura = problema.ventana_inicio[t].astype(np.float64)
+        cierre = problema.ventana_fin[t].astype(np.float64)
+        apertura[0], cierre[0] = salida_almacen, np.inf
+        apertura[-1], cierre[-1] = 0.0, regreso_max
+        self.apertura, self.cierre = apertura, cierre
+
+        servicio = problema.servicio[t]
+        tramos = problema.km[t[:-1], t[1:]].astype(np.float64)
+        self.km_total = float(tramos.sum())
+
+        # Simulación hacia adelante (una sola vez por ruta)
+        n = len(t)
+        inicio = [0.0] * n
+        salida = [0.0] * n
+        espera = [0.0] * n
+        inicio[0] = salida[0] = float(salida_almacen)
+        viajes = (tramos * self.min_por_km).tolist()
+        filas = problema.fila_trafico[t]
+        filas[-1] = filas[-2]  # La vuelta al almacén usa la zona de origen
+        filas = filas[1:].tolist()
+        tabla = problema.trafico.tabla
+        aperturas = apertura.tolist()
+        servicios = servicio.tolist()
+        for k in range(1, n):
+            llegada = salida[k - 1] + viajes[k - 1] * tabla[filas[k - 1]][franja(salida[k - 1])]
+            inicio[k] = max(llegada, aperturas[k])
+            espera[k] = inicio[k] - llegada
+            salida[k] = inicio[k] + servicios[k]
+
+        # Holgura hacia adelante: F_k = min(cierre_k - inicio_k, espera_k+1 + F_k+1)
+        cierres = cierre.tolist()
+        holgura = [0.0] * n
+        holgura[-1] = cierres[-1] - inicio[-1]
+        for k in range(n - 2, -1, -1):
+            holgura[k] = min(cierres[k] - inicio[k], espera[k + 1] + holgura[k + 1])
+
+        self.inicio = np.array(inicio)
+        self.salida = np.array(salida)
+        self.holgura = np.array(holgura)
+
+    @property
+    def factible(self) -> bool:
+        return bool(
+            (self.inicio <= self.cierre + TOLERANCIA).all() and
+            self.km_total <= self.problema.max_km + TOLERANCIA
+        )
+
+    @property
+    def regreso(self) -> float:
+        return float(self.inicio[-1])
+
+    def _empuje_ok(self, llegada: np.ndarray, posicion: np.ndarray) -> np.ndarray:
+        """¿El nuevo horario de llegada a `posicion` respeta su holgura?"""
+        inicio = np.maximum(llegada, self.apertura[posicion])
+        return inicio - self.inicio[posicion] <= self.holgura[posicion] + TOLERANCIA
+
+    def _visita(
+        self,
+        salida_previa: np.ndarray,
+        previa: np.ndarray,
+        parada: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(salida de la parada, ¿se atiende dentro de su ventana?)"""
+        p = self.problema
+        llegada = salida_previa + p.minutos_viaje(previa, parada, salida_previa, self.min_por_km)
+        inicio = np.maximum(llegada, p.ventana_inicio[parada])
+        return inicio + p.servicio[parada], inicio <= p.ventana_fin[parada] + TOLERANCIA
+
+    def insercion(self, candidatas: np.ndarray) -> np.ndarray:
+        """
+        Factibilidad de insertar cada candidata entre las posiciones k y k+1
+        Returns: matriz booleana (candidatas, m + 1)
+        """
+        t, km = self.recorrido, self.problema.km
+        u = np.asarray(candidatas, dtype=np.intp)[:, None]
+        previa, siguiente = t[:-1][None, :], t[1:][None, :]
+
+        salida_u, ok = self._visita(self.salida[:-1][None, :], previa, u)
+        llegada = salida_u + self.problema.minutos_viaje(u, siguiente, salida_u, self.min_por_km)
+        ok &= self._empuje_ok(llegada, np.arange(1, len(t))[None, :])
+
+        delta_km = km[previa, u] + km[u, siguiente] - km[previa, siguiente]
+        return ok & (self.km_total + delta_km <= self.problema.max_km + TOLERANCIA)
+
+    def remocion(self) -> np.ndarray:
+        """
+        Factibilidad de quitar la parada de cada posición 1..m
+        (sin desigualdad triangular quitar también puede atrasar la ruta)
+        """
+        t, km = self.recorrido, self.problema.km
+        posiciones = np.arange(1, len(t) - 1)
+        previa, siguiente = t[posiciones - 1], t[posiciones + 1]
+
+        salida_previa = self.salida[posiciones - 1]
+        llegada = salida_previa + self.problema.minutos_viaje(
+            previa, siguiente, salida_previa, self.min_por_km
+        )
+        ok = self._empuje_ok(llegada, posiciones + 1)
+
+        delta_km = km[previa, siguiente] - km[previa, t[posiciones]] - km[t[posiciones], siguiente]
+        return ok & (self.km_total + delta_km <= self.problema.max_km + TOLERANCIA)
+
+    def reemplazo(self, candidatas: np.ndarray) -> np.ndarray:
+        """
+        Factibilidad de reemplazar la parada de cada posición 1..m por cada candidata
+        Returns: matriz booleana (m, candidatas)
+        """
+        t, km = self.recorrido, self.problema.km
+        posiciones = np.arange(1, len(t) - 1)[:, None]
+        previa, siguiente = t[posiciones - 1], t[posiciones + 1]
+        u = np.asarray(candidatas, dtype=np.intp)[None, :]
+
+        salida_u, ok = self._visita(self.salida[posiciones - 1], previa, u)
+        llegada = salida_u + self.problema.minutos_viaje(u, siguiente, salida_u, self.min_por_km)
+        ok &= self._empuje_ok(llegada, posiciones + 1)
+
+        delta_km = (
+            km[previa, u] + km[u, siguiente] -
+            km[previa, t[posiciones]] - km[t[posiciones], siguiente]
+        )
+        return ok & (self.km_total + delta_km <= self.problema.max_km + TOLERANCIA)
+
+    def concatenacion(self, otra: "HorarioRuta") -> bool:
+        """¿Es factible recorrer esta ruta y a continuación `otra`?"""
+        if len(self.recorrido) < 3 or len(otra.recorrido) < 3:
+            return True
+        km = self.problema.km
+        ultima, primera = int(self.recorrido[-2]), int(otra.recorrido[1])
+
+        llegada = self.salida[-2] + self.problema.minutos_viaje(
+            ultima, primera, self.salida[-2], self.min_por_km
+        )
+        if not bool(otra._empuje_ok(np.array(llegada), np.array(1))):
+            return False
+
+        km_total = (
+            self.km_total + otra.km_total -
+            km[ultima, 0] - km[0, primera] + km[ultima, primera]
+        )
+        return km_total <= self.problema.max_km + TOLERANCIA
+
+
+def ruta_factible(problema: Problema, v: Optional[int], paradas: Sequence[int]) -> bool:
+    """Ventanas, duración y km de una ruta completa (simulación O(n))"""
+    return not paradas or HorarioRuta(problema, v, paradas).factible
+
+
+def insertar_mas_barato(
+    problema: Problema,
+    rutas: List[List[int]],
+    parada: int
+) -> bool:
+    """
+    Inserta la parada donde menos km agregue sin violar compatibilidad,
+    capacidad, máximo de entregas, ventanas ni límites de la ruta
+    """
+    km = problema.km
+    mejor = None
+
+    for v in np.flatnonzero(problema.compatible[:, parada]).tolist():
+        paradas = rutas[v]
+        if not problema.admite(v, paradas + [parada]):
+            continue
+        recorrido = np.array([0, *paradas, 0], dtype=np.intp)
+        delta = (
+            km[recorrido[:-1], parada] +
+            km[parada, recorrido[1:]] -
+            km[recorrido[:-1], recorrido[1:]]
+        )
+        delta = np.where(
+            HorarioRuta(problema, v, paradas).insercion(np.array([parada]))[0],
+            delta, np.inf
+        )
+        posicion = int(delta.argmin())
+        if np.isfinite(delta[posicion]) and (mejor is None or delta[posicion] < mejor[0]):
+            mejor = (float(delta[posicion]), v, posicion)
+
+    if mejor is None:
+        return False
+
+    _, v, posicion = mejor
+    rutas[v].insert(posicion, parada)
+    return True
+
+
+def reparar_plan(problema: Problema, plan: Plan) -> Plan:
+    """
+    Deja cada ruta dentro de sus ventanas y límites: quita la parada que
+    llega tarde (o la que más alarga la ruta si se excede la jornada o los
+    km) y luego reinserta lo quitado donde sea factible
+    """
+    rutas: List[List[int]] = [[] for _ in problema.vehiculos]
+    for v, paradas in plan:
+        rutas[v] = list(paradas)
+
+    quitadas: List[int] = []
+    for v, paradas in enumerate(rutas):
+        while paradas:
+            horario = HorarioRuta(problema, v, paradas)
+            if horario.factible:
+                break
+            tarde = np.flatnonzero(horario.inicio[1:-1] > horario.cierre[1:-1] + TOLERANCIA)
+            if len(tarde):
+                posicion = int(tarde[0])
+            else:
+                t = horario.recorrido
+                ahorro = (
+                    problema.km[t[:-2], t[1:-1]] + problema.km[t[1:-1], t[2:]] -
+                    problema.km[t[:-2], t[2:]]
+                ) * horario.min_por_km + problema.servicio[t[1:-1]]
+                posicion = int(ahorro.argmax())
+            quitadas.append(paradas.pop(posicion))
+
+    if not quitadas:
+        return plan
+
+    # Las más importantes eligen lugar primero
+    penalizacion = problema.penalizacion()
+    reinsertadas = sum(
+        insertar_mas_barato(problema, rutas, parada)
+        for parada in sorted(quitadas, key=lambda i: -penalizacion[i])
+    )
+    logger.info(
+        f"🕒 Ventanas horarias: {len(quitadas)} paradas fuera de horario, "
+        f"{reinsertadas} reubicadas"
+    )
+    return [(v, paradas) for v, paradas in enumerate(rutas) if paradas]
@@ -0,0 +1,462 @@
+# app/services/track_retention.py
+"""
+Retención del Historial de Tracking
+Tres niveles: los puntos crudos de tracking_historial se guardan
+TRACKING_RETENCION_DIAS; antes de borrarlos, el recorrido de cada ruta
+terminada se simplifica (Douglas-Peucker) y queda como polilínea codificada
+en trayectorias_ruta, que es lo que se lee para repetir una ruta.
+La poda solo borra puntos sin ruta o ya incluidos en la trayectoria
+guardada (hasta su fin): si una compresión falla, sus puntos esperan a la
+próxima corrida. Una ruta que siguió recibiendo puntos después de
+comprimirse (quedó en curso de un día para otro) se vuelve a comprimir
+sumando el tramo nuevo a la trayectoria guardada.
+En PostgreSQL la tabla puede particionarse por mes (particionar_historial):
+la poda borra particiones completas en lugar de filas.
+"""
+
+from sqlalchemy import select, delete, exists, or_, text
+from sqlalchemy.orm import Session
+from app.models import Ruta, TrackingHistorial, TrayectoriaRuta, EstadoRuta
+from app.services.distance_matrix import RADIO_TIERRA_KM, haversine_pares_km
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+TABLA = TrackingHistorial.__tablename__
+
+# Particiones mensuales creadas por adelantado
+MESES_ADELANTE = 2
+
+# Escala de la polilínea codificada (5 decimales, ~1 m)
+ESCALA_POLILINEA = 1e5
+
+# El punto ya está en la trayectoria guardada de su ruta
+COMPRIMIDO = exists().where(
+    TrayectoriaRuta.ruta_id == TrackingHistorial.ruta_id,
+    TrackingHistorial.timestamp <= TrayectoriaRuta.fin
+)
+
+# Puntos que ya se pueden borrar: sin ruta o incluidos en la trayectoria de su ruta
+PODABLE = or_(TrackingHistorial.ruta_id.is_(None), COMPRIMIDO)
+
+
+# ========== DOUGLAS-PEUCKER ==========
+
+def simplificar(puntos: np.ndarray, tolerancia_metros: float) -> np.ndarray:
+    """
+    Índices de los puntos que conserva Douglas-Peucker (el primero y el
+    último siempre); los demás se apartan menos de la tolerancia del trazo
+    Args: arreglo (n, 2) de [lat, lng]
+    """
+    n = len(puntos)
+    if n <= 2:
+        return np.arange(n)
+
+    # Proyección equirectangular local en metros (error despreciable en una ciudad)
+    radianes = np.radians(np.asarray(puntos, dtype=np.float64))
+    escala = RADIO_TIERRA_KM * 1000.0
+    xy = np.column_stack((
+        radianes[:, 1] * np.cos(radianes[:, 0].mean()) * escala,
+        radianes[:, 0] * escala
+    ))
+
+    conservar = np.zeros(n, dtype=bool)
+    conservar[[0, -1]] = True
+    pendientes = [(0, n - 1)]
+    while pendientes:
+        a, b = pendientes.pop()
+        if b - a < 2:
+            continue
+        distancias = _distancia_segmento(xy[a + 1:b], xy[a], xy[b])
+        k = int(distancias.argmax())
+        if distancias[k] > tolerancia_metros:
+            medio = a + 1 + k
+            conservar[medio] = True
+            pendientes.append((a, medio))
+            pendientes.append((medio, b))
+    return np.flatnonzero(conservar)
+
+
+def _distancia_segmento(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distancia de cada punto al segmento a-b (no a la recta)"""
+    v = b - a
+    largo = float(v @ v)
+    if largo == 0.0:
+        return np.hypot(*(p - a).T)
+    t = np.clip((p - a) @ v / largo, 0.0, 1.0)
+    return np.hypot(*(p - a - t[:, None] * v).T)
+
+
+# ========== POLILÍNEA CODIFICADA ==========
+
+def _codificar(enteros: np.ndarray) -> str:
+    """
+    Algoritmo de polilíneas codificadas de Google: cada columna como
+    diferencia con la fila anterior, en bloques de 5 bits
+    """
+    deltas = np.diff(enteros, axis=0, prepend=np.zeros((1, enteros.shape[1]), dtype=np.int64))
+    caracteres = []
+    for valor in deltas.ravel().tolist():
+        valor = ~(valor << 1) if valor < 0 else valor << 1
+        while valor >= 0x20:
+            caracteres.append(chr((0x20 | (valor & 0x1f)) + 63))
+            valor >>= 5
+        caracteres.append(chr(valor + 63))
+    return "".join(caracteres)
+
+
+def _decodificar(texto: str, columnas: int) -> np.ndarray:
+    valores = []
+    valor = desplazamiento = 0
+    for caracter in texto:
+        bloque = ord(caracter) - 63
+        valor |= (bloque & 0x1f) << desplazamiento
+        desplazamiento += 5
+        if bloque < 0x20:
+            valores.append(~(valor >> 1) if valor & 1 else valor >> 1)
+            valor = desplazamiento = 0
+    return np.cumsum(np.array(valores, dtype=np.int64).reshape(-1, columnas), axis=0)
+
+
+def codificar_polilinea(puntos: np.ndarray) -> str:
+    """Arreglo (n, 2) de [lat, lng] como polilínea codificada"""
+    return _codificar(np.round(np.asarray(puntos) * ESCALA_POLILINEA).astype(np.int64))
+
+
+def decodificar_polilinea(texto: str) -> np.ndarray:
+    return _decodificar(texto, 2) / ESCALA_POLILINEA
+
+
+def codificar_enteros(valores: Sequence[int]) -> str:
+    return _codificar(np.asarray(valores, dtype=np.int64).reshape(-1, 1))
+
+
+def decodificar_enteros(texto: str) -> List[int]:
+    return _decodificar(texto, 1).ravel().tolist()
+
+
+# ========== TRAYECTORIAS ==========
+
+def comprimir_trayectoria(
+    puntos: Sequence[Tuple[float, float, datetime]],
+    tolerancia_metros: float
+) -> Dict:
+    """
+    Recorrido (lat, lng, momento) ordenado por hora -> columnas de
+    TrayectoriaRuta (polilínea simplificada y segundos de cada punto)
+    """
+    coordenadas = np.array([(lat, lng) for lat, lng, _ in puntos], dtype=np.float64)
+    momentos = [momento for _, _, momento in puntos]
+    indices = simplificar(coordenadas, tolerancia_metros)
+    inicio = momentos[0]
+
+    return {
+        "polilinea": codificar_polilinea(coordenadas[indices]),
+        "segundos": codificar_enteros(
+            [int((momentos[i] - inicio).total_seconds()) for i in indices.tolist()]
+        ),
+        "inicio": inicio,
+        "fin": momentos[-1],
+        "distancia_km": round(float(
+            haversine_pares_km(coordenadas[:-1], coordenadas[1:]).sum()
+        ), 3) if len(coordenadas) > 1 else 0.0,
+        "puntos_originales": len(puntos),
+        "puntos_guardados": len(indices),
+        "tolerancia_metros": tolerancia_metros
+    }
+
+
+def trayectoria_a_dict(trayectoria: Dict) -> Dict:
+    """Trayectoria comprimida con los puntos decodificados ([lat, lng, segundos])"""
+    coordenadas = decodificar_polilinea(trayectoria["polilinea"])
+    segundos = decodificar_enteros(trayectoria["segundos"])
+    return {
+        **trayectoria,
+        "puntos": [
+            [round(lat, 5), round(lng, 5), s]
+            for (lat, lng), s in zip(coordenadas.tolist(), segundos)
+        ]
+    }
+
+
+def extender_trayectoria(
+    guardada: Dict,
+    puntos: Sequence[Tuple[float, float, datetime]],
+    tolerancia_metros: float
+) -> Dict:
+    """
+    Trayectoria guardada (columnas de TrayectoriaRuta) + puntos posteriores
+    a su fin -> columnas de la trayectoria completa; los puntos crudos
+    anteriores pueden ya no existir, por eso se parte de la guardada
+    """
+    previos = [
+        (lat, lng, guardada["inicio"] + timedelta(seconds=s))
+        for lat, lng, s in trayectoria_a_dict(guardada)["puntos"]
+    ]
+    columnas = comprimir_trayectoria(previos + list(puntos), tolerancia_metros)
+    union = np.array([(lat, lng) for lat, lng, _ in [previos[-1], *puntos]], dtype=np.float64)
+    columnas["distancia_km"] = round(
+        (guardada["distancia_km"] or 0.0) + float(haversine_pares_km(union[:-1], union[1:]).sum()), 3
+    )
+    columnas["puntos_originales"] = (guardada["puntos_originales"] or 0) + len(puntos)
+    return columnas
+
+
+def puntos_de_ruta(
+    db: Session, ruta_id: int, desde: Optional[datetime] = None
+) -> List[Tuple[float, float, datetime]]:
+    """Puntos de la ruta por hora; con `desde`, solo los posteriores"""
+    consulta = (
+        select(TrackingHistorial.lat, TrackingHistorial.lng, TrackingHistorial.timestamp)
+        .where(TrackingHistorial.ruta_id == ruta_id, TrackingHistorial.timestamp.isnot(None))
+        .order_by(TrackingHistorial.timestamp, TrackingHistorial.id)
+    )
+    if desde is not None:
+        consulta = consulta.where(TrackingHistorial.timestamp > desde)
+    return db.execute(consulta).all()
+
+
+# ========== PARTICIONES (POSTGRESQL) ==========
+
+def _mes(dia: date, desplazamiento: int = 0) -> date:
+    indice = dia.year * 12 + dia.month - 1 + desplazamiento
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _nombre_particion(mes: date) -> str:
+    return f"{TABLA}_{mes:%Y_%m}"
+
+
+def tabla_particionada(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"
+    ), {"tabla": TABLA}).first() is not None
+
+
+def crear_particiones(db: Session, desde: date, hasta: date) -> int:
+    """Particiones mensuales que cubren [desde, hasta]. Returns: particiones creadas"""
+    creadas = 0
+    mes = _mes(desde)
+    while mes <= hasta:
+        nombre = _nombre_particion(mes)
+        if db.execute(text("SELECT to_regclass(:nombre)"), {"nombre": nombre}).scalar() is None:
+            db.execute(text(
+                f"CREATE TABLE {nombre} PARTITION OF {TABLA} "
+                f"FOR VALUES FROM ('{mes}') TO ('{_mes(mes, 1)}')"
+            ))
+            creadas += 1
+        mes = _mes(mes, 1)
+    return creadas
+
+
+def particionar_historial(db: Session) -> int:
+    """
+    Migración única: convierte tracking_historial en una tabla particionada
+    por mes (con una partición por defecto para horas fuera de rango) y
+    copia los puntos. La tabla original queda como <tabla>_sin_particion
+    para borrarla a mano tras verificar. Returns: puntos copiados
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise ValueError("El particionado de tracking_historial requiere PostgreSQL")
+    if tabla_particionada(db):
+        return 0
+
+    anterior = f"{TABLA}_sin_particion"
+    try:
+        secuencia = db.execute(
+            text("SELECT pg_get_serial_sequence(:tabla, 'id')"), {"tabla": TABLA}
+        ).scalar()
+        desde = db.execute(text(f"SELECT min(timestamp) FROM {TABLA}")).scalar()
+
+        db.execute(text(f"ALTER TABLE {TABLA} RENAME TO {anterior}"))
+        db.execute(text(
+            f"CREATE TABLE {TABLA} (LIKE {anterior} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (timestamp)"
+        ))
+        # La clave de partición debe ser parte de la clave primaria
+        db.execute(text(f"ALTER TABLE {TABLA} ADD PRIMARY KEY (id, timestamp)"))
+        for columna in ("camion_id", "ruta_id", "timestamp"):
+            db.execute(text(f"CREATE INDEX ON {TABLA} ({columna})"))
+        db.execute(text(f"ALTER TABLE {TABLA} ADD FOREIGN KEY (camion_id) REFERENCES camiones (id)"))
+        db.execute(text(f"ALTER TABLE {TABLA} ADD FOREIGN KEY (ruta_id) REFERENCES rutas (id)"))
+        if secuencia:
+            db.execute(text(f"ALTER SEQUENCE {secuencia} OWNED BY {TABLA}.id"))
+
+        hoy = date.today()
+        crear_particiones(db, (desde or datetime.utcnow()).date(), _mes(hoy, MESES_ADELANTE))
+        db.execute(text(f"CREATE TABLE {TABLA}_otros PARTITION OF {TABLA} DEFAULT"))
+
+        copiados = db.execute(text(
+            f"INSERT INTO {TABLA} SELECT * FROM {anterior} WHERE timestamp IS NOT NULL"
+        )).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("❌ Error particionando tracking_historial")
+        raise
+
+    logger.info(f"🗂️ tracking_historial particionada por mes ({copiados} puntos copiados)")
+    return copiados
+
+
+# ========== TAREA DE RETENCIÓN ==========
+
+class RetencionTracking:
+    """Compresión de recorridos terminados y poda de puntos crudos"""
+
+    def __init__(self, db: Session, dias_retencion: int, tolerancia_metros: float):
+        self.db = db
+        self.dias_retencion = dias_retencion
+        self.tolerancia_metros = tolerancia_metros
+
+    def ejecutar(self) -> Dict:
+        """Corrida completa (nocturna): particiones, compresión y poda"""
+        particiones = self.asegurar_particiones()
+        comprimidas = self.comprimir_rutas()
+        podados = self.podar()
+        return {"particiones": particiones, "rutas_comprimidas": comprimidas, "puntos_podados": podados}
+
+    def asegurar_particiones(self) -> int:
+        """Particiones de los próximos meses (si la tabla está particionada)"""
+        if not tabla_particionada(self.db):
+            return 0
+        hoy = date.today()
+        creadas = crear_particiones(self.db, hoy, _mes(hoy, MESES_ADELANTE))
+        self.db.commit()
+        return creadas
+
+    def comprimir_rutas(self) -> int:
+        """
+        Guarda la trayectoria de cada ruta terminada (completada, cancelada o
+        de un día anterior) que tenga puntos fuera de su trayectoria: sin
+        comprimir todavía o recibidos después de comprimirla
+        Returns: rutas comprimidas
+        """
+        pendientes = self.db.execute(
+            select(Ruta.id, Ruta.camion_id).where(
+                or_(
+                    Ruta.estado.in_([EstadoRuta.COMPLETADA, EstadoRuta.CANCELADA]),
+                    Ruta.fecha < date.today()
+                ),
+                exists().where(
+                    TrackingHistorial.ruta_id == Ruta.id,
+                    TrackingHistorial.timestamp.isnot(None),
+                    ~COMPRIMIDO
+                )
+            ).order_by(Ruta.id)
+        ).all()
+
+        comprimidas = 0
+        for ruta_id, camion_id in pendientes:
+            guardada = self.db.get(TrayectoriaRuta, ruta_id)
+            puntos = puntos_de_ruta(self.db, ruta_id, guardada.fin if guardada else None)
+            if not puntos:
+                continue
+            try:
+                if guardada is None:
+                    self.db.add(TrayectoriaRuta(
+                        ruta_id=ruta_id,
+                        camion_id=camion_id,
+                        **comprimir_trayectoria(puntos, self.tolerancia_metros)
+                    ))
+                else:
+                    anterior = {
+                        columna.name: getattr(guardada, columna.name)
+                        for columna in TrayectoriaRuta.__table__.columns
+                    }
+                    for columna, valor in extender_trayectoria(
+                        anterior, puntos, self.tolerancia_metros
+                    ).items():
+                        setattr(guardada, columna, valor)
+                self.db.commit()
+                comprimidas += 1
+            except Exception:
+                self.db.rollback()
+                logger.exception(f"❌ Error comprimiendo la trayectoria de la ruta {ruta_id}")
+
+        if comprimidas:
+            logger.info(f"🗜️ {comprimidas} trayectorias de ruta comprimidas")
+        return comprimidas
+
+    def podar(self) -> int:
+        """
+        Borra los puntos crudos más viejos que la retención que no tengan
+        ruta o que ya estén en la trayectoria de su ruta; con particiones,
+        los meses completos sin puntos por comprimir se eliminan con DROP TABLE
+        Returns: puntos borrados (sin contar las particiones eliminadas)
+        """
+        limite = datetime.utcnow() - timedelta(days=self.dias_retencion)
+
+        if tabla_particionada(self.db):
+            for nombre in self._particiones_vencidas(limite.date()):
+                if self._tiene_rutas_sin_comprimir(nombre):
+                    logger.warning(f"⚠️ Partición {nombre} conservada: tiene puntos sin comprimir")
+                    continue
+                self.db.execute(text(f"DROP TABLE {nombre}"))
+                logger.info(f"🗑️ Partición {nombre} eliminada")
+
+        borrados = self.db.execute(
+            delete(TrackingHistorial)
+            .where(TrackingHistorial.timestamp < limite, PODABLE)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.commit()
+
+        if borrados:
+            logger.info(f"🗑️ {borrados} puntos de tracking anteriores a {limite:%Y-%m-%d} borrados")
+        return borrados
+
+    def _particiones_vencidas(self, limite: date) -> List[str]:
+        """Particiones mensuales cuyo mes terminó antes del límite"""
+        nombres = self.db.scalars(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:tabla)"
+        ), {"tabla": TABLA}).all()
+
+        vencidas = []
+        for nombre in nombres:
+            try:
+                mes = datetime.strptime(nombre[len(TABLA) + 1:], "%Y_%m").date()
+            except ValueError:
+                continue  # Partición por defecto
+            if _mes(mes, 1) <= limite:
+                vencidas.append(nombre)
+        return vencidas
+
+    def _tiene_rutas_sin_comprimir(self, particion: str) -> bool:
+        return self.db.execute(text(
+            f"SELECT 1 FROM {particion} h WHERE h.ruta_id IS NOT NULL AND NOT EXISTS "
+            f"(SELECT 1 FROM {TrayectoriaRuta.__tablename__} t "
+            f"WHERE t.ruta_id = h.ruta_id AND h.timestamp <= t.fin) "
+            f"LIMIT 1"
+        )).first() is not None
+
+
+def trayectoria_de_ruta(db: Session, ruta_id: int, tolerancia_metros: float) -> Optional[Dict]:
+    """
+    Recorrido de una ruta para repetirlo: la trayectoria comprimida si
+    existe; si no (ruta en curso), se arma al vuelo desde el historial
+    """
+    guardada = db.get(TrayectoriaRuta, ruta_id)
+    if guardada is not None:
+        columnas = {
+            columna.name: getattr(guardada, columna.name)
+            for columna in TrayectoriaRuta.__table__.columns
+            if columna.name not in ("created_at",)
+        }
+        return {"fuente": "comprimida", **trayectoria_a_dict(columnas)}
+
+    puntos = puntos_de_ruta(db, ruta_id)
+    if not puntos:
+        return None
+    return {
+        "fuente": "historial",
+        "ruta_id": ruta_id,
+        **trayectoria_a_dict(comprimir_trayectoria(puntos, tolerancia_metros))
+    }
@@ -0,0 +1,182 @@
+# app/services/tracking_ingest.py
+"""
+Ingesta de Posiciones GPS por Lotes
+Un lote trae puntos de muchos camiones: todos se guardan en
+tracking_historial con un INSERT en bloque (COPY en PostgreSQL para lotes
+grandes) y cada camión actualiza su última posición una sola vez, con el
+punto más reciente. Una transacción por lote, no por punto.
+Un ruta_id que no es de ese camión (inexistente o borrado) se reemplaza
+por su ruta en curso: un punto así no debe tumbar el lote por la clave foránea.
+"""
+
+from sqlalchemy import insert, update, select, bindparam, and_, or_
+from sqlalchemy.orm import Session
+from app.models import Camion, Ruta, TrackingHistorial, EstadoRuta
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import csv
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Puntos por lote aceptados en una llamada
+MAX_PUNTOS_LOTE = 5000
+
+# Desde cuántos puntos conviene COPY en lugar de INSERT (solo PostgreSQL)
+UMBRAL_COPY = 500
+
+COLUMNAS_PUNTO = (
+    "camion_id", "ruta_id", "lat", "lng", "timestamp",
+    "velocidad_kmh", "rumbo_grados", "precision_metros"
+)
+
+
+def hora_utc(momento: Optional[datetime]) -> datetime:
+    """Hora del punto sin zona (UTC, como el default de TrackingHistorial)"""
+    if momento is None:
+        return datetime.utcnow()
+    if momento.tzinfo is not None:
+        return momento.astimezone(timezone.utc).replace(tzinfo=None)
+    return momento
+
+
+class IngestaTracking:
+    """Guarda lotes de puntos GPS (dicts con las columnas de COLUMNAS_PUNTO)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def guardar(self, puntos: Iterable[Dict]) -> Dict:
+        """
+        Un INSERT (o COPY) de todos los puntos y un UPDATE por camión
+
+        Returns:
+            Conteo de puntos guardados, rechazados (camión inexistente) y
+            con ruta corregida (ruta_id ajeno al camión)
+        """
+        puntos = list(puntos)
+        if not puntos:
+            return {"guardados": 0, "rechazados": 0, "rutas_corregidas": 0, "camiones": 0}
+
+        existentes, propias = self._camiones_y_rutas(puntos)
+        en_curso = self._rutas_en_curso(existentes)
+
+        filas = []
+        corregidas = 0
+        for p in puntos:
+            if p["camion_id"] not in existentes:
+                continue
+            fila = {columna: p.get(columna) for columna in COLUMNAS_PUNTO}
+            fila["timestamp"] = hora_utc(p.get("timestamp"))
+            if fila["ruta_id"] is not None and (p["camion_id"], fila["ruta_id"]) not in propias:
+                fila["ruta_id"] = None
+                corregidas += 1
+            if fila["ruta_id"] is None:
+                fila["ruta_id"] = en_curso.get(p["camion_id"])
+            filas.append(fila)
+        if corregidas:
+            logger.warning(f"⚠️ {corregidas} puntos GPS con una ruta ajena al camión")
+
+        try:
+            if filas:
+                self._insertar(filas)
+                self._actualizar_ultimas(filas)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            logger.exception(f"❌ Error guardando lote de {len(filas)} puntos GPS")
+            raise
+
+        return {
+            "guardados": len(filas),
+            "rechazados": len(puntos) - len(filas),
+            "rutas_corregidas": corregidas,
+            "camiones": len(existentes)
+        }
+
+    def _camiones_y_rutas(self, puntos: List[Dict]) -> Tuple[Set[int], Set[Tuple[int, int]]]:
+        """
+        En una consulta: camiones existentes del lote y pares (camión, ruta)
+        válidos entre los ruta_id que trajeron los puntos
+        """
+        camiones = {p["camion_id"] for p in puntos}
+        rutas = {p["ruta_id"] for p in puntos if p.get("ruta_id") is not None}
+        existentes, propias = set(), set()
+        for camion_id, ruta_id in self.db.execute(
+            select(Camion.id, Ruta.id)
+            .outerjoin(Ruta, and_(Ruta.camion_id == Camion.id, Ruta.id.in_(rutas)))
+            .where(Camion.id.in_(camiones))
+        ):
+            existentes.add(camion_id)
+            if ruta_id is not None:
+                propias.add((camion_id, ruta_id))
+        return existentes, propias
+
+    def _rutas_en_curso(self, camiones: Iterable[int]) -> Dict[int, int]:
+        """Ruta en curso de cada camión (para asociar los puntos que no la traen)"""
+        return dict(self.db.execute(
+            select(Ruta.camion_id, Ruta.id).where(
+                Ruta.camion_id.in_(list(camiones)),
+                Ruta.estado == EstadoRuta.EN_CURSO
+            ).order_by(Ruta.id)
+        ).all())
+
+    def _insertar(self, filas: List[Dict]):
+        if len(filas) >= UMBRAL_COPY and self.db.get_bind().dialect.name == "postgresql":
+            self._copiar(filas)
+        else:
+            self.db.execute(insert(TrackingHistorial), filas)
+
+    def _copiar(self, filas: List[Dict]):
+        """COPY ... FROM STDIN en la misma transacción de la sesión"""
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in filas:
+            escritor.writerow(["" if fila[c] is None else fila[c] for c in COLUMNAS_PUNTO])
+        buffer.seek(0)
+
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {TrackingHistorial.__tablename__} ({', '.join(COLUMNAS_PUNTO)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+
+    def _actualizar_ultimas(self, filas: List[Dict]):
+        """
+        Última posición de cada camión con su punto más reciente del lote;
+        un lote atrasado no pisa una posición más nueva
+        """
+        ultimas: Dict[int, Dict] = {}
+        for fila in filas:
+            actual = ultimas.get(fila["camion_id"])
+            if actual is None or fila["timestamp"] >= actual["timestamp"]:
+                ultimas[fila["camion_id"]] = fila
+
+        tabla = Camion.__table__
+        self.db.execute(
+            update(tabla).where(
+                tabla.c.id == bindparam("b_id"),
+                or_(
+                    tabla.c.ultima_actualizacion.is_(None),
+                    tabla.c.ultima_actualizacion <= bindparam("b_momento")
+                )
+            ).values(
+                ultima_lat=bindparam("b_lat"),
+                ultima_lng=bindparam("b_lng"),
+                ultima_actualizacion=bindparam("b_momento")
+            ),
+            [
+                {
+                    "b_id": camion_id,
+                    "b_lat": fila["lat"],
+                    "b_lng": fila["lng"],
+                    "b_momento": fila["timestamp"]
+                }
+                for camion_id, fila in ultimas.items()
+            ]
+        )
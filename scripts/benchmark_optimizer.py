@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+'''
+Benchmark del optimizador de rutas con instancias sintéticas de Iquitos
+
+Genera días reproducibles (misma semilla = mismos datos) con 100, 1 000 y
+10 000 entregas repartidas en las zonas de la ciudad, con pesos, volúmenes,
+refrigeración y ventanas horarias, y ejecuta cada algoritmo disponible.
+Cada corrida se ejecuta en un proceso nuevo (sin caches calientes) y
+reporta tiempo, memoria pico (RSS), cantidad de consultas SQL, km totales,
+entregas asignadas y score promedio. Todo se guarda en JSON para comparar
+entre versiones.
+
+Uso (desde la raíz del repo):
+    python -m scripts.benchmark_optimizer
+    python -m scripts.benchmark_optimizer --tamanos 100 1000 --algoritmos greedy savings
+    python -m scripts.benchmark_optimizer --db postgresql://... --salida actual.json --comparar base.json
+
+Por defecto la base SQLite y los resultados quedan en benchmarks/ (fuera
+de git). La base indicada se borra y se vuelve a crear: no usar la de
+producción.
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, time as hora
+
+DIRECTORIO_SALIDA = "benchmarks"
+DB_POR_DEFECTO = f"sqlite:///{DIRECTORIO_SALIDA}/optimizador.db"
+TAMANOS_POR_DEFECTO = [100, 1000, 10000]
+
+# Zonas de Iquitos: centro aproximado y dispersión (grados) de sus clientes
+ZONAS_IQUITOS = [
+    {"nombre": "Centro", "lat": -3.7437, "lng": -73.2516, "radio": 0.006,
+     "factor_trafico": 1.4, "trafico_pico_manana": True, "trafico_pico_tarde": True},
+    {"nombre": "Punchana", "lat": -3.7260, "lng": -73.2430, "radio": 0.012,
+     "factor_trafico": 1.2, "trafico_pico_manana": True},
+    {"nombre": "Carretera Iquitos-Nauta", "lat": -3.8300, "lng": -73.3350, "radio": 0.040,
+     "factor_trafico": 1.0, "requiere_vehiculo_4x4": True, "problematico_lluvia": True},
+    {"nombre": "Belén", "lat": -3.7620, "lng": -73.2480, "radio": 0.008,
+     "factor_trafico": 1.3, "problematico_lluvia": True},
+    {"nombre": "San Juan", "lat": -3.7930, "lng": -73.2850, "radio": 0.015,
+     "factor_trafico": 1.1, "trafico_pico_tarde": True},
+    {"nombre": "Moronacocha", "lat": -3.7520, "lng": -73.2720, "radio": 0.010,
+     "factor_trafico": 1.1},
+    {"nombre": "Av. La Marina", "lat": -3.7330, "lng": -73.2470, "radio": 0.008,
+     "factor_trafico": 1.2, "trafico_pico_manana": True},
+    {"nombre": "Aeropuerto", "lat": -3.7830, "lng": -73.3000, "radio": 0.012,
+     "factor_trafico": 1.0},
+]
+
+# Ventanas horarias posibles (None = sin restricción)
+VENTANAS = [None, None, None, (hora(8, 0), hora(12, 0)), (hora(14, 0), hora(18, 0)), (hora(9, 0), hora(13, 0))]
+
+# Entregas por camión al dimensionar la flota
+ENTREGAS_POR_CAMION = 20
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark del optimizador de rutas")
+    parser.add_argument("--db", default=os.getenv("BENCHMARK_DATABASE_URL", DB_POR_DEFECTO),
+                        help="URL de la base de benchmark (se recrea)")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS_POR_DEFECTO,
+                        help="Cantidades de entregas a generar")
+    parser.add_argument("--algoritmos", nargs="+", default=None,
+                        help="Algoritmos a ejecutar (por defecto todos los disponibles)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default=os.path.join(DIRECTORIO_SALIDA, "resultados.json"))
+    parser.add_argument("--comparar", default=None,
+                        help="JSON de una corrida anterior para mostrar diferencias")
+    # Uso interno: ejecuta un solo algoritmo sobre la instancia ya generada
+    parser.add_argument("--corrida", default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+# ========== GENERACIÓN DE DATOS ==========
+
+def generar_instancia(db, n_entregas: int, semilla: int, fecha: date):
+    """Recrea las tablas y genera zonas, flota, clientes y entregas del día"""
+    from sqlalchemy import insert
+    from app.database import Base, engine
+    from app.models import (
+        Zona, Chofer, Camion, Cliente, Entrega, ParametrosOptimizacion,
+        EstadoEntrega, EstadoMecanico
+    )
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(semilla)
+
+    db.execute(insert(Zona), [
+        {k: v for k, v in z.items() if k not in ("lat", "lng", "radio")}
+        for z in ZONAS_IQUITOS
+    ])
+
+    n_camiones = max(10, n_entregas // ENTREGAS_POR_CAMION)
+    db.execute(insert(Chofer), [
+        {
+            "nombre": f"Chofer {i}", "apellido": "Benchmark", "dni": f"{i:08d}",
+            "apto_caminos_dificiles": rnd.random() < 0.3,
+            "horario_inicio": hora(7, 0), "horario_fin": hora(19, 0)
+        }
+        for i in range(1, n_camiones + 1)
+    ])
+    db.execute(insert(Camion), [
+        {
+            "placa": f"BEN-{i:04d}", "chofer_id": i,
+            "capacidad_peso_kg": rnd.choice([1500, 2500, 3500, 5000]),
+            "capacidad_volumen_m3": rnd.choice([8.0, 12.0, 18.0, 25.0]),
+            "velocidad_promedio_kmh": rnd.uniform(25, 40),
+            "tiene_refrigeracion": rnd.random() < 0.2,
+            "apto_caminos_adversos": rnd.random() < 0.3,
+            "apto_lluvia_fuerte": rnd.random() < 0.7,
+            "estado_mecanico": EstadoMecanico.BUENO,
+            "en_ruta": False
+        }
+        for i in range(1, n_camiones + 1)
+    ])
+
+    # Clientes concentrados alrededor del centro de cada zona
+    n_clientes = max(1, n_entregas // 3)
+    clientes = []
+    for i in range(n_clientes):
+        zona_id = rnd.randrange(len(ZONAS_IQUITOS)) + 1
+        zona = ZONAS_IQUITOS[zona_id - 1]
+        ventana = rnd.choice(VENTANAS)
+        clientes.append({
+            "nombre": f"Cliente {i}", "direccion": f"Calle {i}", "zona_id": zona_id,
+            "lat": rnd.gauss(zona["lat"], zona["radio"]),
+            "lng": rnd.gauss(zona["lng"], zona["radio"]),
+            "horario_atencion_inicio": ventana[0] if ventana else None,
+            "horario_atencion_fin": ventana[1] if ventana else None,
+            "tiempo_descarga_estimado_min": rnd.choice([10, 15, 20, 25])
+        })
+    db.execute(insert(Cliente), clientes)
+
+    entregas = []
+    for i in range(n_entregas):
+        cliente_id = rnd.randrange(n_clientes) + 1
+        ventana = rnd.choice(VENTANAS) if rnd.random() < 0.2 else None
+        entregas.append({
+            "numero_factura": f"B{semilla}-{i:06d}",
+            "fecha_factura": fecha,
+            "cliente_id": cliente_id,
+            "zona_id": clientes[cliente_id - 1]["zona_id"],
+            "peso_total_kg": round(min(rnd.lognormvariate(3.5, 0.8), 900), 1),
+            "volumen_total_m3": round(rnd.uniform(0.02, 0.8), 3),
+            "requiere_refrigeracion": rnd.random() < 0.08,
+            "monto_total": round(rnd.uniform(50, 3000), 2),
+            "prioridad": rnd.randint(1, 10),
+            "es_urgente": rnd.random() < 0.05,
+            "horario_entrega_desde": ventana[0] if ventana else None,
+            "horario_entrega_hasta": ventana[1] if ventana else None,
+            "tiempo_estimado_entrega_min": clientes[cliente_id - 1]["tiempo_descarga_estimado_min"],
+            "estado": EstadoEntrega.PENDIENTE
+        })
+    db.execute(insert(Entrega), entregas)
+
+    db.add(ParametrosOptimizacion(nombre="Benchmark", activo=True))
+    db.commit()
+    return n_camiones
+
+
+def reiniciar_dia(db):
+    """Deja todas las entregas pendientes y vacía rutas y cache de distancias"""
+    from sqlalchemy import delete, update
+    from app.models import Ruta, Entrega, MatrizDistancia, EstadoEntrega
+    from app.services.distance_cache import _lru
+
+    db.execute(update(Entrega).values(
+        estado=EstadoEntrega.PENDIENTE, ruta_id=None, orden_en_ruta=None, fecha_asignacion=None
+    ))
+    db.execute(delete(Ruta))
+    db.execute(delete(MatrizDistancia))
+    db.commit()
+    _lru.limpiar()
+
+
+# ========== MEDICIÓN ==========
+
+class ContadorConsultas:
+    """Cuenta las sentencias enviadas a la BD (un executemany cuenta como una)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+
+def memoria_pico_mb() -> float:
+    """Pico de memoria residente del proceso actual"""
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes
+    return pico / 2**20 if sys.platform == "darwin" else pico / 2**10
+
+
+def ejecutar(db, contador, algoritmo, fecha: date) -> dict:
+    from app.models import ParametrosOptimizacion, AlgoritmoOptimizacion
+    from app.services.route_optimizer import RouteOptimizer
+
+    params = db.query(ParametrosOptimizacion).filter(ParametrosOptimizacion.activo == True).first()
+    params.algoritmo_preferido = AlgoritmoOptimizacion(algoritmo)
+    db.commit()
+    db.expire_all()
+
+    consultas_inicio = contador.total
+    inicio = time.perf_counter()
+
+    rutas = RouteOptimizer(db).optimizar_dia(fecha)
+
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "algoritmo": algoritmo,
+        "segundos": round(segundos, 3),
+        "memoria_pico_mb": round(memoria_pico_mb(), 1),
+        "consultas": contador.total - consultas_inicio,
+        "rutas": len(rutas),
+        "entregas_asignadas": sum(r.cantidad_entregas for r in rutas),
+        "km_total": round(sum(r.distancia_total_km for r in rutas), 2),
+        "score_promedio": round(
+            sum(r.score_optimizacion for r in rutas) / len(rutas), 1
+        ) if rutas else 0.0
+    }
+
+
+def ejecutar_en_proceso(args, algoritmo: str) -> dict:
+    """Corre un algoritmo en un proceso aparte y lee su resultado (última línea)"""
+    proceso = subprocess.run(
+        [sys.executable, "-m", "scripts.benchmark_optimizer",
+         "--db", args.db, "--corrida", algoritmo],
+        capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"Falló la corrida {algoritmo}:\n{proceso.stderr[-2000:]}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def version_codigo() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "desconocida"
+
+
+def comparar(resultados: list, ruta_anterior: str):
+    with open(ruta_anterior, encoding="utf-8") as f:
+        anteriores = {
+            (r["entregas"], r["algoritmo"]): r for r in json.load(f)["resultados"]
+        }
+
+    print(f"\nComparación contra {ruta_anterior}:")
+    for r in resultados:
+        previo = anteriores.get((r["entregas"], r["algoritmo"]))
+        if not previo:
+            continue
+        print(
+            f"  {r['entregas']:>6} {r['algoritmo']:<8} "
+            f"tiempo x{r['segundos'] / max(previo['segundos'], 1e-9):.2f}  "
+            f"memoria x{r['memoria_pico_mb'] / max(previo['memoria_pico_mb'], 1e-9):.2f}  "
+            f"consultas {previo['consultas']} -> {r['consultas']}  "
+            f"km {previo['km_total']} -> {r['km_total']}  "
+            f"score {previo['score_promedio']} -> {r['score_promedio']}"
+        )
+
+
+def main():
+    args = parse_args()
+    os.makedirs(DIRECTORIO_SALIDA, exist_ok=True)
+
+    # La app lee DATABASE_URL al importarse
+    os.environ["DATABASE_URL"] = args.db
+    from app.database import SessionLocal, engine
+    from app.services.route_optimizer import RouteOptimizer
+
+    fecha = date.today()
+
+    if args.corrida:
+        db = SessionLocal()
+        try:
+            resultado = ejecutar(db, ContadorConsultas(engine), args.corrida, fecha)
+        finally:
+            db.close()
+        print(json.dumps(resultado))
+        return
+
+    algoritmos = args.algoritmos or [a.value for a in RouteOptimizer.ALGORITMOS_DISPONIBLES]
+    resultados = []
+
+    for n in args.tamanos:
+        db = SessionLocal()
+        try:
+            print(f"Generando instancia de {n} entregas...")
+            n_camiones = generar_instancia(db, n, args.semilla, fecha)
+
+            for algoritmo in algoritmos:
+                reiniciar_dia(db)
+                print(f"  {algoritmo}...", flush=True)
+                resultado = ejecutar_en_proceso(args, algoritmo)
+                resultado.update(entregas=n, camiones=n_camiones)
+                resultados.append(resultado)
+                print(
+                    f"  {n:>6} {algoritmo:<8} {resultado['segundos']:>8.2f}s "
+                    f"{resultado['memoria_pico_mb']:>8.1f} MB {resultado['consultas']:>5} consultas "
+                    f"{resultado['entregas_asignadas']:>6} entregas {resultado['km_total']:>10.1f} km "
+                    f"score {resultado['score_promedio']}"
+                )
+        finally:
+            db.close()
+
+    salida = {
+        "version": version_codigo(),
+        "fecha_ejecucion": datetime.now().isoformat(timespec="seconds"),
+        "semilla": args.semilla,
+        "base_datos": engine.url.get_backend_name(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "resultados": resultados
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
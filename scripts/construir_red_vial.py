@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Construye la red vial local a partir de un extracto de OpenStreetMap
+
+Convierte las calles transitables en un grafo dirigido (sentido único,
+rotondas y velocidad por tipo de vía), lo preprocesa con jerarquías de
+contracción y lo guarda como .npz para MotorRedVial.
+
+El extracto debe estar en XML (.osm, opcionalmente .bz2/.gz). Un .pbf se
+convierte antes con: osmium cat iquitos.osm.pbf -o iquitos.osm
+
+Uso:
+    python -m scripts.construir_red_vial iquitos.osm --salida data/red_vial.npz
+    # Luego: RED_VIAL_ARCHIVO=data/red_vial.npz
+"""
+
+from app.services.distance_matrix import haversine_pares_km
+from app.services.road_network import RedVial
+from typing import Dict, List, Optional
+import xml.etree.ElementTree as ET
+import numpy as np
+import argparse
+import bz2
+import gzip
+import os
+import re
+import time
+
+# Velocidad típica (km/h) por tipo de vía; las que no figuran se descartan
+VELOCIDAD_POR_VIA = {
+    "motorway": 60, "trunk": 50, "primary": 40, "secondary": 35,
+    "tertiary": 30, "unclassified": 25, "residential": 20,
+    "living_street": 10, "service": 15, "track": 10,
+    "motorway_link": 40, "trunk_link": 35, "primary_link": 30,
+    "secondary_link": 25, "tertiary_link": 20,
+}
+
+
+def abrir(ruta: str):
+    if ruta.endswith(".bz2"):
+        return bz2.open(ruta, "rb")
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "rb")
+    return open(ruta, "rb")
+
+
+def velocidad(etiquetas: Dict[str, str]) -> Optional[float]:
+    """Velocidad de la vía (maxspeed si existe), o None si no es transitable"""
+    base = VELOCIDAD_POR_VIA.get(etiquetas.get("highway", ""))
+    if base is None or etiquetas.get("access") in ("no", "private"):
+        return None
+    maxima = re.match(r"\d+", etiquetas.get("maxspeed", ""))
+    return min(base, float(maxima.group())) if maxima else float(base)
+
+
+def sentido(etiquetas: Dict[str, str]) -> int:
+    """1 = solo ida, -1 = solo en contra del dibujo, 0 = doble sentido"""
+    oneway = etiquetas.get("oneway", "")
+    if oneway in ("yes", "true", "1") or etiquetas.get("junction") == "roundabout":
+        return 1
+    if oneway == "-1":
+        return -1
+    return 0
+
+
+def leer_osm(ruta: str):
+    """Nodos usados por vías transitables y aristas dirigidas entre ellos"""
+    coordenadas: Dict[int, tuple] = {}
+    vias: List[tuple] = []
+
+    with abrir(ruta) as archivo:
+        for _, elemento in ET.iterparse(archivo, events=("end",)):
+            if elemento.tag == "node":
+                coordenadas[int(elemento.get("id"))] = (
+                    float(elemento.get("lat")), float(elemento.get("lon"))
+                )
+            elif elemento.tag == "way":
+                etiquetas = {t.get("k"): t.get("v") for t in elemento.iter("tag")}
+                kmh = velocidad(etiquetas)
+                if kmh is not None:
+                    nodos = [int(nd.get("ref")) for nd in elemento.iter("nd")]
+                    vias.append((nodos, kmh, sentido(etiquetas)))
+            if elemento.tag in ("node", "way", "relation"):
+                elemento.clear()
+
+    indice: Dict[int, int] = {}
+    origen, destino, velocidades = [], [], []
+    for nodos, kmh, direccion in vias:
+        nodos = [n for n in nodos if n in coordenadas]
+        for a, b in zip(nodos, nodos[1:]):
+            ia = indice.setdefault(a, len(indice))
+            ib = indice.setdefault(b, len(indice))
+            if direccion >= 0:
+                origen.append(ia)
+                destino.append(ib)
+                velocidades.append(kmh)
+            if direccion <= 0:
+                origen.append(ib)
+                destino.append(ia)
+                velocidades.append(kmh)
+
+    puntos = np.array([coordenadas[n] for n in indice], dtype=np.float64).reshape(-1, 2)
+    origen = np.asarray(origen, dtype=np.int64)
+    destino = np.asarray(destino, dtype=np.int64)
+    km = haversine_pares_km(puntos[origen], puntos[destino])
+    minutos = km / np.asarray(velocidades, dtype=np.float64) * 60
+    return puntos, origen, destino, minutos, km
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye la red vial local (CH)")
+    parser.add_argument("osm", help="Extracto OSM en XML (.osm, .osm.bz2, .osm.gz)")
+    parser.add_argument("--salida", default="data/red_vial.npz")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    puntos, origen, destino, minutos, km = leer_osm(args.osm)
+    print(f"Grafo: {len(puntos)} nodos, {len(origen)} aristas "
+          f"({time.perf_counter() - inicio:.1f}s)")
+
+    inicio = time.perf_counter()
+    red = RedVial.construir(puntos[:, 0], puntos[:, 1], origen, destino, minutos, km)
+    print(f"Jerarquía de contracción lista ({time.perf_counter() - inicio:.1f}s)")
+
+    os.makedirs(os.path.dirname(args.salida) or ".", exist_ok=True)
+    red.guardar(args.salida)
+    print(f"Red guardada en {args.salida}")
+    print("matriz_distancias guarda los pares por motor: con RED_VIAL_ARCHIVO apuntando "
+          "a esta red no se reutilizan las distancias Haversine")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Precalcula la matriz almacén + clientes para el optimizador
+
+Pensado para correr de noche (cron o tarea programada): calcula km y
+minutos entre el almacén y todos los clientes con ubicación y publica el
+archivo memmap que comparten los workers. Los clientes dados de alta o
+movidos durante el día se calculan al vuelo hasta la siguiente corrida.
+Al activar o cambiar RED_VIAL_ARCHIVO hay que volver a correrlo: mientras
+tanto la matriz, calculada con otro motor, se ignora.
+
+Uso:
+    python -m scripts.precalcular_matriz --directorio data/matriz
+    # Luego: MATRIZ_PRECALCULADA_DIR=data/matriz
+"""
+
+from app.database import SessionLocal
+from app.config import settings
+from app.services.matrix_store import construir_matriz
+from app.services.route_optimizer import RouteOptimizer
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precalcula la matriz almacén + clientes")
+    parser.add_argument(
+        "--directorio", default=settings.MATRIZ_PRECALCULADA_DIR or "data/matriz"
+    )
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        clientes = construir_matriz(
+            db, args.directorio, (RouteOptimizer.ALMACEN_LAT, RouteOptimizer.ALMACEN_LNG)
+        )
+    finally:
+        db.close()
+    print(f"Matriz de {clientes} clientes en {args.directorio} "
+          f"({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
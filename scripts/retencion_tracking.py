@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Retención del historial de tracking
+
+Pensado para correr de noche (cron o tarea programada): comprime el
+recorrido de las rutas terminadas en trayectorias_ruta, borra los puntos
+crudos más viejos que TRACKING_RETENCION_DIAS y, si la tabla está
+particionada, crea las particiones de los próximos meses.
+
+Uso:
+    python -m scripts.retencion_tracking
+    python -m scripts.retencion_tracking --dias 60 --tolerancia 5
+    # Una sola vez, en PostgreSQL: particionar tracking_historial por mes
+    python -m scripts.retencion_tracking --particionar
+"""
+
+from app.database import SessionLocal, engine, Base
+from app.config import settings
+from app.services.track_retention import RetencionTracking, particionar_historial
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprime y poda el historial de tracking")
+    parser.add_argument("--dias", type=int, default=settings.TRACKING_RETENCION_DIAS)
+    parser.add_argument("--tolerancia", type=float, default=settings.TRACKING_TOLERANCIA_METROS)
+    parser.add_argument(
+        "--particionar", action="store_true",
+        help="Convierte tracking_historial en una tabla particionada por mes (PostgreSQL)"
+    )
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        if args.particionar:
+            copiados = particionar_historial(db)
+            print(f"tracking_historial particionada ({copiados} puntos copiados); "
+                  f"borrar tracking_historial_sin_particion tras verificar")
+        resultado = RetencionTracking(db, args.dias, args.tolerancia).ejecutar()
+    finally:
+        db.close()
+    print(f"{resultado['rutas_comprimidas']} rutas comprimidas, "
+          f"{resultado['puntos_podados']} puntos borrados, "
+          f"{resultado['particiones']} particiones nuevas "
+          f"({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
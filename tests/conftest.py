@@ -0,0 +1,85 @@
+"""
+Configuración común de las pruebas
+Cada prueba usa una base SQLite temporal vacía: DATABASE_URL se fija antes
+de importar la app porque app.database crea el engine al importarse
+"""
+
+import os
+import tempfile
+
+_directorio = tempfile.mkdtemp(prefix="camiones-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directorio, 'pruebas.db')}"
+os.environ.pop("RED_VIAL_ARCHIVO", None)
+os.environ.pop("MATRIZ_PRECALCULADA_DIR", None)
+
+import pytest
+
+from app.database import Base, SessionLocal, engine
+from app import models  # noqa: F401  (registra las tablas en Base)
+from app.services.distance_cache import _lru
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    _lru.limpiar()
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def dia(db):
+    """
+    Día chico y reproducible en Iquitos: 4 camiones, 40 entregas pendientes
+    (algunas con ventana horaria o refrigeración) y parámetros activos
+    Returns: fecha de facturación de las entregas
+    """
+    from datetime import date, time
+    import random
+
+    rnd = random.Random(7)
+    zonas = [models.Zona(nombre=f"Zona {i}", factor_trafico=1 + 0.1 * i) for i in range(4)]
+    db.add_all(zonas)
+    db.flush()
+    choferes = [models.Chofer(nombre=f"Chofer {i}", apellido="Prueba", dni=f"{i:08d}") for i in range(4)]
+    db.add_all(choferes)
+    db.flush()
+    db.add_all([
+        models.Camion(
+            placa=f"ABC-{i:03d}", chofer_id=choferes[i].id,
+            capacidad_peso_kg=800 + 200 * i, capacidad_volumen_m3=8,
+            tiene_refrigeracion=i == 0, estado_mecanico=models.EstadoMecanico.BUENO
+        )
+        for i in range(4)
+    ])
+    clientes = [
+        models.Cliente(
+            nombre=f"Cliente {i}", direccion="Iquitos", zona_id=zonas[i % 4].id,
+            lat=-3.749 + rnd.uniform(-0.03, 0.03), lng=-73.253 + rnd.uniform(-0.03, 0.03)
+        )
+        for i in range(30)
+    ]
+    db.add_all(clientes)
+    db.flush()
+
+    fecha = date.today()
+    entregas = []
+    for i in range(40):
+        cliente = clientes[i % len(clientes)]
+        ventana = i % 5 == 0
+        entregas.append(models.Entrega(
+            numero_factura=f"F-{i:04d}", fecha_factura=fecha,
+            cliente_id=cliente.id, zona_id=cliente.zona_id,
+            peso_total_kg=rnd.uniform(10, 90), volumen_total_m3=rnd.uniform(0.05, 0.3),
+            requiere_refrigeracion=i % 13 == 0, prioridad=rnd.randint(1, 10), monto_total=100,
+            horario_entrega_desde=time(9, 0) if ventana else None,
+            horario_entrega_hasta=time(13, 0) if ventana else None
+        ))
+    db.add_all(entregas)
+    db.add(models.ParametrosOptimizacion(nombre="Pruebas", activo=True))
+    db.commit()
+    return fecha
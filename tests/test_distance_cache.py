@@ -0,0 +1,106 @@
+from sqlalchemy import func
+
+from app.models import MatrizDistancia
+from app.services.distance_cache import (
+    ProveedorDistancias, _lru, insertar_ignorando_repetidos
+)
+from app.services.distance_matrix import MotorHaversine
+
+PUNTOS = [(-3.7480, -73.2530), (-3.7520, -73.2460), (-3.7390, -73.2610), (-3.7600, -73.2500)]
+PARES = len(PUNTOS) * (len(PUNTOS) - 1)
+
+
+class MotorContado(MotorHaversine):
+    """Haversine que cuenta los pares que se le piden"""
+
+    def __init__(self):
+        self.pares = 0
+
+    def calcular(self, origenes, destinos):
+        self.pares += len(origenes) * len(destinos)
+        return super().calcular(origenes, destinos)
+
+
+def filas(db):
+    return db.query(func.count(MatrizDistancia.id)).scalar()
+
+
+def test_fallo_calcula_y_guarda_en_la_transaccion_del_llamador(db):
+    motor = MotorContado()
+    km, minutos = ProveedorDistancias(db, motor).matriz(PUNTOS)
+
+    assert motor.pares > 0
+    assert km.shape == minutos.shape == (len(PUNTOS), len(PUNTOS))
+    assert filas(db) == PARES
+
+    # El proveedor no confirma: un rollback del llamador descarta las filas
+    db.rollback()
+    assert filas(db) == 0
+
+
+def test_acierto_en_bd_y_en_lru(db):
+    esperado, _ = ProveedorDistancias(db, MotorHaversine()).matriz(PUNTOS)
+    db.commit()
+
+    # Sin LRU: todos los pares salen de matriz_distancias
+    _lru.limpiar()
+    motor = MotorContado()
+    km, _ = ProveedorDistancias(db, motor).matriz(PUNTOS)
+    db.commit()
+    assert motor.pares == 0
+    assert (km == esperado).all()
+    assert db.query(func.sum(MatrizDistancia.hits)).scalar() == PARES
+
+    # Con LRU: ni motor ni hits nuevos en la BD
+    km, _ = ProveedorDistancias(db, motor).matriz(PUNTOS)
+    db.commit()
+    assert motor.pares == 0
+    assert (km == esperado).all()
+    assert db.query(func.sum(MatrizDistancia.hits)).scalar() == PARES
+
+
+def test_puntos_repetidos_se_calculan_una_vez(db):
+    motor = MotorContado()
+    km, _ = ProveedorDistancias(db, motor).matriz(PUNTOS + PUNTOS[:2])
+    assert km.shape == (len(PUNTOS) + 2, len(PUNTOS) + 2)
+    assert km[0, 1] == km[len(PUNTOS), len(PUNTOS) + 1]
+    assert filas(db) == PARES
+
+
+def test_par_guardado_por_otra_sesion_se_ignora(db):
+    fila = {
+        "origen_lat": PUNTOS[0][0], "origen_lng": PUNTOS[0][1],
+        "destino_lat": PUNTOS[1][0], "destino_lng": PUNTOS[1][1],
+        "motor": "haversine", "distancia_km": 1.0, "tiempo_min": 2, "hits": 0
+    }
+    insertar_ignorando_repetidos(db, [fila])
+    insertar_ignorando_repetidos(db, [fila, dict(fila, destino_lat=PUNTOS[2][0])])
+    db.commit()
+    assert filas(db) == 2
+
+
+class MotorRecto(MotorContado):
+    """Otro motor con otros resultados (sin factor de corrección)"""
+
+    nombre = "recto"
+
+    def calcular(self, origenes, destinos):
+        km, minutos = super().calcular(origenes, destinos)
+        return km / 1.3, minutos / 1.3
+
+
+def test_el_cache_es_por_motor(db):
+    haversine, _ = ProveedorDistancias(db, MotorHaversine()).matriz(PUNTOS)
+    db.commit()
+
+    otro = MotorRecto()
+    km, _ = ProveedorDistancias(db, otro).matriz(PUNTOS)
+    db.commit()
+    assert otro.pares > 0
+    assert km[0, 1] < haversine[0, 1]
+    assert filas(db) == 2 * PARES
+
+    # Cada motor vuelve a encontrar sus propios pares
+    _lru.limpiar()
+    km, _ = ProveedorDistancias(db, MotorHaversine()).matriz(PUNTOS)
+    assert (km == haversine).all()
@@ -0,0 +1,78 @@
+"""
+ETAs en vivo: carga de tramos fuera del candado y hora de ZONA_HORARIA
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Entrega, Ruta
+from app.services.live_eta import MotorEta, hora_local
+from app.services.route_optimizer import RouteOptimizer
+
+
+@pytest.fixture
+def ruta(db, dia):
+    rutas = RouteOptimizer(db).optimizar_dia(dia)
+    assert rutas
+    return rutas[0]
+
+
+def posicion(ruta, momento):
+    return {
+        "camion_id": ruta.camion_id, "ruta_id": ruta.id,
+        "lat": -3.749, "lng": -73.253, "momento": momento.isoformat()
+    }
+
+
+def test_hora_local_usa_la_zona_configurada_y_no_la_del_servidor():
+    local = hora_local(datetime(2026, 10, 17, 14, 0, 0))
+    assert (local.hour, local.minute) == (9, 0)  # America/Lima, UTC-5
+    assert local.utcoffset() == timedelta(hours=-5)
+
+
+def test_los_tramos_se_cargan_sin_el_candado(db, ruta):
+    motor = MotorEta(radio_llegada_metros=100)
+    cargar = motor._cargar
+    candado_tomado = []
+
+    def cargar_espiando(ruta_id, visitadas):
+        candado_tomado.append(motor._candado.locked())
+        return cargar(ruta_id, visitadas)
+
+    motor._cargar = cargar_espiando
+    eta = motor.actualizar(posicion(ruta, datetime(2026, 10, 17, 14, 0, 0)))
+
+    assert candado_tomado == [False]
+    assert eta["ruta_id"] == ruta.id
+    assert eta["calculado_con"] == "2026-10-17T09:00:00-05:00"
+    pendientes = db.query(Entrega).filter(Entrega.ruta_id == ruta.id).count()
+    assert eta["paradas_pendientes"] == pendientes
+    assert all(e["eta"].endswith("-05:00") for e in eta["entregas"])
+
+    # Sin invalidar no se vuelve a cargar
+    motor.actualizar(posicion(ruta, datetime(2026, 10, 17, 14, 1, 0)))
+    assert candado_tomado == [False]
+
+    motor.invalidar([ruta.id])
+    motor.actualizar(posicion(ruta, datetime(2026, 10, 17, 14, 2, 0)))
+    assert candado_tomado == [False, False]
+
+
+def test_ruta_inexistente_no_tiene_etas(db, ruta):
+    motor = MotorEta(radio_llegada_metros=100)
+    estado = posicion(ruta, datetime(2026, 10, 17, 14, 0, 0))
+    estado["ruta_id"] = db.query(Ruta.id).count() + 100
+    assert motor.actualizar(estado) is None
+
+
+def test_camion_sin_ruta_olvida_las_etas_de_la_anterior(db, ruta):
+    motor = MotorEta(radio_llegada_metros=100)
+    assert motor.actualizar(posicion(ruta, datetime(2026, 10, 17, 14, 0, 0))) is not None
+    assert [eta["ruta_id"] for eta in motor.todas()] == [ruta.id]
+
+    # /resetear-rutas borró la ruta: el estado en vivo del camión queda sin ruta
+    motor.invalidar()
+    estado = dict(posicion(ruta, datetime(2026, 10, 17, 14, 1, 0)), ruta_id=None)
+    assert motor.actualizar(estado) is None
+    assert motor.todas() == []
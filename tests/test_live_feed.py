@@ -0,0 +1,29 @@
+"""
+Canal en vivo: las estadísticas se comparten entre consultas
+"""
+
+from app.services import live_feed
+from app.services.live_feed import PublicadorFlota
+
+
+def test_estadisticas_se_recalculan_cada_estadisticas_segundos(db, dia, monkeypatch):
+    calculos = []
+    original = live_feed.estadisticas_del_dia
+
+    def contar(db, *args):
+        calculos.append(1)
+        return original(db, *args)
+
+    monkeypatch.setattr(live_feed, "estadisticas_del_dia", contar)
+    publicador = PublicadorFlota(intervalo_segundos=0.0, estadisticas_segundos=3600)
+
+    primeras = publicador.estadisticas()
+    for _ in range(5):
+        assert publicador.estadisticas() == primeras
+    assert len(calculos) == 1
+    assert primeras["entregas_total"] == 40
+
+    # Un cambio de entregas sí fuerza el recálculo
+    publicador.invalidar_estadisticas()
+    publicador.estadisticas()
+    assert len(calculos) == 2
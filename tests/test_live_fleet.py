@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Camion, TrackingHistorial
+from app.services.live_fleet import FlotaEnVivo
+
+
+@pytest.fixture
+def camion_id(db, dia):
+    return db.query(Camion.id).order_by(Camion.id).first()[0]
+
+
+def pings(camion_id, cantidad, cada_segundos=2):
+    inicio = datetime(2026, 10, 17, 14, 0, 0)
+    return [
+        {
+            "camion_id": camion_id, "lat": -3.749 + i * 1e-4, "lng": -73.253,
+            "timestamp": inicio + timedelta(seconds=i * cada_segundos)
+        }
+        for i in range(cantidad)
+    ]
+
+
+def test_sin_muestreo_todo_punto_aceptado_llega_al_historial(db, camion_id):
+    flota = FlotaEnVivo(intervalo_segundos=3600, muestreo_segundos=0)
+    try:
+        resultado = flota.registrar(pings(camion_id, 30) + [{"camion_id": 999, "lat": 0, "lng": 0}])
+        assert resultado == {"aceptados": 30, "rechazados": 1, "al_historial": 30}
+        assert flota.volcar() == 30
+    finally:
+        flota.detener()
+    assert db.query(TrackingHistorial).count() == 30
+    assert flota.obtener(camion_id)["lat"] == pytest.approx(-3.749 + 29 * 1e-4)
+
+
+def test_muestreo_configurado_se_informa(db, camion_id):
+    flota = FlotaEnVivo(intervalo_segundos=3600, muestreo_segundos=10)
+    try:
+        resultado = flota.registrar(pings(camion_id, 30))
+        # Un punto cada 10 s de 60 s de pings cada 2 s
+        assert resultado == {"aceptados": 30, "rechazados": 0, "al_historial": 6}
+    finally:
+        flota.detener()
+    assert db.query(TrackingHistorial).count() == 6
+
+
+def test_entrega_completada_avanza_el_progreso(db, camion_id):
+    flota = FlotaEnVivo(intervalo_segundos=3600, muestreo_segundos=0)
+    try:
+        flota.iniciar_ruta(camion_id, ruta_id=1, entregas_total=2)
+        flota.cambios()
+        for _ in range(3):
+            flota.entrega_completada(camion_id)
+        assert flota.obtener(camion_id)["entregas_completadas"] == 2
+        assert [c["camion_id"] for c in flota.cambios()] == [camion_id]
+    finally:
+        flota.detener()
+
+
+def test_una_fila_invalida_no_traba_el_volcado(db, camion_id):
+    flota = FlotaEnVivo(intervalo_segundos=3600, muestreo_segundos=0)
+    try:
+        invalido = dict(pings(camion_id, 1)[0], lat=None, timestamp=datetime(2026, 10, 17, 13, 0, 0))
+        flota.registrar(pings(camion_id, 20) + [invalido] + pings(camion_id, 1))
+        assert flota.volcar() == 21
+        assert flota.invalidos == 1
+        assert flota.volcar() == 0  # No quedó nada en cola para reintentar
+    finally:
+        flota.detener()
+    assert db.query(TrackingHistorial).count() == 21
+
+
+def test_rutas_eliminadas_limpian_el_estado_en_vivo(db, camion_id):
+    flota = FlotaEnVivo(intervalo_segundos=3600, muestreo_segundos=0)
+    try:
+        flota.iniciar_ruta(camion_id, ruta_id=1, entregas_total=5)
+        flota.entrega_completada(camion_id)
+        flota.cambios()
+        flota.rutas_eliminadas([1])
+        estado = flota.obtener(camion_id)
+        assert (estado["ruta_id"], estado["entregas_total"], estado["entregas_completadas"]) == (None, 0, 0)
+        assert [c["camion_id"] for c in flota.cambios()] == [camion_id]
+    finally:
+        flota.detener()
@@ -0,0 +1,62 @@
+"""
+Matriz precalculada: solo se usa con el motor que la calculó
+"""
+
+import numpy as np
+
+from app.models import Cliente
+from app.services.distance_matrix import MotorHaversine
+from app.services.matrix_store import ARCHIVO_INDICE, abrir_matriz, construir_matriz
+from app.services.route_optimizer import RouteOptimizer
+
+ALMACEN = (RouteOptimizer.ALMACEN_LAT, RouteOptimizer.ALMACEN_LNG)
+
+
+class OtroMotor(MotorHaversine):
+    """Otro motor (como la red vial) con distancias distintas"""
+
+    nombre = "red_vial"
+
+    def calcular(self, origenes, destinos):
+        km, minutos = super().calcular(origenes, destinos)
+        return km * 2, minutos * 2
+
+
+def clientes_del_dia(db):
+    return [(c.id, c.lat, c.lng) for c in db.query(Cliente).order_by(Cliente.id).limit(5)]
+
+
+def test_matriz_del_mismo_motor_se_usa(db, dia, tmp_path):
+    motor = MotorHaversine()
+    assert construir_matriz(db, str(tmp_path), ALMACEN, motor) == db.query(Cliente).count()
+
+    matriz = abrir_matriz(str(tmp_path), motor)
+    assert matriz is not None and matriz.motor == motor.nombre
+
+    clientes = clientes_del_dia(db)
+    km, _ = matriz.submatriz(ALMACEN, clientes, motor)
+    puntos = np.array([ALMACEN] + [(lat, lng) for _, lat, lng in clientes])
+    assert np.allclose(km, motor.calcular(puntos, puntos)[0], atol=1e-3)
+
+
+def test_matriz_de_otro_motor_se_ignora(db, dia, tmp_path):
+    construir_matriz(db, str(tmp_path), ALMACEN, MotorHaversine())
+    otro = OtroMotor()
+    assert abrir_matriz(str(tmp_path), otro) is None
+
+    # Aun abierta a mano, no mezcla valores de los dos motores
+    matriz = abrir_matriz(str(tmp_path), MotorHaversine())
+    clientes = clientes_del_dia(db)
+    km, _ = matriz.submatriz(ALMACEN, clientes, otro)
+    puntos = np.array([ALMACEN] + [(lat, lng) for _, lat, lng in clientes])
+    assert np.allclose(km, otro.calcular(puntos, puntos)[0])
+
+
+def test_matriz_sin_motor_registrado_se_ignora(db, dia, tmp_path):
+    construir_matriz(db, str(tmp_path), ALMACEN, MotorHaversine())
+    ruta_indice = tmp_path / ARCHIVO_INDICE
+    with np.load(ruta_indice) as indice:
+        anterior = {clave: indice[clave] for clave in indice.files if clave != "motor"}
+    np.savez(ruta_indice, **anterior)
+
+    assert abrir_matriz(str(tmp_path), MotorHaversine()) is None
@@ -0,0 +1,26 @@
+import pytest
+
+from app.models import AlgoritmoOptimizacion, ParametrosOptimizacion
+from app.services.parameter_sweep import parametros_variante
+
+
+def base():
+    return ParametrosOptimizacion(
+        nombre="Activos", activo=True, max_entregas_por_ruta=20,
+        algoritmo_preferido=AlgoritmoOptimizacion.GREEDY
+    )
+
+
+def test_variante_copia_los_activos_con_sus_cambios():
+    variante = parametros_variante(base(), "savings", {
+        "max_entregas_por_ruta": 12, "algoritmo_preferido": "savings"
+    })
+    assert variante.nombre == "savings" and not variante.activo
+    assert variante.max_entregas_por_ruta == 12
+    assert variante.algoritmo_preferido == AlgoritmoOptimizacion.SAVINGS
+
+
+@pytest.mark.parametrize("campo", ["peso_distancia", "peso_tiempo", "activo"])
+def test_campos_que_el_optimizador_no_usa_se_rechazan(campo):
+    with pytest.raises(ValueError, match=campo):
+        parametros_variante(base(), "x", {campo: 1})
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+import pytest
+
+from app.models import Entrega, EstadoEntrega, Ruta
+from app.services.result_writer import EntregasYaAsignadas, EscritorResultados
+from app.services.route_optimizer import RouteOptimizer
+
+
+def test_guarda_el_plan_en_una_transaccion(db, dia):
+    plan = RouteOptimizer(db).planificar_dia(dia)
+    rutas = EscritorResultados(db).guardar(dia, plan)
+
+    assert len(rutas) == len(plan)
+    asignadas = db.query(Entrega).filter(Entrega.estado == EstadoEntrega.ASIGNADO).all()
+    assert len(asignadas) == sum(len(r.paradas) for r in plan)
+    assert all(e.ruta_id is not None and e.orden_en_ruta for e in asignadas)
+
+
+def test_otra_fecha_no_reasigna_entregas_ya_tomadas(db, dia):
+    # Dos optimizaciones de fechas distintas calculadas sobre las mismas pendientes
+    manana = dia + timedelta(days=1)
+    plan_hoy = RouteOptimizer(db).planificar_dia(dia)
+    plan_manana = RouteOptimizer(db).planificar_dia(manana)
+    EscritorResultados(db).guardar(dia, plan_hoy)
+    antes = {e.id: e.ruta_id for e in db.query(Entrega)}
+
+    with pytest.raises(EntregasYaAsignadas):
+        EscritorResultados(db).guardar(manana, plan_manana)
+
+    db.expire_all()
+    assert {e.id: e.ruta_id for e in db.query(Entrega)} == antes
+    assert db.query(Ruta).filter(Ruta.fecha == manana).count() == 0
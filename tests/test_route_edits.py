@@ -0,0 +1,102 @@
+"""
+Edición de rutas planificadas: cada operación es una sola transacción
+"""
+
+import pytest
+
+from app.database import SessionLocal
+from app.models import Entrega, EstadoEntrega, Ruta
+from app.services.route_optimizer import RouteOptimizer
+
+
+def foto():
+    """Rutas y entregas tal como quedaron confirmadas (otra sesión)"""
+    db = SessionLocal()
+    try:
+        return (
+            {e.id: (e.ruta_id, e.orden_en_ruta, e.estado) for e in db.query(Entrega)},
+            {r.id: (r.cantidad_entregas, r.distancia_total_km, r.peso_total_kg) for r in db.query(Ruta)}
+        )
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def plan(db, dia):
+    rutas = RouteOptimizer(db).optimizar_dia(dia)
+    assert len(rutas) >= 2
+    return rutas
+
+
+def elegir_movimiento(db, plan):
+    """Una entrega de una ruta y otra ruta que la admite (se prueba y se revierte)"""
+    optimizer = RouteOptimizer(db)
+    for origen in plan:
+        for destino in plan:
+            if destino.id == origen.id:
+                continue
+            for entrega in db.query(Entrega).filter(Entrega.ruta_id == origen.id):
+                parada = optimizer._cargar_paradas(Entrega.id == entrega.id)[0]
+                admite = optimizer._insertar(parada, optimizer._rutas_editables(Ruta.id == destino.id))
+                db.rollback()
+                if admite is not None:
+                    return entrega.id, origen.id, destino.id
+    pytest.skip("Ninguna ruta admite entregas de otra")
+
+
+def test_reasignar_actualiza_ambas_rutas(db, plan):
+    entrega_id, origen_id, destino_id = elegir_movimiento(db, plan)
+    assert RouteOptimizer(db).reasignar_entrega(entrega_id, destino_id)
+
+    entregas, rutas = foto()
+    assert entregas[entrega_id][0] == destino_id
+    for ruta_id in (origen_id, destino_id):
+        ordenes = sorted(o for r, o, _ in entregas.values() if r == ruta_id)
+        assert ordenes == list(range(1, len(ordenes) + 1))
+        assert rutas[ruta_id][0] == len(ordenes)
+
+
+def test_reasignar_falla_sin_dejar_cambios(db, plan, monkeypatch):
+    entrega_id, _, destino_id = elegir_movimiento(db, plan)
+    antes = foto()
+
+    # Falla al guardar la ruta de origen, después de insertar en la de destino
+    original = RouteOptimizer._guardar_ruta
+    llamadas = []
+
+    def guardar_y_fallar(self, *args, **kwargs):
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            raise RuntimeError("falla simulada")
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(RouteOptimizer, "_guardar_ruta", guardar_y_fallar)
+    with pytest.raises(RuntimeError):
+        RouteOptimizer(db).reasignar_entrega(entrega_id, destino_id)
+
+    assert len(llamadas) == 2
+    assert foto() == antes
+
+
+def test_quitar_falla_sin_dejar_cambios(db, plan, monkeypatch):
+    entrega_id, _, _ = elegir_movimiento(db, plan)
+    antes = foto()
+
+    def fallar(self, *args, **kwargs):
+        raise RuntimeError("falla simulada")
+
+    monkeypatch.setattr(RouteOptimizer, "_guardar_ruta", fallar)
+    with pytest.raises(RuntimeError):
+        RouteOptimizer(db).quitar_entrega(entrega_id)
+
+    assert foto() == antes
+
+
+def test_quitar_deja_la_entrega_pendiente(db, plan):
+    entrega_id, origen_id, _ = elegir_movimiento(db, plan)
+    assert RouteOptimizer(db).quitar_entrega(entrega_id)
+
+    entregas, rutas = foto()
+    assert entregas[entrega_id] == (None, None, EstadoEntrega.PENDIENTE)
+    ordenes = sorted(o for r, o, _ in entregas.values() if r == origen_id)
+    assert ordenes == list(range(1, len(ordenes) + 1))
@@ -0,0 +1,66 @@
+"""
+Cada algoritmo, de punta a punta en RouteOptimizer: el plan final respeta
+compatibilidad, capacidad, máximo de entregas, ventanas horarias, jornada
+y km de cada viaje, y ninguna entrega queda en dos rutas
+"""
+
+import pytest
+
+from app.models import AlgoritmoOptimizacion, ParametrosOptimizacion
+from app.services import genetic
+from app.services.anytime import Convergencia
+from app.services.problem_snapshot import Problema
+from app.services.route_optimizer import RouteOptimizer
+from app.services.time_windows import ruta_factible
+
+
+@pytest.mark.parametrize("algoritmo", [
+    AlgoritmoOptimizacion.GREEDY,
+    AlgoritmoOptimizacion.SAVINGS,
+    AlgoritmoOptimizacion.GENETIC
+])
+def test_plan_factible(db, dia, algoritmo):
+    params = db.query(ParametrosOptimizacion).filter(ParametrosOptimizacion.activo == True).one()
+    params.algoritmo_preferido = algoritmo
+    params.max_iteraciones = 30
+    params.max_km_por_ruta = 40
+    db.commit()
+
+    optimizer = RouteOptimizer(db, convergencia=Convergencia(presupuesto_segundos=5))
+    optimizer.procesos_genetico = 1
+    rutas = optimizer.planificar_dia(dia)
+    assert rutas
+
+    # El mismo snapshot, con un vehículo por ruta planificada
+    paradas = optimizer._cargar_paradas_dia(dia)
+    problema = Problema.desde_paradas(
+        optimizer.matriz.km, paradas, [r.vehiculo for r in rutas],
+        optimizer.params.max_entregas_por_ruta, optimizer.matriz.coordenadas,
+        max_km=optimizer.params.max_km_por_ruta, trafico=optimizer.modelo_tiempos
+    )
+
+    vistas = set()
+    for v, ruta in enumerate(rutas):
+        indices = [optimizer.matriz.indice[p.entrega_id] for p in ruta.paradas]
+        assert problema.admite(v, indices)
+        assert ruta_factible(problema, v, indices)
+        ids = {p.entrega_id for p in ruta.paradas}
+        assert not ids & vistas
+        vistas |= ids
+    assert vistas == {p.entrega_id for p in paradas}
+
+
+def test_genetico_chico_no_arranca_procesos(db, dia, monkeypatch):
+    """Con menos de MIN_PARADAS_PARALELO paradas evoluciona en el mismo proceso"""
+    def sin_pool(*args, **kwargs):
+        raise AssertionError("No debía arrancar el pool de procesos")
+
+    monkeypatch.setattr(genetic, "_EjecutorParalelo", sin_pool)
+    params = db.query(ParametrosOptimizacion).filter(ParametrosOptimizacion.activo == True).one()
+    params.algoritmo_preferido = AlgoritmoOptimizacion.GENETIC
+    params.max_iteraciones = 5
+    db.commit()
+
+    optimizer = RouteOptimizer(db, convergencia=Convergencia(presupuesto_segundos=5))
+    optimizer.procesos_genetico = 4
+    assert optimizer.planificar_dia(dia)
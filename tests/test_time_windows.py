@@ -0,0 +1,129 @@
+"""
+Las validaciones O(1) de HorarioRuta (inserción, remoción, reemplazo y
+concatenación) contra volver a simular la ruta completa. Con tráfico que
+no cambia con la hora la holgura de Savelsbergh es exacta
+"""
+
+import random
+
+import numpy as np
+
+from app.services.distance_matrix import MotorHaversine
+from app.services.problem_snapshot import Problema, VehiculoSnapshot
+from app.services.time_windows import HorarioRuta, reparar_plan, ruta_factible
+from app.services.travel_time import FRANJAS_DIA, ModeloTiempos
+
+PARADAS = 14
+
+
+def problema_aleatorio(semilla: int) -> Problema:
+    rnd = random.Random(semilla)
+    coordenadas = np.array(
+        [(-3.749, -73.253)] +
+        [(-3.749 + rnd.uniform(-0.05, 0.05), -73.253 + rnd.uniform(-0.05, 0.05)) for _ in range(PARADAS)]
+    )
+    km, _ = MotorHaversine().calcular(coordenadas, coordenadas)
+
+    ventana_inicio, ventana_fin = [], []
+    for _ in range(PARADAS):
+        if rnd.random() < 0.6:
+            desde = rnd.randrange(480, 720, 15)
+            ventana_inicio.append(desde)
+            ventana_fin.append(desde + rnd.choice((20, 45, 90)))
+        else:
+            ventana_inicio.append(0)
+            ventana_fin.append(24 * 60)
+
+    # Zona 0 y 1 con tráfico constante en el día; la 2 usa la fila neutra
+    unos = np.ones(FRANJAS_DIA)
+    trafico = ModeloTiempos(np.vstack([unos, 1.4 * unos, 0.8 * unos]), {0: 1, 1: 2})
+    vehiculo = VehiculoSnapshot(
+        id=1, peso_max=1e9, volumen_max=1e9, refrigerado=True, velocidad_kmh=25,
+        salida_min=480, regreso_max_min=rnd.choice((660, 720, 900))
+    )
+    return Problema(
+        km, peso=[1.0] * PARADAS, volumen=[0.1] * PARADAS, refrigeracion=[False] * PARADAS,
+        prioridad=[5] * PARADAS, urgente=[False] * PARADAS,
+        zona=[rnd.randrange(3) for _ in range(PARADAS)], vehiculos=[vehiculo],
+        max_entregas=PARADAS, coordenadas=coordenadas,
+        servicio=[rnd.uniform(5, 15) for _ in range(PARADAS)],
+        ventana_inicio=ventana_inicio, ventana_fin=ventana_fin,
+        max_km=rnd.choice((25.0, 40.0, np.inf)), trafico=trafico
+    )
+
+
+def rutas_factibles(problema: Problema, semilla: int, cantidad: int = 40):
+    """Rutas al azar que ya cumplen ventanas y límites"""
+    rnd = random.Random(semilla)
+    rutas = []
+    while len(rutas) < cantidad:
+        paradas = rnd.sample(range(1, PARADAS + 1), rnd.randint(1, 6))
+        if ruta_factible(problema, 0, paradas):
+            rutas.append(paradas)
+    return rutas
+
+
+def test_insercion_coincide_con_simular():
+    resultados = set()
+    for semilla in range(6):
+        problema = problema_aleatorio(semilla)
+        for paradas in rutas_factibles(problema, semilla):
+            candidatas = [u for u in range(1, PARADAS + 1) if u not in paradas]
+            incremental = HorarioRuta(problema, 0, paradas).insercion(np.array(candidatas))
+            for c, u in enumerate(candidatas):
+                for k in range(len(paradas) + 1):
+                    completa = ruta_factible(problema, 0, paradas[:k] + [u] + paradas[k:])
+                    assert incremental[c, k] == completa, (semilla, paradas, u, k)
+                    resultados.add(completa)
+    assert resultados == {True, False}
+
+
+def test_remocion_coincide_con_simular():
+    for semilla in range(6):
+        problema = problema_aleatorio(semilla)
+        for paradas in rutas_factibles(problema, semilla):
+            incremental = HorarioRuta(problema, 0, paradas).remocion()
+            for k in range(len(paradas)):
+                completa = ruta_factible(problema, 0, paradas[:k] + paradas[k + 1:])
+                assert incremental[k] == completa, (semilla, paradas, k)
+
+
+def test_reemplazo_coincide_con_simular():
+    resultados = set()
+    for semilla in range(6):
+        problema = problema_aleatorio(semilla)
+        for paradas in rutas_factibles(problema, semilla):
+            candidatas = [u for u in range(1, PARADAS + 1) if u not in paradas]
+            incremental = HorarioRuta(problema, 0, paradas).reemplazo(np.array(candidatas))
+            for k in range(len(paradas)):
+                for c, u in enumerate(candidatas):
+                    completa = ruta_factible(problema, 0, paradas[:k] + [u] + paradas[k + 1:])
+                    assert incremental[k, c] == completa, (semilla, paradas, k, u)
+                    resultados.add(completa)
+    assert resultados == {True, False}
+
+
+def test_concatenacion_coincide_con_simular():
+    resultados = set()
+    for semilla in range(6):
+        problema = problema_aleatorio(semilla)
+        rutas = rutas_factibles(problema, semilla)
+        for a, b in zip(rutas, rutas[1:]):
+            b = [u for u in b if u not in a]
+            if not b or not ruta_factible(problema, 0, b):
+                continue
+            completa = ruta_factible(problema, 0, a + b)
+            incremental = HorarioRuta(problema, 0, a).concatenacion(HorarioRuta(problema, 0, b))
+            assert incremental == completa, (semilla, a, b)
+            resultados.add(completa)
+    assert resultados == {True, False}
+
+
+def test_reparar_plan_deja_rutas_factibles():
+    for semilla in range(6):
+        problema = problema_aleatorio(semilla)
+        paradas = list(range(1, PARADAS + 1))
+        random.Random(semilla).shuffle(paradas)
+        plan = reparar_plan(problema, [(0, paradas)])
+        for v, ruta in plan:
+            assert ruta_factible(problema, v, ruta)
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models import EstadoRuta, TrackingHistorial, TrayectoriaRuta
+from app.services.route_optimizer import RouteOptimizer
+from app.services.track_retention import (
+    RetencionTracking, _distancia_segmento, codificar_enteros, codificar_polilinea,
+    comprimir_trayectoria, decodificar_enteros, decodificar_polilinea, trayectoria_a_dict
+)
+
+TOLERANCIA_METROS = 10.0
+
+
+def recorrido(puntos: int = 600, inicio: datetime = datetime(2026, 10, 1, 13, 0)):
+    """Vuelta por calles en L con ruido de GPS de ~2 m, un ping cada 5 s"""
+    rnd = np.random.default_rng(3)
+    t = np.linspace(0.0, 1.0, puntos)
+    lat = -3.749 + np.where(t < 0.5, t * 0.02, 0.01)
+    lng = -73.253 + np.where(t < 0.5, 0.0, (t - 0.5) * 0.03)
+    lat = lat + rnd.normal(0, 2e-5, puntos)
+    lng = lng + rnd.normal(0, 2e-5, puntos)
+    return [
+        (float(a), float(b), inicio + timedelta(seconds=5 * i))
+        for i, (a, b) in enumerate(zip(lat, lng))
+    ]
+
+
+def test_polilinea_ejemplo_de_google():
+    puntos = np.array([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+    texto = codificar_polilinea(puntos)
+    assert texto == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert np.allclose(decodificar_polilinea(texto), puntos)
+    assert decodificar_enteros(codificar_enteros([0, 5, 5, 3600, -2])) == [0, 5, 5, 3600, -2]
+
+
+def test_comprimir_trayectoria_ida_y_vuelta():
+    puntos = recorrido()
+    comprimida = comprimir_trayectoria(puntos, TOLERANCIA_METROS)
+    decodificada = trayectoria_a_dict(comprimida)["puntos"]
+
+    assert comprimida["puntos_originales"] == len(puntos)
+    assert comprimida["puntos_guardados"] == len(decodificada) < len(puntos) // 5
+    assert (comprimida["inicio"], comprimida["fin"]) == (puntos[0][2], puntos[-1][2])
+
+    # Extremos exactos (a 5 decimales) y segundos crecientes desde el inicio
+    assert decodificada[0] == [round(puntos[0][0], 5), round(puntos[0][1], 5), 0]
+    assert decodificada[-1][2] == int((puntos[-1][2] - puntos[0][2]).total_seconds())
+    segundos = [s for _, _, s in decodificada]
+    assert segundos == sorted(segundos)
+
+    # Todo punto original queda a menos de la tolerancia (+ redondeo) del trazo
+    metros = np.radians(1) * 6371000.0
+    trazo = np.array([(lat, lng) for lat, lng, _ in decodificada]) * metros
+    originales = np.array([(lat, lng) for lat, lng, _ in puntos]) * metros
+    cerca = np.min([
+        _distancia_segmento(originales, trazo[k], trazo[k + 1]) for k in range(len(trazo) - 1)
+    ], axis=0)
+    assert cerca.max() <= TOLERANCIA_METROS + 2.0
+
+
+def test_podar_conserva_rutas_sin_comprimir(db, dia):
+    comprimida, sin_comprimir = RouteOptimizer(db).optimizar_dia(dia)[:2]
+    comprimida.estado = EstadoRuta.COMPLETADA
+    viejo = datetime.utcnow() - timedelta(days=40)
+    reciente = datetime.utcnow() - timedelta(days=1)
+    for ruta_id, camion_id, inicio in (
+        (comprimida.id, comprimida.camion_id, viejo),
+        (sin_comprimir.id, sin_comprimir.camion_id, viejo),
+        (None, comprimida.camion_id, viejo),
+        (None, comprimida.camion_id, reciente),
+    ):
+        db.add_all(
+            TrackingHistorial(camion_id=camion_id, ruta_id=ruta_id, lat=lat, lng=lng, timestamp=momento)
+            for lat, lng, momento in recorrido(20, inicio)
+        )
+    db.commit()
+
+    retencion = RetencionTracking(db, dias_retencion=30, tolerancia_metros=TOLERANCIA_METROS)
+    assert retencion.comprimir_rutas() == 1
+    assert retencion.podar() == 40
+
+    restantes = {
+        (ruta_id, momento > reciente - timedelta(hours=1))
+        for ruta_id, momento in db.query(TrackingHistorial.ruta_id, TrackingHistorial.timestamp)
+    }
+    assert restantes == {(sin_comprimir.id, False), (None, True)}
+    assert db.get(TrayectoriaRuta, comprimida.id) is not None
+
+
+def test_ruta_en_curso_de_otro_dia_se_recomprime_con_los_puntos_nuevos(db, dia):
+    ruta = RouteOptimizer(db).optimizar_dia(dia)[0]
+    ruta.estado = EstadoRuta.EN_CURSO  # Nadie la cerró: sigue en curso
+    ruta.fecha = dia - timedelta(days=45)
+    primer_tramo = recorrido(300, datetime.utcnow() - timedelta(days=44))
+    segundo_tramo = recorrido(300, datetime.utcnow() - timedelta(days=40))[150:]
+
+    def guardar(puntos):
+        db.add_all(
+            TrackingHistorial(camion_id=ruta.camion_id, ruta_id=ruta.id, lat=lat, lng=lng, timestamp=momento)
+            for lat, lng, momento in puntos
+        )
+        db.commit()
+
+    retencion = RetencionTracking(db, dias_retencion=30, tolerancia_metros=TOLERANCIA_METROS)
+    guardar(primer_tramo)
+    assert retencion.comprimir_rutas() == 1
+    assert retencion.comprimir_rutas() == 0  # Nada nuevo
+
+    # Puntos posteriores a la compresión: no se podan hasta volver a comprimir
+    guardar(segundo_tramo)
+    assert retencion.podar() == len(primer_tramo)
+    assert db.query(TrackingHistorial).count() == len(segundo_tramo)
+
+    assert retencion.comprimir_rutas() == 1
+    trayectoria = db.get(TrayectoriaRuta, ruta.id)
+    assert (trayectoria.inicio, trayectoria.fin) == (primer_tramo[0][2], segundo_tramo[-1][2])
+    assert trayectoria.puntos_originales == len(primer_tramo) + len(segundo_tramo)
+    completa = comprimir_trayectoria(primer_tramo + segundo_tramo, TOLERANCIA_METROS)
+    assert trayectoria.distancia_km == pytest.approx(completa["distancia_km"], abs=2e-3)
+    segundos = decodificar_enteros(trayectoria.segundos)
+    assert segundos[-1] == int((segundo_tramo[-1][2] - primer_tramo[0][2]).total_seconds())
+
+    assert retencion.podar() == len(segundo_tramo)
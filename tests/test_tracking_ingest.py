@@ -0,0 +1,80 @@
+"""
+Ingesta de posiciones: un ruta_id ajeno al camión no tumba el lote
+Estas pruebas activan las claves foráneas de SQLite (apagadas por defecto),
+que PostgreSQL siempre hace cumplir
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app.models import Entrega, EstadoRuta, Ruta, TrackingHistorial
+from app.services.route_optimizer import RouteOptimizer
+from app.services.tracking_ingest import IngestaTracking
+
+
+@pytest.fixture
+def db_fk(db, dia):
+    """Sesión sobre la misma base con PRAGMA foreign_keys=ON"""
+    motor = create_engine(os.environ["DATABASE_URL"])
+
+    @event.listens_for(motor, "connect")
+    def _claves_foraneas(conexion, _):
+        conexion.execute("PRAGMA foreign_keys=ON")
+
+    sesion = Session(motor)
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        motor.dispose()
+
+
+@pytest.fixture
+def rutas(db, dia):
+    rutas = RouteOptimizer(db).optimizar_dia(dia)
+    assert len(rutas) >= 2
+    rutas[0].estado = EstadoRuta.EN_CURSO
+    db.commit()
+    return [(r.id, r.camion_id) for r in rutas[:2]]
+
+
+def punto(camion_id, ruta_id=None):
+    return {
+        "camion_id": camion_id, "ruta_id": ruta_id, "lat": -3.749, "lng": -73.253,
+        "timestamp": datetime(2026, 10, 17, 14, 0, 0)
+    }
+
+
+def test_rutas_ajenas_o_inexistentes_no_tumban_el_lote(db_fk, rutas):
+    (en_curso, camion), (otra_ruta, otro_camion) = rutas
+    resultado = IngestaTracking(db_fk).guardar([
+        punto(camion, ruta_id=otra_ruta),    # Ruta de otro camión
+        punto(camion, ruta_id=999_999),      # Ruta inexistente o borrada
+        punto(otro_camion, ruta_id=otra_ruta),
+        punto(otro_camion, ruta_id=999_999)  # Sin ruta en curso: queda sin ruta
+    ])
+
+    assert resultado["guardados"] == 4
+    assert resultado["rutas_corregidas"] == 3
+    guardados = sorted(
+        (p.camion_id, p.ruta_id or 0) for p in db_fk.query(TrackingHistorial)
+    )
+    assert guardados == sorted([
+        (camion, en_curso), (camion, en_curso), (otro_camion, otra_ruta), (otro_camion, 0)
+    ])
+
+
+def test_ruta_borrada_tras_el_reseteo(db_fk, rutas):
+    (en_curso, camion), _ = rutas
+    # Como /resetear-rutas: entregas sueltas y rutas del día borradas
+    db_fk.query(Entrega).update({"ruta_id": None, "orden_en_ruta": None})
+    db_fk.query(Ruta).filter(Ruta.id == en_curso).delete(synchronize_session=False)
+    db_fk.commit()
+
+    resultado = IngestaTracking(db_fk).guardar([punto(camion, ruta_id=en_curso)])
+    assert resultado["guardados"] == 1
+    assert db_fk.query(TrackingHistorial.ruta_id).scalar() is None